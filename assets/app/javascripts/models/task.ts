@@ -4,6 +4,11 @@ import {ResourceError} from '../utils/errors';
 import {request} from '../utils/request';
 
 
+// Must not exceed MAX_TASK_WAIT in fanboi2/views/api.py, which caps the
+// number of seconds the server will wait for a task to finish.
+const taskWait = 5;
+
+
 enum Statuses {
     Queued,
     Pending,
@@ -41,9 +46,15 @@ export class Task extends Model {
 
     static queryId(
         id: string,
-        token?: CancellableToken
+        token?: CancellableToken,
+        wait?: number
     ): Promise<Task> {
-        return request('GET', `/api/1.0/tasks/${id}/`, {}, token).then(
+        let url = `/api/1.0/tasks/${id}/`;
+        if (wait) {
+            url += `?wait=${wait}`;
+        }
+
+        return request('GET', url, {}, token).then(
             (resp: string) => {
                 return new Task(JSON.parse(resp));
             }
@@ -54,7 +65,7 @@ export class Task extends Model {
         id: string,
         token?: CancellableToken
     ): Promise<Task> {
-        return Task.queryId(id, token).then((task: Task) => {
+        return Task.queryId(id, token, taskWait).then((task: Task) => {
             if (task.status == Statuses.Success) {
                 return task;
             } else if (task.status == Statuses.Failure) {
@@ -8,9 +8,10 @@ from pyramid.path import AssetResolver
 from pyramid.settings import aslist
 from sqlalchemy.engine import engine_from_config
 from fanboi2.cache import cache_region
-from fanboi2.models import DBSession, Base, redis_conn, identity
+from fanboi2.models import DBSession, Base, redis_conn, identity, notifier
 from fanboi2.tasks import celery, configure_celery
-from fanboi2.utils import akismet, dnsbl, geoip, proxy_detector, checklist
+from fanboi2.utils import akismet, dnsbl, geoip, proxy_detector, checklist, \
+    post_queue, http_client, RouteTemplates, EmbedLoader
 
 
 def remote_addr(request):
@@ -44,6 +45,30 @@ def route_name(request):
         return request.matched_route.name
 
 
+def route_templates(request):
+    """Returns a :class:`fanboi2.utils.RouteTemplates` for generating route
+    paths from compiled route templates for the lifetime of the request.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: fanboi2.utils.RouteTemplates
+    """
+    return RouteTemplates(request)
+
+
+def embed_loader(request):
+    """Returns a :class:`fanboi2.utils.EmbedLoader` for batch loading
+    resources embedded in API responses for the lifetime of the request.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: fanboi2.utils.EmbedLoader
+    """
+    return EmbedLoader()
+
+
 @lru_cache(maxsize=10)
 def _get_asset_hash(path):
     """Returns an MD5 hash of the given assets path.
@@ -108,6 +133,10 @@ def normalize_settings(settings, _environ=os.environ):
     app_secret = _cget('APP_SECRET', 'app.secret')
     app_akismet_key = _cget('APP_AKISMET_KEY', 'app.akismet_key')
     app_dnsbl_providers = _cget('APP_DNSBL_PROVIDERS', 'app.dnsbl_providers')
+    app_dnsbl_nameservers = _cget(
+        'APP_DNSBL_NAMESERVERS',
+        'app.dnsbl_nameservers')
+    app_dnsbl_timeout = _cget('APP_DNSBL_TIMEOUT', 'app.dnsbl_timeout')
 
     app_proxy_detect_providers = _cget(
         'APP_PROXY_DETECT_PROVIDERS',
@@ -131,10 +160,36 @@ def normalize_settings(settings, _environ=os.environ):
 
     app_geoip2_database = _cget('APP_GEOIP2_DATABASE', 'app.geoip2_database')
     app_checklist = _cget('APP_CHECKLIST', 'app.checklist')
+    app_post_batch_size = _cget('APP_POST_BATCH_SIZE', 'app.post_batch.size')
+    app_post_batch_wait = _cget('APP_POST_BATCH_WAIT', 'app.post_batch.wait')
+    app_ident_engine = _cget('APP_IDENT_ENGINE', 'app.ident_engine')
+    app_json_renderer = _cget('APP_JSON_RENDERER', 'app.json_renderer')
+    app_wait_limit = _cget('APP_WAIT_LIMIT', 'app.wait_limit')
+    app_http_timeout = _cget('APP_HTTP_TIMEOUT', 'app.http.timeout')
+    app_http_retries = _cget('APP_HTTP_RETRIES', 'app.http.retries')
+    app_http_pool_size = _cget('APP_HTTP_POOL_SIZE', 'app.http.pool_size')
+    app_http_circuit_threshold = _cget(
+        'APP_HTTP_CIRCUIT_THRESHOLD',
+        'app.http.circuit_threshold')
+    app_http_circuit_window = _cget(
+        'APP_HTTP_CIRCUIT_WINDOW',
+        'app.http.circuit_window')
+    app_http_circuit_reset = _cget(
+        'APP_HTTP_CIRCUIT_RESET',
+        'app.http.circuit_reset')
+    app_http_circuit_latency = _cget(
+        'APP_HTTP_CIRCUIT_LATENCY',
+        'app.http.circuit_latency')
+    app_http_circuit_fail = _cget(
+        'APP_HTTP_CIRCUIT_FAIL',
+        'app.http.circuit_fail')
 
     if app_dnsbl_providers is not None:
         app_dnsbl_providers = aslist(app_dnsbl_providers)
 
+    if app_dnsbl_nameservers is not None:
+        app_dnsbl_nameservers = aslist(app_dnsbl_nameservers)
+
     if app_proxy_detect_providers is not None:
         app_proxy_detect_providers = aslist(app_proxy_detect_providers)
 
@@ -153,6 +208,8 @@ def normalize_settings(settings, _environ=os.environ):
         'app.secret': app_secret,
         'app.akismet_key': app_akismet_key,
         'app.dnsbl_providers': app_dnsbl_providers,
+        'app.dnsbl_nameservers': app_dnsbl_nameservers,
+        'app.dnsbl_timeout': app_dnsbl_timeout,
         'app.proxy_detect.providers': app_proxy_detect_providers,
         'app.proxy_detect.blackbox.url': app_proxy_detect_blackbox_url,
         'app.proxy_detect.getipintel.url': app_proxy_detect_getipintel_url,
@@ -160,6 +217,19 @@ def normalize_settings(settings, _environ=os.environ):
         'app.proxy_detect.getipintel.flags': app_proxy_detect_getipintel_flags,
         'app.geoip2_database': app_geoip2_database,
         'app.checklist': app_checklist,
+        'app.post_batch.size': app_post_batch_size,
+        'app.post_batch.wait': app_post_batch_wait,
+        'app.ident_engine': app_ident_engine,
+        'app.json_renderer': app_json_renderer,
+        'app.wait_limit': app_wait_limit,
+        'app.http.timeout': app_http_timeout,
+        'app.http.retries': app_http_retries,
+        'app.http.pool_size': app_http_pool_size,
+        'app.http.circuit_threshold': app_http_circuit_threshold,
+        'app.http.circuit_window': app_http_circuit_window,
+        'app.http.circuit_reset': app_http_circuit_reset,
+        'app.http.circuit_latency': app_http_circuit_latency,
+        'app.http.circuit_fail': app_http_circuit_fail,
     })
 
     return _settings
@@ -187,17 +257,32 @@ def main(global_config, **settings):  # pragma: no cover
     redis_conn.from_url(config.registry.settings['redis.url'])
     celery.config_from_object(configure_celery(config.registry.settings))
     identity.configure_tz(config.registry.settings['app.timezone'])
+    identity.configure_engine(
+        config.registry.settings['app.ident_engine'],
+        config.registry.settings['app.secret'])
     akismet.configure_key(config.registry.settings['app.akismet_key'])
     dnsbl.configure_providers(config.registry.settings['app.dnsbl_providers'])
+    dnsbl.configure_resolver(
+        config.registry.settings['app.dnsbl_nameservers'],
+        timeout=config.registry.settings['app.dnsbl_timeout'])
     geoip.configure_geoip2(config.registry.settings['app.geoip2_database'])
     checklist.configure_checklist(config.registry.settings['app.checklist'])
+    notifier.configure_wait_limit(config.registry.settings['app.wait_limit'])
+    post_queue.configure_batch(
+        config.registry.settings['app.post_batch.size'],
+        config.registry.settings['app.post_batch.wait'])
     proxy_detector.configure_from_config(
         config.registry.settings,
         'app.proxy_detect.')
+    http_client.configure_from_config(
+        config.registry.settings,
+        'app.http.')
 
     config.set_request_property(remote_addr)
     config.set_request_property(route_name)
     config.add_request_method(tagged_static_path)
+    config.add_request_method(route_templates, reify=True)
+    config.add_request_method(embed_loader, reify=True)
     config.add_route('robots', '/robots.txt')
 
     config.include('fanboi2.serializers')
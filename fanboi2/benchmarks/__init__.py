@@ -0,0 +1,153 @@
+import json
+import platform
+import sys
+import timeit
+from collections import OrderedDict
+
+
+BENCHMARKS = OrderedDict()
+MODULES = (
+    'fanboi2.benchmarks.formatters',
+    'fanboi2.benchmarks.serializers',
+    'fanboi2.benchmarks.models',
+    'fanboi2.benchmarks.utils',
+)
+
+
+def benchmark(name):
+    """Register the decorated function as a benchmark named ``name``. The
+    decorated function is called once to set up the benchmark and must
+    return a callable taking no arguments, which is the code being timed.
+
+    :param name: A unique name :type:`str` of the benchmark.
+
+    :type name: str
+    :rtype: function
+    """
+    def _wrapped(setup):
+        if name in BENCHMARKS:
+            raise ValueError('Duplicate benchmark: %s' % (name,))
+        BENCHMARKS[name] = setup
+        return setup
+    return _wrapped
+
+
+def load_benchmarks():
+    """Import all benchmark modules listed in :data:`MODULES` and returns
+    registered benchmarks.
+
+    :rtype: OrderedDict
+    """
+    from importlib import import_module
+    for module in MODULES:
+        import_module(module)
+    return BENCHMARKS
+
+
+def _calibrate(timer, min_time):
+    """Returns the number of loops of ``timer`` needed for a single run to
+    take at least ``min_time`` seconds, doubling the number of loops until
+    it does. This is done manually since :meth:`timeit.Timer.autorange` is
+    not available before Python 3.6.
+
+    :param timer: A :class:`timeit.Timer` object.
+    :param min_time: Minimum time in seconds of each run.
+
+    :type timer: timeit.Timer
+    :type min_time: float
+    :rtype: int
+    """
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return number
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    """Run benchmarks and returns a :type:`dict` of results keyed by the
+    benchmark name. Each benchmark is looped until a single run takes at
+    least ``min_time`` seconds, then the run is repeated ``repeat`` times.
+    Results contain the per-call time in seconds of the fastest run, which
+    is the least affected by noise from other processes, as well as of the
+    median run.
+
+    :param names: A :type:`list` of benchmark names to run or :type:`None`
+                  to run all benchmarks.
+    :param repeat: Number of runs for each benchmark.
+    :param min_time: Minimum time in seconds of each run.
+
+    :type names: list or None
+    :type repeat: int
+    :type min_time: float
+    :rtype: dict
+    """
+    benchmarks = load_benchmarks()
+    if names is None:
+        names = list(benchmarks.keys())
+
+    results = OrderedDict()
+    for name in names:
+        fn = benchmarks[name]()
+        timer = timeit.Timer(fn)
+        number = _calibrate(timer, min_time)
+        times = sorted(t / number for t in timer.repeat(repeat, number))
+        results[name] = {
+            'min': times[0],
+            'median': times[len(times) // 2],
+            'number': number,
+            'repeat': repeat,
+        }
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Compare ``results`` against ``baseline`` results and returns a
+    :type:`list` of ``(name, baseline, result, change)`` tuples of
+    benchmarks that became slower by more than ``threshold``, e.g. ``0.2``
+    for 20%. Benchmarks missing from either results are ignored.
+
+    :param results: Results returned from :func:`run`.
+    :param baseline: Results previously returned from :func:`run`.
+    :param threshold: Maximum allowed slowdown ratio.
+
+    :type results: dict
+    :type baseline: dict
+    :type threshold: float
+    :rtype: list
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base['min']:
+            continue
+        change = (result['min'] - base['min']) / base['min']
+        if change > threshold:
+            regressions.append((name, base['min'], result['min'], change))
+    return regressions
+
+
+def dump_results(results, fp):
+    """Write ``results`` as JSON to the file object ``fp`` along with the
+    Python version and platform it was run on.
+
+    :param results: Results returned from :func:`run`.
+    :param fp: A writable file object.
+
+    :type results: dict
+    :rtype: None
+    """
+    json.dump({
+        'python': sys.version,
+        'platform': platform.platform(),
+        'benchmarks': results,
+    }, fp, indent=2, sort_keys=True)
+    fp.write('\n')
+
+
+def load_results(fp):
+    """Read results written by :func:`dump_results` from ``fp``.
+
+    :param fp: A readable file object.
+    :rtype: dict
+    """
+    return json.load(fp)['benchmarks']
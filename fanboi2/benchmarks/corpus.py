@@ -0,0 +1,137 @@
+import datetime
+import random
+import pytz
+
+
+SEED = 2013
+
+WORDS = (
+    'lorem', 'ipsum', 'dolor', 'sit', 'amet,', 'consectetur', 'adipiscing',
+    'elit.', 'sed', 'do', 'eiusmod', 'tempor', 'ほげ', 'ไก่จิกเด็ก',
+    '"quoted"', '<b>', 'a&b', 'foo!!1',
+)
+
+TOKENS = (
+    (0.02, lambda r: '>>%d' % r.randint(1, 1000)),
+    (0.01, lambda r: '>>%d-%d' % (r.randint(1, 500), r.randint(500, 1000))),
+    (0.005, lambda r: '>>>/demo/%d/%d' % (r.randint(1, 99), r.randint(1, 9))),
+    (0.01, lambda r: 'http://www.example.com/%d?q=%d' % (
+        r.randint(1, 999),
+        r.randint(1, 999))),
+    (0.002, lambda r: 'https://imgur.com/%x' % r.randint(1, 0xfffff)),
+    (0.002, lambda r: 'https://www.youtube.com/watch?v=%x' % (
+        r.randint(1, 0xfffff))),
+)
+
+
+def make_random(seed=SEED):
+    """Returns a :class:`random.Random` seeded with ``seed`` so every
+    benchmark run works on the same corpus.
+
+    :param seed: A seed :type:`int`.
+    :rtype: random.Random
+    """
+    return random.Random(seed)
+
+
+def post_body(rand, length):
+    """Generate a synthetic post body of approximately ``length`` characters
+    containing text, line breaks, paragraphs, anchors and links.
+
+    :param rand: A :class:`random.Random` object.
+    :param length: Length of the post body.
+
+    :type rand: random.Random
+    :type length: int
+    :rtype: str
+    """
+    parts = []
+    size = 0
+    while size < length:
+        value = rand.random()
+        token = None
+        for probability, fn in TOKENS:
+            if value < probability:
+                token = fn(rand)
+                break
+            value -= probability
+        if token is None:
+            token = rand.choice(WORDS)
+        separator = rand.choice((' ',) * 12 + ('\n', '\n\n'))
+        parts.append(token)
+        parts.append(separator)
+        size += len(token) + len(separator)
+    return ''.join(parts)[:length]
+
+
+def post_bodies(count, length, seed=SEED):
+    """Returns a :type:`list` of ``count`` post bodies of approximately
+    ``length`` characters each generated with ``seed``.
+
+    :param count: Number of post bodies.
+    :param length: Length of each post body.
+    :param seed: A seed :type:`int`.
+
+    :type count: int
+    :type length: int
+    :type seed: int
+    :rtype: list
+    """
+    rand = make_random(seed)
+    return [post_body(rand, length) for _ in range(count)]
+
+
+def markdown_body(rand, sections):
+    """Generate a synthetic Markdown document with ``sections`` sections.
+
+    :param rand: A :class:`random.Random` object.
+    :param sections: Number of sections.
+
+    :type rand: random.Random
+    :type sections: int
+    :rtype: str
+    """
+    parts = []
+    for i in range(sections):
+        parts.append('## Section %d\n' % (i,))
+        parts.append(' '.join(rand.choice(WORDS) for _ in range(80)))
+        parts.append('\n\n')
+        for _ in range(5):
+            parts.append('- *%s* [link](http://www.example.com/%d)\n' % (
+                rand.choice(WORDS),
+                rand.randint(1, 999)))
+        parts.append('\n')
+    return ''.join(parts)
+
+
+def ip_addresses(rand, count, ipv6=0.2):
+    """Returns a :type:`list` of ``count`` random IP addresses with
+    ``ipv6`` ratio of IPv6 addresses.
+
+    :param rand: A :class:`random.Random` object.
+    :param count: Number of IP addresses.
+    :param ipv6: Ratio of IPv6 addresses.
+
+    :type rand: random.Random
+    :type count: int
+    :type ipv6: float
+    :rtype: list
+    """
+    from ipaddress import IPv4Address, IPv6Address
+    results = []
+    for _ in range(count):
+        if rand.random() < ipv6:
+            results.append(str(IPv6Address(rand.getrandbits(128))))
+        else:
+            results.append(str(IPv4Address(rand.getrandbits(32))))
+    return results
+
+
+def timestamp(rand):
+    """Returns a random timezone-aware :class:`datetime.datetime`.
+
+    :param rand: A :class:`random.Random` object.
+    :rtype: datetime.datetime
+    """
+    return datetime.datetime(2016, 1, 1, tzinfo=pytz.utc) + \
+        datetime.timedelta(seconds=rand.randint(0, 86400 * 365))
@@ -0,0 +1,126 @@
+from .corpus import make_random, post_body, markdown_body, timestamp
+
+
+ROUTES = (
+    ('board', '/{board}/'),
+    ('board_all', '/{board}/all/'),
+    ('topic', '/{board:\\w+}/{topic:\\d+}/'),
+    ('topic_scoped', '/{board:\\w+}/{topic:\\d+}/{query}/'),
+    ('api_board', '/api/1.0/boards/{board}/'),
+    ('api_board_topics', '/api/1.0/boards/{board}/topics/'),
+    ('api_topic', '/api/1.0/topics/{topic}/'),
+    ('api_topic_posts', '/api/1.0/topics/{topic}/posts/'),
+    ('api_topic_posts_scoped', '/api/1.0/topics/{topic}/posts/{query}/'),
+    ('api_page', '/api/1.0/pages/{page:.*}/'),
+    ('api_task', '/api/1.0/tasks/{task}/'),
+)
+
+
+def make_request(params=None):
+    """Set up a :mod:`pyramid.testing` configuration with the application
+    routes and returns a dummy request. Models are never flushed so no
+    database connection is needed.
+
+    :param params: A :type:`dict` of query string parameters.
+    :type params: dict or None
+    :rtype: pyramid.testing.DummyRequest
+    """
+    from pyramid import testing
+    request = testing.DummyRequest(params=params or {})
+    config = testing.setUp(request=request, settings={
+        'app.timezone': 'Asia/Bangkok',
+        'app.secret': 'benchmark',
+    })
+    for name, pattern in ROUTES:
+        config.add_route(name, pattern)
+    return request
+
+
+def make_topic(post_count=0, seed=None):
+    """Returns a transient :class:`fanboi2.models.Topic` with its board and
+    meta claiming ``post_count`` posts generated from a fixed seed.
+
+    :param post_count: Number of posts in topic meta.
+    :param seed: A seed :type:`int` or :type:`None` for the default seed.
+
+    :type post_count: int
+    :type seed: int or None
+    :rtype: fanboi2.models.Topic
+    """
+    from ..models import Board, Topic, TopicMeta
+    rand = make_random() if seed is None else make_random(seed)
+    board = Board(
+        id=1,
+        slug='demo',
+        title='Demo',
+        description='Benchmark board',
+        agreements='Be nice.',
+        status='open',
+        settings={})
+    created_at = timestamp(rand)
+    topic = Topic(
+        id=rand.randint(1, 10000),
+        board=board,
+        board_id=board.id,
+        title='Benchmark topic',
+        status='open',
+        created_at=created_at)
+    topic.meta = TopicMeta(
+        post_count=post_count,
+        bumped_at=created_at,
+        posted_at=created_at)
+    return topic
+
+
+def make_posts(post_count, body_length=500, seed=None):
+    """Returns a :type:`list` of ``post_count`` transient
+    :class:`fanboi2.models.Post` generated from a fixed seed, all belonging
+    to the same topic created with :func:`make_topic`.
+
+    :param post_count: Number of posts.
+    :param body_length: Approximate length of each post body.
+    :param seed: A seed :type:`int` or :type:`None` for the default seed.
+
+    :type post_count: int
+    :type body_length: int
+    :type seed: int or None
+    :rtype: list
+    """
+    from ..models import Post
+    rand = make_random() if seed is None else make_random(seed)
+    topic = make_topic(post_count, seed)
+    return [Post(
+        id=number,
+        topic=topic,
+        topic_id=topic.id,
+        number=number,
+        name='Nameless Fanboi',
+        ident='ABCDEFGHI',
+        bumped=True,
+        created_at=topic.created_at,
+        ip_address='127.0.0.1',
+        body=post_body(rand, body_length))
+        for number in range(1, post_count + 1)]
+
+
+def make_page(sections=10, formatter='markdown'):
+    """Returns a transient :class:`fanboi2.models.Page` with a Markdown body
+    of ``sections`` sections.
+
+    :param sections: Number of sections in the page body.
+    :param formatter: Formatter of the page.
+
+    :type sections: int
+    :type formatter: str
+    :rtype: fanboi2.models.Page
+    """
+    from ..models import Page
+    rand = make_random()
+    return Page(
+        id=1,
+        namespace='public',
+        slug='benchmark',
+        title='Benchmark',
+        formatter=formatter,
+        body=markdown_body(rand, sections),
+        created_at=timestamp(rand))
@@ -0,0 +1,64 @@
+from . import benchmark
+from .corpus import post_bodies
+from .fixtures import make_request, make_posts, make_page
+
+
+@benchmark('formatters.format_text')
+def format_text():
+    from ..helpers.formatters import format_text
+    bodies = post_bodies(100, 4000)
+
+    def _run():
+        for body in bodies:
+            format_text(body)
+    return _run
+
+
+@benchmark('formatters.format_text_shorten')
+def format_text_shorten():
+    from ..helpers.formatters import format_text, PREVIEW_LENGTH
+    bodies = post_bodies(100, 4000)
+
+    def _run():
+        for body in bodies:
+            format_text(body, PREVIEW_LENGTH)
+    return _run
+
+
+@benchmark('formatters.format_post')
+def format_post():
+    from ..helpers.formatters import format_post
+    request = make_request()
+    posts = make_posts(100, 4000)
+
+    def _run():
+        for post in posts:
+            format_post(None, request, post)
+    return _run
+
+
+@benchmark('formatters.format_markdown')
+def format_markdown():
+    from ..helpers.formatters import format_markdown
+    request = make_request()
+    body = make_page(20).body
+
+    def _run():
+        format_markdown(None, request, body)
+    return _run
+
+
+@benchmark('formatters.rendered_page')
+def rendered_page():
+    from sqlalchemy.orm import make_transient_to_detached
+    from ..helpers.formatters import rendered_page
+    from ..utils import PageCache
+    request = make_request()
+    page = make_page(20)
+    page.version = 1
+    make_transient_to_detached(page)
+    page_cache = PageCache()
+
+    def _run():
+        rendered_page(None, request, page, page_cache)
+    return _run
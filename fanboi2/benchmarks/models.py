@@ -0,0 +1,69 @@
+from . import benchmark
+from .corpus import make_random, ip_addresses
+from .fixtures import make_topic
+
+
+QUERIES = ('1', '253', '100-150', '-150', '100-', 'l5', 'l30', 'recent', 'x')
+
+
+@benchmark('models.topic_scoped_posts')
+def topic_scoped_posts():
+    """Benchmark the query parsing of :meth:`Topic.scoped_posts`. Handlers
+    are replaced on the instance so no database query is made.
+    """
+    topic = make_topic(1000)
+    topic.single_post = topic.ranged_posts = topic.recent_posts = \
+        lambda *args: args
+    queries = QUERIES * 10
+
+    def _run():
+        for query in queries:
+            topic.scoped_posts(query)
+    return _run
+
+
+def _make_rule_index(bans, overrides):
+    from ..models import RuleIndex, RuleBan, RuleOverride
+    rand = make_random()
+    rules = []
+    for i, ip_address in enumerate(ip_addresses(rand, bans + overrides)):
+        prefixlen = rand.choice((8, 16, 24, 32)) if ':' not in ip_address \
+            else rand.choice((32, 48, 64, 128))
+        network = '%s/%d' % (ip_address, prefixlen)
+        scope = rand.choice((None, None, 'board:demo', 'board:foo'))
+        if i < bans:
+            rules.append((RuleBan(
+                id=i,
+                ip_address=network,
+                scope=scope), None))
+        else:
+            override = {'status': 'open'}
+            rules.append((RuleOverride(
+                id=i,
+                ip_address=network,
+                scope=scope,
+                override=override), override))
+
+    class _StaticRuleIndex(RuleIndex):
+
+        def _current_version(self):
+            return None
+
+        def _load(self):
+            return rules
+
+    return _StaticRuleIndex(check_interval=3600, max_age=3600)
+
+
+@benchmark('models.rule_index_match')
+def rule_index_match():
+    rule_index = _make_rule_index(1000, 200)
+    addresses = ip_addresses(make_random(), 200)
+    scopes = ('board:demo',)
+    rule_index.banned(addresses[0], scopes)
+
+    def _run():
+        for ip_address in addresses:
+            rule_index.banned(ip_address, scopes)
+            rule_index.override(ip_address, scopes)
+    return _run
@@ -0,0 +1,172 @@
+from . import benchmark
+from .corpus import make_random, timestamp
+from .fixtures import make_request, make_topic, make_posts, make_page
+
+
+class _DummyResult(object):
+
+    def __init__(self, id_, state, result):
+        self.id = id_
+        self.state = state
+        self.status = state
+        self._result = result
+
+    def get(self):
+        return self._result
+
+
+@benchmark('serializers.datetime')
+def datetime_adapter():
+    from ..serializers import _datetime_adapter
+    request = make_request()
+    rand = make_random()
+    values = [timestamp(rand) for _ in range(100)]
+
+    def _run():
+        for value in values:
+            _datetime_adapter(value, request)
+    return _run
+
+
+@benchmark('serializers.query')
+def query_adapter():
+    from ..serializers import _sqlalchemy_query_adapter
+    request = make_request()
+    posts = make_posts(100, 10)
+
+    def _run():
+        _sqlalchemy_query_adapter(posts, request)
+    return _run
+
+
+@benchmark('serializers.pagination')
+def pagination_serializer():
+    from ..serializers import _pagination_serializer
+    from ..utils import Pagination
+    request = make_request(params={'limit': '50'})
+    pagination = Pagination([], 50, 'MTIzNDU2Nzg5OjEyMw')
+
+    def _run():
+        _pagination_serializer(pagination, request)
+    return _run
+
+
+@benchmark('serializers.board')
+def board_serializer():
+    from ..serializers import _board_serializer
+    request = make_request()
+    board = make_topic().board
+
+    def _run():
+        _board_serializer(board, request)
+    return _run
+
+
+@benchmark('serializers.topic')
+def topic_serializer():
+    from ..serializers import _topic_serializer
+    request = make_request()
+    topic = make_topic(1000)
+
+    def _run():
+        _topic_serializer(topic, request)
+    return _run
+
+
+@benchmark('serializers.post')
+def post_serializer():
+    from ..serializers import _post_serializer
+    request = make_request()
+    posts = make_posts(100, 500)
+
+    def _run():
+        for post in posts:
+            _post_serializer(post, request)
+    return _run
+
+
+@benchmark('serializers.post_sparse')
+def post_serializer_sparse():
+    from ..serializers import _post_serializer
+    request = make_request(params={'fields[post]': 'number,ident,body'})
+    posts = make_posts(100, 500)
+
+    def _run():
+        for post in posts:
+            _post_serializer(post, request)
+    return _run
+
+
+@benchmark('serializers.page')
+def page_serializer():
+    from ..serializers import _page_serializer
+    request = make_request()
+    page = make_page(10)
+
+    def _run():
+        _page_serializer(page, request)
+    return _run
+
+
+@benchmark('serializers.result_proxy')
+def result_proxy_serializer():
+    from ..serializers import _result_proxy_serializer
+    from ..tasks import ResultProxy
+    request = make_request()
+    result = ResultProxy(_DummyResult(
+        '2b1e9a4c-a46e-4a43-9a1d-4d6a4c1a3e0f',
+        'SUCCESS',
+        ('failure', 'spam_rejected')))
+
+    def _run():
+        _result_proxy_serializer(result, request)
+    return _run
+
+
+@benchmark('serializers.async_result')
+def async_result_serializer():
+    from ..serializers import _async_result_serializer
+    request = make_request()
+    result = _DummyResult(
+        '2b1e9a4c-a46e-4a43-9a1d-4d6a4c1a3e0f',
+        'PENDING',
+        None)
+
+    def _run():
+        _async_result_serializer(result, request)
+    return _run
+
+
+@benchmark('serializers.error')
+def base_error_serializer():
+    from ..serializers import _base_error_serializer
+    from ..errors import RateLimitedError
+    request = make_request()
+    error = RateLimitedError(10)
+
+    def _run():
+        _base_error_serializer(error, request)
+    return _run
+
+
+def _json_renderer(name):
+    from ..serializers import initialize_renderer
+    from ..utils import Pagination
+    request = make_request()
+    posts = make_posts(100, 500)
+    renderer = initialize_renderer(name)(None)
+    pagination = Pagination(posts, 100, None)
+
+    def _run():
+        renderer(pagination, {'request': request})
+    return _run
+
+
+@benchmark('serializers.renderer')
+def json_renderer():
+    return _json_renderer('fast')
+
+
+@benchmark('serializers.renderer_pyramid')
+def pyramid_json_renderer():
+    return _json_renderer('pyramid')
@@ -0,0 +1,39 @@
+from . import benchmark
+
+
+CHECKLIST = (
+    'country:th/akismet,dnsbl,proxy_detect',
+    'country:jp/proxy_detect',
+    'country:us/akismet',
+    '*/*',
+)
+SCOPES = ('country:th', 'country:jp', 'country:us', 'country:gb', '')
+TARGETS = ('akismet', 'dnsbl', 'proxy_detect', 'ban', 'status')
+
+
+@benchmark('utils.checklist_enabled')
+def checklist_enabled():
+    from ..utils import Checklist
+    checklist = Checklist()
+    checklist.configure_checklist(CHECKLIST)
+
+    def _run():
+        for scope in SCOPES:
+            for target in TARGETS:
+                checklist.enabled(scope, target)
+    return _run
+
+
+@benchmark('utils.route_templates')
+def route_templates():
+    from ..utils import RouteTemplates
+    from .fixtures import make_request
+    request = make_request()
+    queries = [str(n) for n in range(1, 1001)]
+
+    def _run():
+        templates = RouteTemplates(request)
+        path = templates.template('topic_scoped', board='demo', topic=1)
+        for query in queries:
+            path(query=query)
+    return _run
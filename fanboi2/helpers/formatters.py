@@ -1,3 +1,4 @@
+import hashlib
 import html
 import isodate
 import misaka
@@ -5,9 +6,12 @@ import pytz
 import re
 import urllib
 import urllib.parse as urlparse
-from collections import OrderedDict
-from html.parser import HTMLParser
+from collections import OrderedDict, namedtuple
 from markupsafe import Markup
+from pyramid.request import Request
+from pyramid.threadlocal import get_current_registry, get_current_request
+from sqlalchemy import inspect
+from ..utils import RouteTemplates, page_cache as page_cache_
 
 
 RE_PARAGRAPH = re.compile(r'(?:(?P<newline>\r\n|\n|\r)(?P=newline)+)')
@@ -41,6 +45,16 @@ RE_LINK = re.compile(r"""
  )
 """, re.VERBOSE)
 
+RE_LINK_TEXT = re.compile(r"""
+ (?:http|ftp|https)    # Protocols
+ \:\/\/                # Separator
+ [a-zA-Z0-9\-]+        # Sub-domain
+ \.                    # Dot
+ [a-zA-Z0-9.\-]+       # Domain, or TLD
+ \/?                   # Slash
+ [^\s*]+               # Link, all characters except space
+""", re.VERBOSE)
+
 
 class PostMarkup(Markup):
     """Works like :class:`Markup` but allow passing in hints for post
@@ -106,6 +120,113 @@ def url_fix(string):
     return urlparse.urlunsplit((scheme, netloc, path, qs, anchor))
 
 
+def _format_link(link, anchor_cross=None, anchor=None):
+    """Render a link matched by :data:`RE_LINK_TEXT` from unescaped text into
+    HTML. The link is unquoted and unescaped in the same order as if it was
+    matched from escaped text so the result is identical to :data:`RE_LINK`.
+    If ``anchor_cross`` and ``anchor`` are given, anchors that appear inside
+    the rendered link are also converted.
+    """
+    link = html.unescape(urlparse.unquote(html.escape(link)))
+    result = TP_LINK % (url_fix(link), html.escape(link))
+    if anchor is not None and '&gt;&gt;' in result:
+        result = RE_ANCHOR_CROSS.sub(
+            lambda m: anchor_cross(*m.groups()),
+            result)
+        result = RE_ANCHOR.sub(
+            lambda m: anchor(*m.groups()),
+            result)
+    return result
+
+
+def _format_paragraph(lines, anchor_cross=None, anchor=None):
+    """Render lines of unescaped text into a HTML paragraph in a single
+    pass, converting links and, if ``anchor_cross`` and ``anchor`` are
+    given, anchors. Links take precedence over anchors. Neither links nor
+    anchors may span multiple lines, so lines are rendered together and
+    line breaks are replaced with ``<br>`` afterwards.
+    """
+    text = '\n'.join(lines)
+    parts = []
+    pos = 0
+    if '://' in text:
+        for match in RE_LINK_TEXT.finditer(text):
+            start, end = match.span()
+            if start > pos:
+                _format_anchors(parts, text[pos:start], anchor_cross, anchor)
+            parts.append(_format_link(match.group(0), anchor_cross, anchor))
+            pos = end
+    if pos == 0:
+        _format_anchors(parts, text, anchor_cross, anchor)
+    elif pos < len(text):
+        _format_anchors(parts, text[pos:], anchor_cross, anchor)
+    return TP_PARAGRAPH % ''.join(parts)
+
+
+def _format_anchors(parts, text, anchor_cross=None, anchor=None):
+    """Append escaped ``text`` to ``parts`` with line breaks replaced with
+    ``<br>`` and anchors converted into links if ``anchor_cross`` and
+    ``anchor`` are given.
+    """
+    if anchor is None or '>>' not in text:
+        parts.append(html.escape(text).replace('\n', '<br>'))
+        return
+    pos = 0
+    for match in RE_ANCHOR_TEXT.finditer(text):
+        start, end = match.span()
+        if start > pos:
+            parts.append(html.escape(text[pos:start]).replace('\n', '<br>'))
+        groups = match.groups()
+        if groups[0] is not None:
+            parts.append(anchor_cross(*groups[:6]))
+        else:
+            parts.append(anchor(*groups[6:]))
+        pos = end
+    if pos < len(text):
+        parts.append(html.escape(text[pos:]).replace('\n', '<br>'))
+
+
+def _format_text(text, shorten=None, anchor_cross=None, anchor=None):
+    """Tokenize and render ``text`` into a list of HTML paragraphs in a
+    single pass over its lines and paragraphs. Returns a 3-tuple of the
+    paragraphs, the length of text rendered and whether the text was
+    shortened.
+    """
+    output = []
+    paragraph = None
+    length = 0
+    shortened = False
+
+    lines = [line.strip() for line in text.splitlines()]
+    for line in lines:
+        if not line:
+            if paragraph is not None:
+                output.append(
+                    _format_paragraph(paragraph, anchor_cross, anchor))
+                paragraph = None
+            continue
+        if paragraph is None:
+            paragraph = []
+        if shorten and length >= shorten:
+            shortened = True
+            break
+        paragraph.append(line)
+        length += len(line)
+
+    if paragraph is not None:
+        output.append(_format_paragraph(paragraph, anchor_cross, anchor))
+
+    # Display thumbnail at the end of post.
+    if '://' in text:
+        thumbnails = extract_thumbnail('\n'.join(lines))
+        if thumbnails:
+            output.append(TP_THUMB_PARAGRAPH % ''.join(
+                TP_THUMB % (link, thumbnail)
+                for thumbnail, link in thumbnails))
+
+    return output, length, shortened
+
+
 def format_text(text, shorten=None):
     """Format lines of text into HTML. Split into paragraphs at two or more
     consecutive newlines and adds `<br>` to any line with line break. If
@@ -121,43 +242,7 @@ def format_text(text, shorten=None):
     :type shorten: int or None
     :rtype: PostMarkup
     """
-    output = []
-    thumbs = []
-    length = 0
-    shortened = False
-
-    # Auto-link
-    def _replace_link(match):
-        link = HTMLParser().unescape(urlparse.unquote(match.group(0)))
-        return Markup(TP_LINK % (
-            url_fix(link),
-            html.escape(link)))
-
-    # Turns text into paragraph.
-    text = "\n".join((t.strip() for t in text.splitlines()))  # Cleanup
-    for paragraph in RE_PARAGRAPH.split(text):
-        paragraph = paragraph.strip()
-        if paragraph:
-            lines = []
-            for line in paragraph.splitlines():
-                if shorten and length >= shorten:
-                    shortened = True
-                    break
-                lines.append(html.escape(line))
-                length += len(line)
-            paragraph = TP_PARAGRAPH % '<br>'.join(lines)
-            paragraph = RE_LINK.sub(_replace_link, paragraph)
-            output.append(paragraph)
-            if shortened:
-                break
-
-    # Display thumbnail at the end of post.
-    thumbnails = extract_thumbnail(text)
-    if thumbnails:
-        for thumbnail, link in extract_thumbnail(text):
-            thumbs.append(TP_THUMB % (link, thumbnail))
-        output.append(TP_THUMB_PARAGRAPH % ''.join(thumbs))
-
+    output, length, shortened = _format_text(text, shorten)
     markup = PostMarkup('\n'.join(output))
     markup.length = length
     markup.shortened = shortened
@@ -194,6 +279,15 @@ RE_ANCHOR_CROSS = re.compile(r"""
   (?:\/(\d+)(\-)?(\d+)?)     # Post id
   ?(\/?)                     # Trailing slash
 """ % html.escape('>>>'), re.VERBOSE)
+RE_ANCHOR_TEXT = re.compile(r"""
+  >>>\/                      # Cross anchor syntax start
+  (\w+)                      # Board name
+  (?:\/(\d+))?               # Topic id
+  (?:\/(\d+)(\-)?(\d+)?)     # Post id
+  ?(\/?)                     # Trailing slash
+  |
+  >>(\d+)(\-)?(\d+)?          # Anchor
+""", re.VERBOSE)
 TP_ANCHOR_CROSS = ''.join("""
 <a data-anchor-board="%s"
  data-anchor-topic="%s"
@@ -211,7 +305,30 @@ Post shortened. <a href="%s" class="anchor">See full post</a>.
 """.splitlines())
 
 
-def format_post(context, request, post, shorten=None):
+def route_template(context, request, name, **kwargs):
+    """Returns a :class:`fanboi2.utils.RouteTemplate` for route ``name``
+    with placeholders in ``kwargs`` bound to it. The template is shared
+    for the lifetime of the request.
+
+    :param context: A :class:`mako.runtime.Context` object.
+    :param request: A :class:`pyramid.request.Request` object.
+    :param name: A route name.
+    :param kwargs: Placeholder values to bind.
+
+    :type context: mako.runtime.Context or None
+    :type request: pyramid.request.Request
+    :type name: str
+    :type kwargs: dict
+    :rtype: fanboi2.utils.RouteTemplate
+    """
+    templates = getattr(request, 'route_templates', None)
+    if templates is None:
+        templates = request.route_templates = RouteTemplates(request)
+    return templates.template(name, **kwargs)
+
+
+def format_post(context, request, post, shorten=None,
+                board_slug=None, topic_id=None):
     """Works similar to :func:`format_text` but also process link within
     the same topic, i.e. a `>>52` anchor syntax will create a link to
     post numbered 52 in the same topic, as well as display "click to see
@@ -222,39 +339,51 @@ def format_post(context, request, post, shorten=None):
     :param post: A :class:`fanboi2.models.Post` object.
     :param shorten: An :type:`int` or :type:`None` that gets passed to
                     :func:`format_text`.
+    :param board_slug: Slug of the board the post belongs to. Looked up
+                       from the post if not given.
+    :param topic_id: ID of the topic the post belongs to. Looked up from
+                     the post if not given.
 
     :type context: mako.runtime.Context or None
     :type request: pyramid.request.Request
     :type post: fanboi2.models.Post
     :type shorten: int or None
+    :type board_slug: str or None
+    :type topic_id: int or None
     :rtype: Markup
     """
-    text = format_text(post.body, shorten)
-
-    # Append click to see more link if post is shortened.
-    try:
-        if text.shortened:
-            text += Markup("\n" + TP_SHORTENED % (
-                request.route_path('topic_scoped',
-                                   board=post.topic.board.slug,
-                                   topic=post.topic.id,
-                                   query="%s-" % post.number)))
-    except AttributeError:  # pragma: no cover
-        pass
+    topic_path = None
+
+    # Resolving the topic path is deferred until the first anchor so
+    # posts without anchors never touch the topic or board.
+    def _topic_path():
+        nonlocal board_slug, topic_id, topic_path
+        if topic_path is None:
+            if topic_id is None:
+                topic_id = post.topic.id
+            if board_slug is None:
+                board_slug = post.topic.board.slug
+            topic_path = route_template(
+                context,
+                request,
+                'topic_scoped',
+                board=board_slug,
+                topic=topic_id)
+        return topic_path
 
     # Convert cross anchor (>>>/demo/123/1-10) into link.
-    def _anchor_cross(match):
-        board = match.groups()[0]
-        topic = match.groups()[1] if match.groups()[1] else ''
-        anchor = ''.join([m for m in match.groups()[2:-1] if m is not None])
-        trail = match.groups()[-1]
+    def _anchor_cross(board, topic, *groups):
+        topic = topic if topic else ''
+        anchor = ''.join([m for m in groups[:-1] if m is not None])
+        trail = groups[-1]
 
         if board and topic:
-            args = {'board': board, 'topic': topic, 'query': anchor}
-            args['query'] = anchor if anchor else 'recent'
-            path = request.route_path('topic_scoped', **args)
+            path = route_template(context, request, 'topic_scoped')(
+                board=board,
+                topic=topic,
+                query=anchor if anchor else 'recent')
         else:
-            path = request.route_path('board', board=board)
+            path = route_template(context, request, 'board')(board=board)
 
         text = []
         for part in (board, topic, anchor):
@@ -262,24 +391,148 @@ def format_post(context, request, post, shorten=None):
                 text.append(part)
         text = html.escape(">>>/%s" % '/'.join(text))
         text += str(trail) if trail else ''
-        return Markup(TP_ANCHOR_CROSS % (board, topic, anchor, path, text))
-
-    text = RE_ANCHOR_CROSS.sub(_anchor_cross, text)
+        return TP_ANCHOR_CROSS % (board, topic, anchor, path, text)
 
     # Convert post anchor (>>123) into link.
-    def _anchor(match):
-        anchor = ''.join([m for m in match.groups() if m is not None])
-        return Markup(TP_ANCHOR % (
-            post.topic.id,
+    def _anchor(*groups):
+        anchor = ''.join([m for m in groups if m is not None])
+        path = _topic_path()(query=anchor)
+        return TP_ANCHOR % (
+            topic_id,
             anchor,
-            request.route_path('topic_scoped',
-                               board=post.topic.board.slug,
-                               topic=post.topic.id,
-                               query=anchor),
-            html.escape(">>%s" % anchor),))
-    text = RE_ANCHOR.sub(_anchor, text)
+            path,
+            html.escape(">>%s" % anchor),)
+
+    output, length, shortened = _format_text(
+        post.body,
+        shorten,
+        _anchor_cross,
+        _anchor)
+
+    # Append click to see more link if post is shortened.
+    try:
+        if shortened:
+            output.append(TP_SHORTENED % (
+                _topic_path()(query="%s-" % post.number),))
+    except AttributeError:  # pragma: no cover
+        pass
+
+    return Markup('\n'.join(output))
+
+
+FORMATTER_VERSION = 1
+PREVIEW_LENGTH = 500
+
+
+def _root_request(request=None):
+    """Returns ``request`` if the application is mounted at the root, or a
+    blank :class:`pyramid.request.Request` bound to the same registry
+    otherwise, so paths generated from it never include the script name.
+    If ``request`` is not given, the current request is used, or the
+    current registry outside of a web request, e.g. in a worker that was
+    bootstrapped with the application registry.
 
-    return Markup(text)
+    :param request: A :class:`pyramid.request.Request` object.
+    :type request: pyramid.request.Request or None
+    :rtype: pyramid.request.Request
+    """
+    if request is None:
+        request = get_current_request()
+    if request is not None and not request.script_name:
+        return request
+    root_request = Request.blank('/')
+    if request is not None:
+        root_request.registry = request.registry
+    else:
+        root_request.registry = get_current_registry()
+    return root_request
+
+
+def _script_prefixed(request, html):
+    """Prefix paths in ``html`` stored by :func:`render_post` with the
+    script name of ``request``.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param html: A route-relative HTML :type:`str`.
+
+    :type request: pyramid.request.Request
+    :type html: str
+    :rtype: str
+    """
+    if not request.script_name:
+        return html
+    return html.replace('href="/', 'href="%s/' % (request.script_name,))
+
+
+def render_post(request, post):
+    """Render the full HTML and the shortened preview of ``post`` with
+    :func:`format_post` and store it in :attr:`Post.render` tagged with
+    :data:`FORMATTER_VERSION`. The post must already have its number and
+    topic assigned, i.e. it must have been flushed.
+
+    Paths in the stored HTML are always generated as if the application is
+    mounted at the root, since posts may be rendered by a worker that does
+    not know the script name of the web server. The script name of the
+    serving request is prepended by :func:`rendered_post`. The stored
+    render is only changed once both versions were formatted, so a post is
+    left as-is if formatting raised.
+
+    :param request: A :class:`pyramid.request.Request` object, or
+                    :type:`None` to use the current request or registry.
+    :param post: A :class:`fanboi2.models.Post` object.
+
+    :type request: pyramid.request.Request or None
+    :type post: fanboi2.models.Post
+    :rtype: fanboi2.models.PostRender
+    """
+    from ..models import PostRender
+    request = _root_request(request)
+    body = str(format_post(None, request, post))
+    body_preview = str(format_post(None, request, post, PREVIEW_LENGTH))
+    if body_preview == body:
+        body_preview = None
+
+    render = post.render
+    if render is None:
+        render = post.render = PostRender()
+    render.version = FORMATTER_VERSION
+    render.body = body
+    render.body_preview = body_preview
+    return render
+
+
+def rendered_post(context, request, post, shorten=None,
+                  board_slug=None, topic_id=None):
+    """Works like :func:`format_post` but returns the HTML stored by
+    :func:`render_post` if it was rendered by the current formatter version
+    so no formatting work is done. Falls back to :func:`format_post` if the
+    post was not rendered or ``shorten`` is not :data:`PREVIEW_LENGTH`.
+
+    :param context: A :class:`mako.runtime.Context` object.
+    :param request: A :class:`pyramid.request.Request` object.
+    :param post: A :class:`fanboi2.models.Post` object.
+    :param shorten: An :type:`int` or :type:`None` that gets passed to
+                    :func:`format_text`.
+    :param board_slug: Board slug that gets passed to :func:`format_post`.
+    :param topic_id: Topic ID that gets passed to :func:`format_post`.
+
+    :type context: mako.runtime.Context or None
+    :type request: pyramid.request.Request
+    :type post: fanboi2.models.Post
+    :type shorten: int or None
+    :type board_slug: str or None
+    :type topic_id: int or None
+    :rtype: Markup
+    """
+    render = post.render
+    if render is not None and render.version == FORMATTER_VERSION:
+        if shorten is None:
+            return Markup(_script_prefixed(request, render.body))
+        elif shorten == PREVIEW_LENGTH:
+            if render.body_preview is not None:
+                return Markup(_script_prefixed(request, render.body_preview))
+            return Markup(_script_prefixed(request, render.body))
+    return format_post(context, request, post, shorten, board_slug, topic_id)
 
 
 def format_page(context, request, page):
@@ -302,6 +555,80 @@ def format_page(context, request, page):
     return Markup(html.escape(page.body))
 
 
+RenderedPage = namedtuple('RenderedPage', ['body', 'etag'])
+
+
+def page_etag(page_id, version):
+    """Returns an entity tag for the page ``page_id`` at ``version``.
+
+    :param page_id: A page ID.
+    :param version: A page version.
+
+    :type page_id: int
+    :type version: int
+    :rtype: str
+    """
+    parts = ('page', page_id, version, FORMATTER_VERSION)
+    return hashlib.md5(repr(parts).encode('utf8')).hexdigest()
+
+
+def render_page(page):
+    """Render ``page`` with :func:`format_page` without using the cache.
+
+    :param page: A :class:`fanboi2.models.Page` object.
+
+    :type page: fanboi2.models.Page
+    :rtype: RenderedPage
+    """
+    return RenderedPage(
+        format_page(None, None, page),
+        page_etag(page.id, page.version))
+
+
+def _has_uncommitted_changes(page):
+    """Returns :type:`True` if ``page`` was changed in the current session
+    but not yet committed, in which case its content may not match what
+    other sessions will see at the same version.
+
+    :param page: A :class:`fanboi2.models.Page` object.
+
+    :type page: fanboi2.models.Page
+    :rtype: bool
+    """
+    state = inspect(page)
+    if state.transient or state.pending or state.modified:
+        return True
+    session = state.session
+    return session is not None and \
+        page.id in session.info.get('rendered_pages', {})
+
+
+def rendered_page(context, request, page, page_cache=page_cache_):
+    """Returns a :class:`RenderedPage` of ``page`` containing the formatted
+    page content as :class:`Markup` and its entity tag. Rendered pages are
+    cached by page ID and version so the page is only formatted when it
+    is changed. Pages with uncommitted changes are never cached.
+
+    :param context: A :class:`mako.runtime.Context` object.
+    :param request: A :class:`pyramid.request.Request` object.
+    :param page: A :class:`fanboi2.models.Page` object.
+    :param page_cache: A :class:`fanboi2.utils.PageCache` object.
+
+    :type context: mako.runtime.Context or None
+    :type request: pyramid.request.Request
+    :type page: fanboi2.models.Page
+    :type page_cache: fanboi2.utils.PageCache
+    :rtype: RenderedPage
+    """
+    if _has_uncommitted_changes(page):
+        return render_page(page)
+    rendered = page_cache.get(page.id, page.version)
+    if rendered is None:
+        rendered = render_page(page)
+        page_cache.set(page.id, page.version, rendered)
+    return rendered
+
+
 def format_datetime(context, request, dt):
     """Format datetime into a human-readable format.
 
@@ -1,13 +1,21 @@
-from sqlalchemy import event
-from sqlalchemy.sql import desc, func, select
+import logging
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event, inspect
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql import desc, func, or_, select
 from ._base import DBSession, Base, JsonType
 from ._identity import Identity
+from ._notifier import Notifier, topic_channel, task_channel
 from ._redis_proxy import RedisProxy
+from ._rule_index import RuleIndex
 from ._versioned import make_versioned
 from .board import Board
 from .topic import Topic
 from .topic_meta import TopicMeta
 from .post import Post
+from .post_render import PostRender
 from .page import Page
 from .rule import Rule
 from .rule_ban import RuleBan
@@ -19,6 +27,7 @@ _MODELS = {
     'topic': Topic,
     'topic_meta': TopicMeta,
     'post': Post,
+    'post_render': PostRender,
     'rule': Rule,
     'rule_ban': RuleBan,
     'rule_override': RuleOverride,
@@ -28,42 +37,278 @@ def serialize_model(type_):
     return _MODELS.get(type_)
 
 
+log = logging.getLogger(__name__)
 redis_conn = RedisProxy()
 identity = Identity(redis=redis_conn)
+rule_index = RuleIndex(redis=redis_conn)
+notifier = Notifier(redis=redis_conn)
 make_versioned(DBSession)
 
 
 @event.listens_for(DBSession, 'before_flush')
 def _create_topic_meta(session, context, instances):
-    """Assign a new topic meta to a topic on creation."""
+    """Assign a new topic meta to a topic on creation. The topic is
+    considered bumped at its creation time until it receives a bump post.
+    """
     for topic in filter(lambda m: isinstance(m, Topic), session.new):
         if topic.meta is None:
-            topic.meta = TopicMeta(post_count=0)
+            topic.meta = TopicMeta(post_count=0, bumped_at=topic.created_at)
+
+
+@event.listens_for(DBSession, 'before_flush')
+def _move_topic_meta(session, context, instances):
+    """Keep the board of topic meta in sync when a topic is moved."""
+    for topic in filter(lambda m: isinstance(m, Topic), session.dirty):
+        if topic.meta is not None and \
+           inspect(topic).attrs.board.history.has_changes():
+            topic.meta.board_id = topic.board.id
+
+
+@event.listens_for(DBSession, 'before_flush')
+def _bump_topic_meta_version(session, context, instances):
+    """Increment the version of topic meta when posts in the topic are
+    edited or deleted. New posts are already reflected in the post count.
+    """
+    topic_ids = set()
+    for post in filter(lambda m: isinstance(m, Post), session.deleted):
+        topic_ids.add(post.topic_id)
+    for post in filter(lambda m: isinstance(m, Post), session.dirty):
+        state = inspect(post)
+        for attr in state.mapper.column_attrs:
+            if state.attrs[attr.key].history.has_changes():
+                topic_ids.add(post.topic_id)
+                break
+    topic_ids.discard(None)
+    if not topic_ids:
+        return
+
+    table = TopicMeta.__table__
+    query = table.update().\
+        where(table.c.topic_id.in_(topic_ids)).\
+        values(version=table.c.version + 1).\
+        returning(table.c.topic_id, table.c.version)
+    for topic_id, version in session.execute(query):
+        topic_meta = session.identity_map.get(
+            session.identity_key(TopicMeta, topic_id))
+        if topic_meta is not None:
+            set_committed_value(topic_meta, 'version', version)
+
+
+def _reserve_post_numbers(session, topic, posts):
+    """Reserve consecutive post numbers for ``posts`` in ``topic`` and return
+    the last reserved number. Numbers are reserved and topic timestamps are
+    updated with a single ``UPDATE ... RETURNING`` statement in the current
+    transaction, so the committed topic meta is always consistent with the
+    committed posts. Like ``SELECT ... FOR UPDATE``, the statement locks the
+    topic meta row until the transaction is committed, so posts to the same
+    topic are still serialized.
+
+    :param session: A :class:`sqlalchemy.orm.session.Session` object.
+    :param topic: A :class:`Topic` object to reserve numbers in.
+    :param posts: A :type:`list` of :class:`Post` in insertion order.
+
+    :type session: sqlalchemy.orm.session.Session
+    :type topic: Topic
+    :type posts: list
+    :rtype: int
+    """
+    table = TopicMeta.__table__
+    values = {
+        'post_count': table.c.post_count + len(posts),
+        'posted_at': posts[-1].created_at or func.now(),
+    }
+
+    bumped_posts = [p for p in posts if p.bumped is None or p.bumped]
+    if bumped_posts:
+        values['bumped_at'] = bumped_posts[-1].created_at or func.now()
+
+    query = table.update().\
+        where(table.c.topic_id == topic.id).\
+        values(**values).\
+        returning(table.c.post_count, table.c.posted_at, table.c.bumped_at)
+
+    row = session.connection().execute(query).first()
+    if row is None:
+        raise NoResultFound('No topic meta found for topic %s' % (topic.id,))
+
+    topic_meta = session.identity_map.get(
+        session.identity_key(TopicMeta, topic.id))
+    if topic_meta is not None:
+        for key in ('post_count', 'posted_at', 'bumped_at'):
+            set_committed_value(topic_meta, key, row[key])
+    return row['post_count']
 
 
 @event.listens_for(DBSession, 'before_flush')
 def _update_topic_meta_states(session, context, instance):
-    """Update topic metadata and related states when new posts are made."""
-    for post in filter(lambda m: isinstance(m, Post), session.new):
-        topic = post.topic
+    """Update topic metadata and related states when new posts are made.
+    Posts are numbered in the order they were added to the session so a
+    batch of posts flushed together will receive consecutive numbers.
+    """
+    posts = sorted(
+        filter(lambda m: isinstance(m, Post), session.new),
+        key=lambda m: inspect(m).insert_order)
+
+    topics = OrderedDict()
+    for post in posts:
+        topics.setdefault(post.topic, []).append(post)
+
+    for topic, topic_posts in topics.items():
         board = topic.board
         if topic in session.new:
             topic_meta = topic.meta
+            topic_meta.post_count += len(topic_posts)
+            topic_meta.posted_at = topic_posts[-1].created_at or func.now()
+            for post in topic_posts:
+                if post.bumped is None or post.bumped:
+                    topic_meta.bumped_at = post.created_at or func.now()
+            session.add(topic_meta)
+            post_count = topic_meta.post_count
         else:
-            topic_meta = session.query(TopicMeta).\
-                         filter_by(topic=topic).\
-                         with_for_update().\
-                         one()
+            post_count = _reserve_post_numbers(session, topic, topic_posts)
 
-        topic_meta.post_count = post.number = topic_meta.post_count + 1
-        topic_meta.posted_at = post.created_at or func.now()
-        if post.bumped is None or post.bumped:
-            topic_meta.bumped_at = topic_meta.posted_at
+        first_number = post_count - len(topic_posts) + 1
+        for number, post in enumerate(topic_posts, first_number):
+            post.number = number
+            session.add(post)
 
         if topic.status == 'open' and \
-           topic_meta.post_count >= board.settings['max_posts']:
+           post_count >= board.settings['max_posts']:
             topic.status = 'archived'
 
-        session.add(topic_meta)
         session.add(topic)
-        session.add(post)
+
+
+@event.listens_for(DBSession, 'before_flush')
+def _render_changed_posts(session, context, instances):
+    """Render posts whose body was changed again so the outdated HTML will
+    never be served. If the post failed to render, its outdated HTML is
+    discarded instead and the post will be formatted when it is read.
+    """
+    from ..helpers.formatters import render_post
+    for post in filter(lambda m: isinstance(m, Post), session.dirty):
+        if inspect(post).attrs.body.history.has_changes():
+            try:
+                render_post(None, post)
+            except Exception:
+                log.exception('Failed to render post %s.', post.id)
+                if post.render is not None:
+                    session.delete(post.render)
+                    set_committed_value(post, 'render', None)
+
+
+@event.listens_for(DBSession, 'before_flush')
+def _discard_moved_renders(session, context, instances):
+    """Discard the pre-rendered HTML of posts in topics that were moved to
+    another board and in boards whose slug was changed, since the stored
+    HTML links to the topic under its board slug. Discarded posts will be
+    formatted when they are read until re-rendered with ``fb2_post_render``.
+    """
+    post_table = Post.__table__
+    topic_table = Topic.__table__
+    conditions = []
+    for obj in session.dirty:
+        if isinstance(obj, Topic) and \
+           inspect(obj).attrs.board.history.has_changes():
+            conditions.append(post_table.c.topic_id == obj.id)
+        elif isinstance(obj, Board) and \
+                inspect(obj).attrs.slug.history.has_changes():
+            conditions.append(post_table.c.topic_id.in_(
+                select([topic_table.c.id]).
+                where(topic_table.c.board_id == obj.id)))
+    if not conditions:
+        return
+
+    render_table = PostRender.__table__
+    query = render_table.delete().\
+        where(render_table.c.post_id.in_(
+            select([post_table.c.id]).where(or_(*conditions)))).\
+        returning(render_table.c.post_id)
+    for post_id, in session.execute(query):
+        render = session.identity_map.get(
+            session.identity_key(PostRender, post_id))
+        if render is not None:
+            session.expunge(render)
+        post = session.identity_map.get(session.identity_key(Post, post_id))
+        if post is not None:
+            set_committed_value(post, 'render', None)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _track_new_posts(session, context):
+    """Record the highest post number flushed to each topic so waiting
+    clients can be notified once the posts are committed.
+    """
+    for post in filter(lambda m: isinstance(m, Post), session.new):
+        new_posts = session.info.setdefault('new_posts', {})
+        if post.number > new_posts.get(post.topic_id, 0):
+            new_posts[post.topic_id] = post.number
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _publish_new_posts(session):
+    """Notify clients waiting for new posts after posts are committed."""
+    for topic_id, number in session.info.pop('new_posts', {}).items():
+        notifier.publish(topic_channel(topic_id), number)
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def _discard_new_posts(session):
+    """Discard new posts that were rolled back."""
+    session.info.pop('new_posts', None)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _track_rule_changes(session, context):
+    """Discard the rule index of this process when rules are changed and
+    mark the session so the change can be published on commit.
+    """
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Rule):
+            session.info['rule_changed'] = True
+            rule_index.invalidate()
+            break
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _publish_rule_changes(session):
+    """Notify all processes to reload their rule index after rules changes
+    are committed.
+    """
+    if session.info.pop('rule_changed', False):
+        rule_index.bump()
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def _discard_rule_changes(session):
+    """Discard the rule index that may contain rolled back rules."""
+    if session.info.pop('rule_changed', False):
+        rule_index.invalidate()
+
+
+@event.listens_for(DBSession, 'after_flush')
+def _render_changed_pages(session, context):
+    """Render pages that were created or changed so the rendered pages can
+    be cached once they are committed.
+    """
+    from ..helpers.formatters import render_page
+    for page in filter(
+            lambda m: isinstance(m, Page),
+            chain(session.new, session.dirty)):
+        rendered_pages = session.info.setdefault('rendered_pages', {})
+        rendered_pages[page.id] = (page.version, render_page(page))
+
+
+@event.listens_for(DBSession, 'after_commit')
+def _cache_rendered_pages(session):
+    """Cache pages rendered in this session after they are committed."""
+    from ..utils import page_cache
+    rendered_pages = session.info.pop('rendered_pages', {})
+    for page_id, (version, rendered) in rendered_pages.items():
+        page_cache.set(page_id, version, rendered)
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def _discard_rendered_pages(session):
+    """Discard pages rendered from changes that were rolled back."""
+    session.info.pop('rendered_pages', None)
@@ -1,17 +1,48 @@
 import datetime
 import hashlib
+import hmac
 import pytz
 import random
 import string
 
 
 class Identity(object):
-    """Generates a unique user identity for each user based on IP address."""
+    """Generates a unique user identity for each user based on IP address.
+
+    With the ``redis`` engine (the default) a random ident is stored in Redis
+    for each user per day. With the ``hmac`` engine the ident is derived from
+    an HMAC of the IP address and namespace keyed by a secret that rotates
+    daily, so no state is stored and the same ident is always generated for
+    the same user within a day.
+    """
     STRINGS = string.ascii_letters + string.digits + "+/."
+    ENGINES = ('redis', 'hmac')
 
     def __init__(self, redis=None):
         self.timezone = pytz.utc
         self.redis = redis
+        self.engine = 'redis'
+        self.secret = None
+
+    def configure_engine(self, engine, secret=None):
+        """Configure ident engine to use for ident generation. The ``hmac``
+        engine requires ``secret`` to be configured.
+
+        :param engine: Either ``redis`` or ``hmac``. Defaults to ``redis``
+                       if empty.
+        :param secret: A secret :type:`str` to derive daily HMAC keys from.
+
+        :type engine: str
+        :type secret: str
+        :rtype: None
+        """
+        engine = engine or 'redis'
+        if engine not in self.ENGINES:
+            raise ValueError('Unknown ident engine %r' % (engine,))
+        if engine == 'hmac' and not secret:
+            raise ValueError('The hmac ident engine requires a secret')
+        self.engine = engine
+        self.secret = secret
 
     def configure_tz(self, timezone):
         """Configure timezone to use for key generation.
@@ -34,16 +65,49 @@ class Identity(object):
         :type namespace: str
         :rtype: str
         """
-        today = datetime.datetime.now(self.timezone).strftime("%Y%m%d")
-        return "ident:%s:%s:%s" % (today,
+        return "ident:%s:%s:%s" % (self._today(),
                                    namespace,
                                    hashlib.md5(ip_address.encode('utf8')).
                                        hexdigest())
 
+    def _today(self):
+        """Returns the current date in the configured timezone.
+
+        :rtype: str
+        """
+        return datetime.datetime.now(self.timezone).strftime("%Y%m%d")
+
+    def _hmac_ident(self, ip_address, namespace="default"):
+        """Derive an ident for :attr:`ip_address` under namespace
+        :attr:`namespace` from an HMAC keyed by a secret derived from the
+        configured secret and the current date.
+
+        :param ip_address: An IP address :type:`str`.
+        :param namespace: A namespace :type:`str` to generate ident in.
+        :type ip_address: str
+        :type namespace: str
+        :rtype: str
+        """
+        daily_key = hmac.new(
+            self.secret.encode('utf8'),
+            self._today().encode('utf8'),
+            hashlib.sha256).digest()
+        digest = hmac.new(
+            daily_key,
+            ("%s:%s" % (namespace, ip_address)).encode('utf8'),
+            hashlib.sha256).digest()
+        value = int.from_bytes(digest, 'big')
+        chars = []
+        for x in range(9):
+            value, index = divmod(value, len(self.STRINGS))
+            chars.append(self.STRINGS[index])
+        return ''.join(chars)
+
     def get(self, *args, **kwargs):
         """Retrieve user ident from Redis or generate a new one if it does
         not already exists. Ident is generated from a random string and
-        expired every 24 hours.
+        expired every 24 hours. If the ``hmac`` engine is configured, ident
+        is derived with :meth:`_hmac_ident` instead without accessing Redis.
 
         :param args: Arguments that will be passed to :meth:`_key`.
         :param kwargs: Keyword arguments that will be passed to :meth:`_key`.
@@ -52,6 +116,8 @@ class Identity(object):
         :type kwargs: dict
         :rtype: str
         """
+        if self.engine == 'hmac':
+            return self._hmac_ident(*args, **kwargs)
         key = self._key(*args, **kwargs)
         ident = self.redis.get(key)
         if ident is None:
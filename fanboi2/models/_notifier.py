@@ -0,0 +1,188 @@
+import threading
+import time
+
+
+class Subscription(object):
+    """A subscription to one or more notification channels. Messages are
+    returned as :type:`str` in the order they were published.
+
+    :param pubsub: A :class:`redis.client.PubSub` object.
+    :type pubsub: redis.client.PubSub
+    """
+
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        """Returns the next message published to the subscribed channels, or
+        :type:`None` if no message was published within ``timeout`` seconds.
+
+        :param timeout: Number of seconds to wait for a message.
+
+        :type timeout: float
+        :rtype: str or None
+        """
+        deadline = time.time() + timeout
+        while True:
+            remaining = max(deadline - time.time(), 0)
+            message = self._pubsub.get_message(timeout=remaining)
+            if message is not None and message['type'] == 'message':
+                data = message['data']
+                if isinstance(data, bytes):
+                    data = data.decode('utf-8')
+                return data
+            if remaining <= 0:
+                return None
+
+    def close(self):
+        """Unsubscribe from all channels and release the connection.
+
+        :rtype: None
+        """
+        self._pubsub.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Notifier(object):
+    """Publish and wait for notifications between processes using Redis
+    pub/sub, e.g. to wake up requests waiting for new posts when a post is
+    committed by a worker. Waiting for a notification does not require a
+    database connection.
+
+    Each waiting request occupies a server thread, so the number of requests
+    that may wait at once in a process is limited by :attr:`wait_limit`.
+    Requests that could not reserve a slot with :meth:`reserve` are expected
+    to respond immediately instead of waiting.
+    """
+
+    DEFAULT_WAIT_LIMIT = 2
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self.wait_limit = self.DEFAULT_WAIT_LIMIT
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def configure_wait_limit(self, wait_limit):
+        """Configure the number of requests that may wait for notifications
+        at once in this process. The limit should be kept below the number
+        of server threads so waiting requests never starve other requests.
+
+        :param wait_limit: Number of waiting requests :type:`int` or
+                           :type:`str`, or an empty value for the default.
+
+        :type wait_limit: int or str or None
+        :rtype: None
+        """
+        if wait_limit is None or wait_limit == '':
+            wait_limit = self.DEFAULT_WAIT_LIMIT
+        self.wait_limit = int(wait_limit)
+
+    def reserve(self):
+        """Reserve a slot for a request that is going to wait for
+        notifications. Returns :type:`False` if all slots are taken. A
+        reserved slot must be returned with :meth:`release`.
+
+        :rtype: bool
+        """
+        with self._lock:
+            if self._waiting >= self.wait_limit:
+                return False
+            self._waiting += 1
+            return True
+
+    def release(self):
+        """Return a slot reserved with :meth:`reserve`.
+
+        :rtype: None
+        """
+        with self._lock:
+            self._waiting -= 1
+
+    def publish(self, channel, message):
+        """Publish ``message`` to ``channel``.
+
+        :param channel: A channel name :type:`str`.
+        :param message: A message to publish.
+
+        :type channel: str
+        :type message: str or int
+        :rtype: None
+        """
+        self.redis.publish(channel, message)
+
+    def subscribe(self, *channels):
+        """Returns a :class:`Subscription` to ``channels``. Messages published
+        before this method was called are not received.
+
+        :param channels: Channel names :type:`str` to subscribe to.
+
+        :rtype: Subscription
+        """
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(*channels)
+        return Subscription(pubsub)
+
+    def wait(self, channel, check, timeout):
+        """Block until ``check`` returns a true value or ``timeout`` seconds
+        has passed and returns the last value returned from ``check``. The
+        ``check`` function is called with :type:`None` once after subscribing
+        to ``channel``, then with each message received. If no slot could be
+        reserved, ``check`` is called with :type:`None` without subscribing
+        and its value is returned immediately.
+
+        :param channel: A channel name :type:`str` to wait on.
+        :param check: A function that takes a message or :type:`None`.
+        :param timeout: Maximum number of seconds to wait.
+
+        :type channel: str
+        :type check: function
+        :type timeout: float
+        :rtype: object
+        """
+        if not self.reserve():
+            return check(None)
+        try:
+            deadline = time.time() + timeout
+            with self.subscribe(channel) as subscription:
+                result = check(None)
+                while not result:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    message = subscription.get(remaining)
+                    if message is None:
+                        break
+                    result = check(message)
+            return result
+        finally:
+            self.release()
+
+
+def topic_channel(topic_id):
+    """Returns a channel name for notification of posts committed to the
+    topic ``topic_id``. Messages are the highest committed post number.
+
+    :param topic_id: An :type:`int` referencing topic ID.
+
+    :type topic_id: int
+    :rtype: str
+    """
+    return 'notify:topic:%s' % (topic_id,)
+
+
+def task_channel(task_id):
+    """Returns a channel name for notification of the result of the task
+    ``task_id`` being stored. Messages are the task state.
+
+    :param task_id: A :type:`str` task ID.
+
+    :type task_id: str
+    :rtype: str
+    """
+    return 'notify:task:%s' % (task_id,)
@@ -0,0 +1,179 @@
+import datetime
+import pytz
+import time
+from collections import namedtuple
+from ipaddress import ip_address as ip_address_, ip_network
+from sqlalchemy.sql import func, or_
+from ._base import DBSession
+from .rule_ban import RuleBan
+from .rule_override import RuleOverride
+
+
+RuleEntry = namedtuple('RuleEntry', ['id', 'scope', 'active_until', 'data'])
+
+
+class RuleIndex(object):
+    """In-memory index of active ban and override rules that allows an IP
+    address to be matched against rules without a database round-trip.
+    Rules are indexed by type, IP version and prefix length, so each lookup
+    is a dictionary lookup for each prefix length in use.
+
+    The index is reloaded from the database when the version counter stored
+    in Redis was changed by another process, or when the index is older than
+    :attr:`max_age` seconds in case rules were changed outside of the
+    application. The version counter is checked at most once every
+    :attr:`check_interval` seconds.
+    """
+    VERSION_KEY = 'rule_index:version'
+
+    def __init__(self, redis=None, check_interval=1, max_age=60):
+        self.redis = redis
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._rules = None
+        self._version = None
+        self._loaded_at = 0
+        self._checked_at = 0
+
+    def _current_version(self):
+        return self.redis.get(self.VERSION_KEY)
+
+    def _build(self, rules):
+        """Build a prefix index from a list of ``(model, data)`` tuples.
+
+        :param rules: A :type:`list` of rule and data tuples.
+
+        :type rules: list
+        :rtype: dict
+        """
+        index = {}
+        for rule, data in rules:
+            network = ip_network(rule.ip_address, strict=False)
+            tables = index.setdefault(rule.type, {})
+            prefixes = tables.setdefault(network.version, {})
+            networks = prefixes.setdefault(network.prefixlen, {})
+            key = int(network.network_address) >> \
+                (network.max_prefixlen - network.prefixlen)
+            networks.setdefault(key, []).append(RuleEntry(
+                rule.id,
+                rule.scope,
+                rule.active_until,
+                data))
+
+        for tables in index.values():
+            for version, prefixes in tables.items():
+                tables[version] = sorted(prefixes.items(), reverse=True)
+        return index
+
+    def _load(self):
+        """Load all active rules from the database.
+
+        :rtype: list
+        """
+        def _active(cls):
+            return DBSession.query(cls).filter(
+                cls.active == True,
+                or_(cls.active_until == None,
+                    cls.active_until >= func.now())).\
+                order_by(cls.id)
+
+        rules = [(r, None) for r in _active(RuleBan)]
+        rules.extend((r, r.override) for r in _active(RuleOverride))
+        return rules
+
+    def _reload(self):
+        self._version = self._current_version()
+        self._rules = self._build(self._load())
+        self._loaded_at = self._checked_at = time.time()
+
+    def _get_rules(self):
+        now = time.time()
+        if self._rules is not None and now - self._loaded_at < self.max_age:
+            if now - self._checked_at < self.check_interval:
+                return self._rules
+            self._checked_at = now
+            if self._current_version() == self._version:
+                return self._rules
+        self._reload()
+        return self._rules
+
+    def invalidate(self):
+        """Discard the index of this process. The index will be reloaded on
+        the next lookup.
+
+        :rtype: None
+        """
+        self._rules = None
+
+    def bump(self):
+        """Increment the version counter causing all processes to reload
+        their index on the next version check.
+
+        :rtype: None
+        """
+        self.redis.incr(self.VERSION_KEY)
+        self.invalidate()
+
+    def match(self, type_, ip_address, scopes=None):
+        """Returns the most specific active rule entry of ``type_`` matching
+        ``ip_address``. Only rules without scope or with scope in ``scopes``
+        are matched. Returns :type:`None` if no rules matched.
+
+        :param type_: A rule type :type:`str`, e.g. ``ban`` or ``override``.
+        :param ip_address: An IP address :type:`str` to match.
+        :param scopes: A :type:`list` of scopes to match.
+
+        :type type_: str
+        :type ip_address: str
+        :type scopes: list or tuple or None
+        :rtype: RuleEntry or None
+        """
+        try:
+            ipaddr = ip_address_(ip_address)
+        except ValueError:
+            return None
+
+        prefixes = self._get_rules().get(type_, {}).get(ipaddr.version)
+        if not prefixes:
+            return None
+
+        now = datetime.datetime.now(pytz.utc)
+        ipint = int(ipaddr)
+        for prefixlen, networks in prefixes:
+            key = ipint >> (ipaddr.max_prefixlen - prefixlen)
+            for entry in networks.get(key, ()):
+                if entry.scope is not None and \
+                   (scopes is None or entry.scope not in scopes):
+                    continue
+                if entry.active_until is not None and \
+                   entry.active_until < now:
+                    continue
+                return entry
+
+    def banned(self, ip_address, scopes=None):
+        """Returns :type:`True` if ``ip_address`` is banned within ``scopes``.
+
+        :param ip_address: An IP address :type:`str` to match.
+        :param scopes: A :type:`list` of scopes to match.
+
+        :type ip_address: str
+        :type scopes: list or tuple or None
+        :rtype: bool
+        """
+        return self.match('ban', ip_address, scopes) is not None
+
+    def override(self, ip_address, scopes=None):
+        """Returns a :type:`dict` of settings override for ``ip_address``
+        within ``scopes``, or an empty dict if no overrides matched.
+
+        :param ip_address: An IP address :type:`str` to match.
+        :param scopes: A :type:`list` of scopes to match.
+
+        :type ip_address: str
+        :type scopes: list or tuple or None
+        :rtype: dict
+        """
+        entry = self.match('override', ip_address, scopes)
+        if entry is not None:
+            return dict(entry.data)
+        return {}
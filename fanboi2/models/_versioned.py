@@ -360,6 +360,7 @@ def _create_history_deleted(session, objs):
 
         for prop in obj_mapper.iterate_properties:
             if isinstance(prop, RelationshipProperty) and \
+               not prop.viewonly and \
                not prop.cascade.delete and \
                not prop.passive_deletes == 'all' and \
                _is_versioned_object(prop.mapper.class_):
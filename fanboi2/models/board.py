@@ -12,6 +12,8 @@ DEFAULT_BOARD_CONFIG = {
     'use_ident': True,
     'max_posts': 1000,
     'post_delay': 10,
+    'post_limits': [],
+    'post_limit_policy': 'sliding_window',
 }
 
 
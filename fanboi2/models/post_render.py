@@ -0,0 +1,31 @@
+from sqlalchemy.orm import relationship, backref
+from sqlalchemy.sql.schema import Column, ForeignKey
+from sqlalchemy.sql.sqltypes import Integer, Text
+from ._base import Base
+
+
+class PostRender(Base):
+    """Model class that holds the pre-rendered HTML of a :class:`Post`. The
+    :attr:`version` is the formatter version the post was rendered with so
+    posts rendered by an older formatter can be told apart and re-rendered.
+    :attr:`body_preview` is only stored if the shortened preview differs
+    from the full :attr:`body`.
+    """
+
+    __tablename__ = 'post_render'
+
+    post_id = Column(Integer,
+                     ForeignKey('post.id', ondelete='CASCADE'),
+                     nullable=False,
+                     primary_key=True,
+                     autoincrement=False)
+
+    version = Column(Integer, nullable=False)
+    body = Column(Text, nullable=False)
+    body_preview = Column(Text, nullable=True)
+
+    post = relationship('Post',
+                        backref=backref('render',
+                                        uselist=False,
+                                        cascade='all,delete',
+                                        lazy='joined'))
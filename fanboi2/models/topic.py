@@ -1,9 +1,10 @@
 import re
 from sqlalchemy.orm import backref, relationship
-from sqlalchemy.sql import desc, func, select
+from sqlalchemy.sql import and_, desc, func
 from sqlalchemy.sql.schema import Column, ForeignKey
 from sqlalchemy.sql.sqltypes import Integer, DateTime, Enum, Unicode
 from ._base import Base, Versioned
+from .board import Board
 from .post import Post
 from .topic_meta import TopicMeta
 
@@ -26,14 +27,9 @@ class Topic(Versioned, Base):
                     nullable=False)
 
     board = relationship('Board',
-                         backref=backref('topics',
+                         backref=backref('_topics',
                                          lazy='dynamic',
-                                         cascade='all,delete',
-                                         order_by=desc(func.coalesce(
-                                             select([TopicMeta.bumped_at]).\
-                                                where(TopicMeta.topic_id==id).\
-                                                as_scalar(),
-                                             created_at))))
+                                         cascade='all,delete'))
 
     QUERY = (
         ("single_post", re.compile("^(\d+)$")),
@@ -100,3 +96,18 @@ class Topic(Versioned, Base):
         return self.posts.order_by(False).\
             order_by(desc(Post.number)).\
             limit(count).all()[::-1]
+
+
+# Topics of a board are listed in bump order from the topic meta so the
+# listing can be read from a single index. It is view-only since topics are
+# attached to and cascaded from the board through Topic.board.
+Board.topics = relationship(
+    Topic,
+    lazy='dynamic',
+    viewonly=True,
+    primaryjoin=and_(
+        Board.id == Topic.board_id,
+        Board.id == TopicMeta.board_id,
+        TopicMeta.topic_id == Topic.id),
+    foreign_keys=Topic.board_id,
+    order_by=(desc(TopicMeta.bumped_at), desc(TopicMeta.topic_id)))
@@ -1,5 +1,7 @@
+from sqlalchemy import event
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.sql.schema import Column, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.sql.schema import Column, ForeignKey, Index
 from sqlalchemy.sql.sqltypes import Integer, DateTime
 from ._base import Base
 
@@ -8,9 +10,21 @@ class TopicMeta(Base):
     """Model class that provides topic metadata. This model holds data that
     are related to internal workings of the topic model that are not part of
     the versionable records.
+
+    :attr:`board_id` is a copy of :attr:`Topic.board_id` so topics in a
+    board can be listed in bump order by reading a single index.
+
+    :attr:`version` is incremented whenever a post in the topic is edited
+    or deleted so cached representations of the topic can be validated
+    without reading its posts.
     """
 
     __tablename__ = 'topic_meta'
+    __table_args__ = (
+        Index('ix_topic_meta_board_id_bumped_at',
+              'board_id',
+              'bumped_at',
+              'topic_id'),)
 
     topic_id = Column(Integer,
                       ForeignKey('topic.id'),
@@ -18,12 +32,23 @@ class TopicMeta(Base):
                       primary_key=True,
                       autoincrement=False)
 
+    board_id = Column(Integer, ForeignKey('board.id'), nullable=False)
     post_count = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
     posted_at = Column(DateTime(timezone=True))
-    bumped_at = Column(DateTime(timezone=True))
+    bumped_at = Column(DateTime(timezone=True),
+                       default=func.now(),
+                       nullable=False)
 
     topic = relationship('Topic',
                          backref=backref('meta',
                                          uselist=False,
                                          cascade='all,delete',
                                          lazy=True))
+
+
+@event.listens_for(TopicMeta.__mapper__, 'before_insert')
+def populate_topic_meta_board_id(mapper, connection, target):
+    """Populate :attr:`TopicMeta.board_id` from the topic."""
+    if target.board_id is None:
+        target.board_id = target.topic.board_id
@@ -0,0 +1,63 @@
+import optparse
+import sys
+from ..benchmarks import run, compare, load_benchmarks, dump_results, \
+    load_results
+
+
+DESCRIPTION = "Run microbenchmarks and compare results against a baseline."
+USAGE = "Usage: %prog [options]"
+
+
+def main(argv=sys.argv):
+    parser = optparse.OptionParser(usage=USAGE, description=DESCRIPTION)
+    parser.add_option('-o', '--output', dest='output', type='string',
+                      help='write results as JSON to this file')
+    parser.add_option('-b', '--baseline', dest='baseline', type='string',
+                      help='compare results against this JSON file')
+    parser.add_option('-t', '--threshold', dest='threshold', type='float',
+                      default=0.2,
+                      help='allowed slowdown ratio before failing '
+                           '[default: %default]')
+    parser.add_option('-k', '--filter', dest='filter', type='string',
+                      help='only run benchmarks containing this string')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int',
+                      default=5,
+                      help='number of runs of each benchmark '
+                           '[default: %default]')
+    parser.add_option('-l', '--list', dest='list', action='store_true',
+                      default=False,
+                      help='list benchmarks and exit')
+
+    options, args = parser.parse_args(argv[1:])
+    names = list(load_benchmarks().keys())
+    if options.filter:
+        names = [n for n in names if options.filter in n]
+
+    if options.list:
+        for name in names:
+            print(name)
+        return
+
+    results = run(names, repeat=options.repeat)
+    for name, result in results.items():
+        print("%-40s %12.3f us  (median %.3f us)" % (
+            name,
+            result['min'] * 1e6,
+            result['median'] * 1e6))
+
+    if options.output:
+        with open(options.output, 'w') as fp:
+            dump_results(results, fp)
+
+    if options.baseline:
+        with open(options.baseline) as fp:
+            baseline = load_results(fp)
+        regressions = compare(results, baseline, options.threshold)
+        for name, base, result, change in regressions:
+            sys.stderr.write("Regressed: %s %.3f us -> %.3f us (+%.1f%%)\n" % (
+                name,
+                base * 1e6,
+                result * 1e6,
+                change * 100))
+        if regressions:
+            sys.exit(1)
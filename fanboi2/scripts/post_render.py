@@ -0,0 +1,41 @@
+import os
+import sys
+import transaction
+from fanboi2.helpers.formatters import FORMATTER_VERSION, render_post
+from fanboi2.models import DBSession, Post, PostRender
+from pyramid.paster import bootstrap
+from sqlalchemy.sql import or_
+
+
+BATCH_SIZE = 500
+
+
+def main(argv=sys.argv):
+    if not len(argv) >= 2:
+        sys.stderr.write("Usage: %s config\n" % os.path.basename(argv[0]))
+        sys.stderr.write("Configuration file not present.\n")
+        sys.exit(1)
+
+    env = bootstrap(argv[1])
+    request = env['request']
+
+    last_id = 0
+    rendered = 0
+    while True:
+        with transaction.manager:
+            posts = DBSession.query(Post).\
+                outerjoin(PostRender).\
+                filter(Post.id > last_id).\
+                filter(or_(PostRender.version == None,
+                           PostRender.version != FORMATTER_VERSION)).\
+                order_by(Post.id).\
+                limit(BATCH_SIZE).\
+                all()
+            if not posts:
+                break
+            for post in posts:
+                render_post(request, post)
+            last_id = posts[-1].id
+            rendered += len(posts)
+
+    print("Successfully rendered %s posts." % (rendered,))
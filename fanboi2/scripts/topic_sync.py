@@ -20,6 +20,10 @@ def main(argv=sys.argv):
                    where(Post.topic_id == TopicMeta.topic_id).\
                    where(Post.bumped).\
                    order_by(sa.desc(Post.created_at)).\
+                   limit(1),
+                   posted_at=sa.select([Post.created_at]).\
+                   where(Post.topic_id == TopicMeta.topic_id).\
+                   order_by(sa.desc(Post.created_at)).\
                    limit(1))
 
     with transaction.manager:
@@ -1,6 +1,103 @@
 import datetime
+import json
 import pytz
-from fanboi2.helpers.formatters import format_post, format_page
+from functools import lru_cache
+from fanboi2.helpers.formatters import rendered_post, rendered_page, \
+    route_template
+from fanboi2.utils import EmbedLoader
+
+
+@lru_cache(maxsize=16)
+def _timezone(name):
+    """Resolve timezone ``name`` into a :class:`pytz.tzinfo.BaseTzInfo`.
+    Result is cached so the timezone is only resolved once per process
+    instead of once for every serialized :type:`datetime.datetime`.
+
+    :param name: A timezone name such as ``Asia/Bangkok``.
+    :type name: str
+    :rtype: pytz.tzinfo.BaseTzInfo
+    """
+    return pytz.timezone(name)
+
+
+class _AllFields(object):
+    """A container that contains every field name, used when the client
+    did not ask for a sparse fieldset.
+    """
+
+    def __contains__(self, name):
+        return True
+
+
+ALL_FIELDS = _AllFields()
+
+# Board settings used by the server only, e.g. to enforce rate limits, that
+# are not serialized as part of the board.
+PRIVATE_BOARD_SETTINGS = frozenset(('post_limits', 'post_limit_policy'))
+
+
+@lru_cache(maxsize=128)
+def _parse_fields(value):
+    """Parse a comma-separated list of field names into a
+    :type:`frozenset`.
+
+    :param value: A field list such as ``number,ident,body``.
+    :type value: str
+    :rtype: frozenset
+    """
+    return frozenset(f.strip() for f in value.split(',') if f.strip())
+
+
+def _requested_fields(request, type_):
+    """Returns the fields of resource ``type_`` requested by the client
+    through the ``fields[type_]`` query string, e.g. ``fields[post]=body``,
+    or :data:`ALL_FIELDS` if the client did not ask for a sparse fieldset.
+    The ``type`` and ``id`` fields are always serialized regardless of the
+    fieldset, as are embedded resources which are requested separately.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param type_: A resource type such as ``post``.
+
+    :type request: pyramid.request.Request
+    :type type_: str
+    :rtype: frozenset or _AllFields
+    """
+    value = request.params.get('fields[%s]' % (type_,))
+    if value is None:
+        return ALL_FIELDS
+    return _parse_fields(value)
+
+
+def _embed_loader(request):
+    """Returns the :class:`fanboi2.utils.EmbedLoader` of the request. The
+    loader is shared for the lifetime of the request.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :type request: pyramid.request.Request
+    :rtype: fanboi2.utils.EmbedLoader
+    """
+    loader = getattr(request, 'embed_loader', None)
+    if loader is None:
+        loader = request.embed_loader = EmbedLoader()
+    return loader
+
+
+def _request_timezone(request):
+    """Returns the timezone of ``app.timezone`` setting for the request.
+    The timezone is resolved once and shared for the lifetime of the
+    request so the registry is not read for every serialized
+    :type:`datetime.datetime`.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :type request: pyramid.request.Request
+    :rtype: pytz.tzinfo.BaseTzInfo
+    """
+    tz = getattr(request, 'json_timezone', None)
+    if tz is None:
+        settings = request.registry.settings
+        assert isinstance(settings, dict)
+        tz = request.json_timezone = _timezone(settings['app.timezone'])
+    return tz
 
 
 def _datetime_adapter(obj, request):
@@ -12,14 +109,12 @@ def _datetime_adapter(obj, request):
     :type obj: datetime.datetime
     :type request: pyramid.request.Request
     """
-    settings = request.registry.settings
-    assert isinstance(settings, dict)
-    tz = pytz.timezone(settings['app.timezone'])
-    return obj.astimezone(tz).isoformat()
+    return obj.astimezone(_request_timezone(request)).isoformat()
 
 
 def _sqlalchemy_query_adapter(obj, request):
-    """Serialize SQLAlchemy query into a list.
+    """Serialize SQLAlchemy query into a list. Items are primed in the
+    request embed loader so embeds of all items are loaded together.
 
     :param obj: An iterable SQLAlchemy's :class:`sqlalchemy.orm.Query` object.
     :param request: A :class:`pyramid.request.Request` object.
@@ -27,11 +122,30 @@ def _sqlalchemy_query_adapter(obj, request):
     :type obj: sqlalchemy.orm.Query
     :type request: pyramid.request.Request
     """
-    return [item for item in obj]
+    items = [item for item in obj]
+    _embed_loader(request).prime(items)
+    return items
+
+
+def _pagination_serializer(obj, request):
+    """Serialize :class:`fanboi2.utils.Pagination` into a :type:`list` of
+    its items. The next page is given in the ``Link`` header of the response
+    instead so the response remains the same as unpaginated lists.
+
+    :param obj: A :class:`fanboi2.utils.Pagination` object.
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type obj: fanboi2.utils.Pagination
+    :type request: pyramid.request.Request
+    :rtype: list
+    """
+    _embed_loader(request).prime(obj.items)
+    return obj.items
 
 
 def _board_serializer(obj, request):
-    """Serialize :class:`fanboi2.models.Board` into a :type:`dict`.
+    """Serialize :class:`fanboi2.models.Board` into a :type:`dict`. Only
+    the fields requested with ``fields[board]`` are serialized.
 
     :param obj: A :class:`fanboi2.models.Board` object.
     :param request: A :class:`pyramid.request.Request` object.
@@ -40,24 +154,38 @@ def _board_serializer(obj, request):
     :type request: pyramid.request.Request
     :rtype: dict
     """
+    # Board settings are decoded from JSON when the board is loaded, so
+    # leaving out ``settings`` only skips merging it with the defaults.
+    fields = _requested_fields(request, 'board')
     result = {
         'type': 'board',
         'id': obj.id,
-        'agreements': obj.agreements,
-        'description': obj.description,
-        'settings': obj.settings,
-        'slug': obj.slug,
-        'status': obj.status,
-        'title': obj.title,
-        'path': request.route_path('api_board', board=obj.slug),
     }
+    if 'agreements' in fields:
+        result['agreements'] = obj.agreements
+    if 'description' in fields:
+        result['description'] = obj.description
+    if 'settings' in fields:
+        result['settings'] = dict(
+            (k, v) for k, v in obj.settings.items()
+            if k not in PRIVATE_BOARD_SETTINGS)
+    if 'slug' in fields:
+        result['slug'] = obj.slug
+    if 'status' in fields:
+        result['status'] = obj.status
+    if 'title' in fields:
+        result['title'] = obj.title
+    if 'path' in fields:
+        result['path'] = request.route_path('api_board', board=obj.slug)
     if request.params.get('topics') and not 'board' in request.params:
-        result['topics'] = obj.topics.limit(10)
+        result['topics'] = _embed_loader(request).load('topics', obj)
     return result
 
 
 def _topic_serializer(obj, request):
-    """Serialize :class:`fanboi2.models.Topic` into a :type:`dict`.
+    """Serialize :class:`fanboi2.models.Topic` into a :type:`dict`. Only
+    the fields requested with ``fields[topic]`` are serialized and topic
+    meta is only loaded if any of its fields is requested.
 
     :param obj: A :class:`fanboi2.models.Topic` object.
     :param request: A :class:`pyramid.request.Request` object.
@@ -66,27 +194,38 @@ def _topic_serializer(obj, request):
     :type request: pyramid.request.Request
     :rtype: dict
     """
+    fields = _requested_fields(request, 'topic')
     result = {
         'type': 'topic',
         'id': obj.id,
-        'board_id': obj.board_id,
-        'bumped_at': obj.meta.bumped_at,
-        'created_at': obj.created_at,
-        'post_count': obj.meta.post_count,
-        'posted_at': obj.meta.posted_at,
-        'status': obj.status,
-        'title': obj.title,
-        'path': request.route_path('api_topic', topic=obj.id),
     }
+    if 'board_id' in fields:
+        result['board_id'] = obj.board_id
+    if 'bumped_at' in fields:
+        result['bumped_at'] = obj.meta.bumped_at
+    if 'created_at' in fields:
+        result['created_at'] = obj.created_at
+    if 'post_count' in fields:
+        result['post_count'] = obj.meta.post_count
+    if 'posted_at' in fields:
+        result['posted_at'] = obj.meta.posted_at
+    if 'status' in fields:
+        result['status'] = obj.status
+    if 'title' in fields:
+        result['title'] = obj.title
+    if 'path' in fields:
+        result['path'] = request.route_path('api_topic', topic=obj.id)
     if request.params.get('board'):
-        result['board'] = obj.board
+        result['board'] = _embed_loader(request).load('board', obj)
     if request.params.get('posts') and not 'topic' in request.params:
-        result['posts'] = obj.recent_posts()
+        result['posts'] = _embed_loader(request).load('posts', obj)
     return result
 
 
 def _post_serializer(obj, request):
-    """Serialize :class:`fanboi2.models.Post` into a :type:`dict`.
+    """Serialize :class:`fanboi2.models.Post` into a :type:`dict`. Only
+    the fields requested with ``fields[post]`` are serialized, so the post
+    body is never formatted unless ``body_formatted`` is requested.
 
     :param obj: A :class:`fanboi2.models.Post` object.
     :param request: A :class:`pyramid.request.Request` object.
@@ -95,30 +234,46 @@ def _post_serializer(obj, request):
     :type request: pyramid.request.Request
     :rtype: dict
     """
+    fields = _requested_fields(request, 'post')
     result = {
         'type': 'post',
         'id': obj.id,
-        'body': obj.body,
-        'body_formatted': format_post(None, request, obj),
-        'bumped': obj.bumped,
-        'created_at': obj.created_at,
-        'ident': obj.ident,
-        'name': obj.name,
-        'number': obj.number,
-        'topic_id': obj.topic_id,
-        'path': request.route_path(
+    }
+    if 'body' in fields:
+        result['body'] = obj.body
+    if 'body_formatted' in fields:
+        result['body_formatted'] = rendered_post(
+            None,
+            request,
+            obj,
+            topic_id=obj.topic_id)
+    if 'bumped' in fields:
+        result['bumped'] = obj.bumped
+    if 'created_at' in fields:
+        result['created_at'] = obj.created_at
+    if 'ident' in fields:
+        result['ident'] = obj.ident
+    if 'name' in fields:
+        result['name'] = obj.name
+    if 'number' in fields:
+        result['number'] = obj.number
+    if 'topic_id' in fields:
+        result['topic_id'] = obj.topic_id
+    if 'path' in fields:
+        result['path'] = route_template(
+            None,
+            request,
             'api_topic_posts_scoped',
             topic=obj.topic_id,
-            query=obj.number,
-        ),
-    }
+        )(query=obj.number)
     if request.params.get('topic'):
-        result['topic'] = obj.topic
+        result['topic'] = _embed_loader(request).load('topic', obj)
     return result
 
 
 def _page_serializer(obj, request):
-    """Serialize :class:`fanboi2.models.Page` into a :type:`dict`.
+    """Serialize :class:`fanboi2.models.Page` into a :type:`dict`. Only
+    the fields requested with ``fields[page]`` are serialized.
 
     :param obj: A :class:`fanboi2.models.Page` object.
     :param request: A :class:`pyramid.request.Request` object.
@@ -127,21 +282,31 @@ def _page_serializer(obj, request):
     :type request: pyramid.request.Request
     :rtype: dict
     """
-    return {
+    fields = _requested_fields(request, 'page')
+    result = {
         'type': 'page',
         'id': obj.id,
-        'body': obj.body,
-        'body_formatted': format_page(None, request, obj),
-        'formatter': obj.formatter,
-        'namespace': obj.namespace,
-        'slug': obj.slug,
-        'title': obj.title,
-        'updated_at': obj.updated_at or obj.created_at,
-        'path': request.route_path(
+    }
+    if 'body' in fields:
+        result['body'] = obj.body
+    if 'body_formatted' in fields:
+        result['body_formatted'] = rendered_page(None, request, obj).body
+    if 'formatter' in fields:
+        result['formatter'] = obj.formatter
+    if 'namespace' in fields:
+        result['namespace'] = obj.namespace
+    if 'slug' in fields:
+        result['slug'] = obj.slug
+    if 'title' in fields:
+        result['title'] = obj.title
+    if 'updated_at' in fields:
+        result['updated_at'] = obj.updated_at or obj.created_at
+    if 'path' in fields:
+        result['path'] = request.route_path(
             'api_page',
             page=obj.slug,
-        ),
-    }
+        )
+    return result
 
 
 def _result_proxy_serializer(obj, request):
@@ -201,20 +366,141 @@ def _base_error_serializer(obj, request):
     }
 
 
-def initialize_renderer():
+def _json_method_adapter(obj, request):
+    """Serialize an object implementing ``__json__`` by calling it.
+
+    :param obj: An object implementing ``__json__``.
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type obj: object
+    :type request: pyramid.request.Request
+    """
+    return obj.__json__(request)
+
+
+class JSONRenderer(object):
+    """A drop-in replacement for :class:`pyramid.renderers.JSON` that looks
+    up adapters by the class of an object instead of going through the
+    component registry. An adapter is resolved once per class by walking
+    its MRO and reused for every object of that class, so serializing a
+    thousand posts only costs a :type:`dict` lookup per post instead of
+    an interface lookup. Output is identical to Pyramid's renderer given
+    the same adapters.
+
+    :param serializer: A function to serialize the value with.
+    :param adapters: An iterable of ``(type, adapter)`` pairs.
+    :param kw: Keyword arguments to pass to ``serializer``.
+
+    :type serializer: function
+    :type adapters: iterable
+    :type kw: dict
+    """
+
+    def __init__(self, serializer=json.dumps, adapters=(), **kw):
+        self.serializer = serializer
+        self.kw = kw
+        self._adapters = {}
+        self._resolved = {}
+        for type_, adapter in adapters:
+            self.add_adapter(type_, adapter)
+
+    def add_adapter(self, type_, adapter):
+        """Register ``adapter`` for serializing objects of ``type_`` and
+        its subclasses. Unlike Pyramid's renderer, only classes are
+        supported.
+
+        :param type_: A class to register the adapter for.
+        :param adapter: A function accepting an object and a request.
+
+        :type type_: type
+        :type adapter: function
+        :rtype: None
+        """
+        self._adapters[type_] = adapter
+        self._resolved.clear()
+
+    def _resolve(self, cls):
+        """Resolve and cache the adapter for ``cls``. Returns :type:`None`
+        if the class has no adapter registered. An adapter registered for
+        the class or any of its bases takes precedence over ``__json__``,
+        which is only called for classes without an adapter.
+
+        :param cls: A class to resolve the adapter for.
+        :type cls: type
+        :rtype: function or None
+        """
+        adapter = None
+        for base in cls.__mro__:
+            if base in self._adapters:
+                adapter = self._adapters[base]
+                break
+        if adapter is None and hasattr(cls, '__json__'):
+            adapter = _json_method_adapter
+        self._resolved[cls] = adapter
+        return adapter
+
+    def _make_default(self, request):
+        resolved = self._resolved
+        resolve = self._resolve
+
+        def _default(obj):
+            try:
+                adapter = resolved[obj.__class__]
+            except KeyError:
+                adapter = resolve(obj.__class__)
+            if adapter is None:
+                raise TypeError('%r is not JSON serializable' % (obj,))
+            return adapter(obj, request)
+        return _default
+
+    def __call__(self, info):
+        def _render(value, system):
+            request = system.get('request')
+            if request is not None:
+                response = request.response
+                ct = response.content_type
+                if ct == response.default_content_type:
+                    response.content_type = 'application/json'
+            default = self._make_default(request)
+            return self.serializer(value, default=default, **self.kw)
+        return _render
+
+
+RENDERERS = ('fast', 'pyramid')
+
+
+def initialize_renderer(renderer=None):
+    """Create a JSON renderer with adapters for all serializable objects.
+    The ``fast`` renderer is :class:`JSONRenderer` and the ``pyramid``
+    renderer is Pyramid's own :class:`pyramid.renderers.JSON`. Both
+    produce identical output.
+
+    :param renderer: Either ``fast`` or ``pyramid``. Defaults to ``fast``
+                     if empty.
+    :type renderer: str
+    :rtype: object
+    """
     from celery.result import AsyncResult
     from pyramid.renderers import JSON
     from sqlalchemy.orm import Query
     from fanboi2.models import Board, Topic, Post, Page
     from fanboi2.errors import BaseError
     from fanboi2.tasks import ResultProxy
-    json_renderer = JSON()
+    from fanboi2.utils import Pagination
+    renderer = renderer or 'fast'
+    if renderer not in RENDERERS:
+        raise ValueError('Unknown JSON renderer %r' % (renderer,))
+    if renderer == 'fast':
+        json_renderer = JSONRenderer()
+    else:
+        json_renderer = JSON()
     json_renderer.add_adapter(datetime.datetime, _datetime_adapter)
     json_renderer.add_adapter(Query, _sqlalchemy_query_adapter)
     json_renderer.add_adapter(Board, _board_serializer)
     json_renderer.add_adapter(Topic, _topic_serializer)
     json_renderer.add_adapter(Post, _post_serializer)
     json_renderer.add_adapter(Page, _page_serializer)
+    json_renderer.add_adapter(Pagination, _pagination_serializer)
     json_renderer.add_adapter(ResultProxy, _result_proxy_serializer)
     json_renderer.add_adapter(AsyncResult, _async_result_serializer)
     json_renderer.add_adapter(BaseError, _base_error_serializer)
@@ -222,5 +508,6 @@ def initialize_renderer():
 
 
 def includeme(config):  # pragma: no cover
-    json_renderer = initialize_renderer()
+    settings = config.registry.settings
+    json_renderer = initialize_renderer(settings.get('app.json_renderer'))
     config.add_renderer('json', json_renderer)
@@ -1,12 +1,22 @@
+import logging
 import transaction
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from celery import Celery, states
+from celery.exceptions import Ignore
+from celery.signals import task_postrun, worker_ready
 from sqlalchemy.exc import IntegrityError
 from fanboi2.errors import serialize_error
+from fanboi2.helpers.formatters import render_post
 from fanboi2.models import DBSession, Post, Topic, Board, \
-    RuleBan, RuleOverride, serialize_model
-from fanboi2.utils import akismet, dnsbl, proxy_detector, geoip, checklist
+    rule_index, notifier, serialize_model, task_channel
+from fanboi2.utils import akismet, dnsbl, proxy_detector, geoip, checklist, \
+    post_queue
 
 celery = Celery()
+log = logging.getLogger(__name__)
+
+CHECK_TIMEOUT = 5
 
 
 def configure_celery(settings):  # pragma: no cover
@@ -70,6 +80,130 @@ class ResultProxy(object):
         return self._result.__getattribute__(name)
 
 
+@task_postrun.connect
+def _notify_task(task_id=None, state=None, **kwargs):
+    """Notify clients waiting for the result of ``task_id`` once the result
+    was stored. Tasks that were ignored have their result stored by another
+    worker which will notify on their behalf.
+    """
+    if state in states.READY_STATES:
+        notifier.publish(task_channel(task_id), state)
+
+
+def _render_posts(post_ids):
+    """Render posts with :func:`fanboi2.helpers.formatters.render_post`
+    after they were committed, so formatting is never done while the topic
+    is locked by the posting transaction. Posts that failed to render are
+    logged and left unrendered, in which case they are formatted when read.
+
+    :param post_ids: A :type:`list` of post IDs.
+
+    :type post_ids: list
+    :rtype: None
+    """
+    if not post_ids:
+        return
+    try:
+        with transaction.manager:
+            posts = DBSession.query(Post).filter(Post.id.in_(post_ids))
+            for post in posts:
+                try:
+                    render_post(None, post)
+                except Exception:
+                    log.exception('Failed to render post %s.', post.id)
+    except Exception:
+        log.exception('Failed to store rendered posts %s.', post_ids)
+
+
+def _check_rules(ip_address, board, topic=None):
+    """Run ban and status checks of ``ip_address`` against ``board`` and
+    ``topic`` if given, and return a failure result of the first failed
+    check or :type:`None` if all checks passed. These checks are local and
+    cheap, so they are done before the external checks in
+    :func:`_check_post` and again in the posting transaction.
+
+    :param ip_address: An IP address :type:`str` to check.
+    :param board: A :class:`fanboi2.models.Board` to post to.
+    :param topic: A :class:`fanboi2.models.Topic` to post to, or
+                  :type:`None` if creating a topic.
+
+    :type ip_address: str
+    :type board: fanboi2.models.Board
+    :type topic: fanboi2.models.Topic or None
+    :rtype: tuple or None
+    """
+    board_scope = 'board:%s' % (board.slug,)
+
+    if rule_index.banned(ip_address, scopes=(board_scope,)):
+        return 'failure', 'ban_rejected'
+
+    allowed_statuses = ('open',)
+    if topic is not None:
+        if topic.status != 'open':
+            return 'failure', 'status_rejected', topic.status
+        allowed_statuses = ('open', 'restricted')
+
+    override = rule_index.override(ip_address, scopes=(board_scope,))
+    board_status = override.get('status', board.status)
+    if not board_status in allowed_statuses:
+        return 'failure', 'status_rejected', board_status
+
+
+def _check_post(request, ip_address, body):
+    """Run spam, DNSBL and proxy checks that are enabled for the country of
+    ``ip_address`` concurrently and return the error name of the first
+    failed check in that order, or :type:`None` if all checks passed.
+
+    All checks share a single deadline of :data:`CHECK_TIMEOUT` seconds.
+    Spam and proxy checks that did not finish within the deadline are
+    treated the same as when their provider is unavailable, i.e. as failed
+    if the provider is configured to fail closed and as passed otherwise,
+    so a provider outage gives the same answer whether the provider timed
+    out on its own or the deadline was reached first. DNSBL checks that did
+    not finish are treated as passed.
+
+    :param request: A serialized request :type:`dict` returned from
+                    :meth:`fanboi2.utils.serialize_request`.
+    :param ip_address: An IP address :type:`str` to check.
+    :param body: A :type:`str` post body.
+
+    :type request: dict
+    :type ip_address: str
+    :type body: str
+    :rtype: str or None
+    """
+    country_code = geoip.country_code(ip_address)
+    country_scope = 'country:%s' % (str(country_code).lower())
+
+    checks = OrderedDict()
+    executor = ThreadPoolExecutor(max_workers=3)
+    try:
+        if checklist.enabled(country_scope, 'akismet'):
+            checks['spam_rejected'] = (
+                executor.submit(akismet.spam, request, body),
+                akismet.fail_closed)
+        if checklist.enabled(country_scope, 'dnsbl'):
+            checks['dnsbl_rejected'] = (
+                executor.submit(dnsbl.listed, ip_address),
+                lambda: False)
+        if checklist.enabled(country_scope, 'proxy_detect'):
+            checks['proxy_rejected'] = (
+                executor.submit(proxy_detector.detect, ip_address),
+                proxy_detector.fail_closed)
+        done, _ = wait(
+            [future for future, _ in checks.values()],
+            timeout=CHECK_TIMEOUT)
+    finally:
+        executor.shutdown(wait=False)
+
+    for error, (future, fail_closed) in checks.items():
+        if future in done:
+            if future.result():
+                return error
+        elif fail_closed():
+            return error
+
+
 @celery.task()
 def add_topic(request, board_id, title, body):
     """Insert a topic to the database.
@@ -87,47 +221,32 @@ def add_topic(request, board_id, title, body):
     :rtype: tuple
     """
     ip_address = request['remote_addr']
-    country_code = geoip.country_code(ip_address)
-    country_scope = 'country:%s' % (str(country_code).lower())
 
     with transaction.manager:
         board = DBSession.query(Board).get(board_id)
-        board_scope = 'board:%s' % (board.slug,)
-
-        if DBSession.query(RuleBan).\
-           filter(RuleBan.listed(ip_address, scopes=(board_scope,))).\
-           count() > 0:
-            return 'failure', 'ban_rejected'
-
-        override = {}
-        rule_override = DBSession.query(RuleOverride).filter(
-            RuleOverride.listed(ip_address, scopes=(board_scope,))).\
-            first()
-
-        if rule_override is not None:
-            override = rule_override.override
-
-        board_status = override.get('status', board.status)
-        if board_status != 'open':
-            return 'failure', 'status_rejected', board_status
+        rule_error = _check_rules(ip_address, board)
+    if rule_error is not None:
+        return rule_error
 
-        if checklist.enabled(country_scope, 'akismet') and \
-           akismet.spam(request, body):
-            return 'failure', 'spam_rejected'
+    check_error = _check_post(request, ip_address, body)
 
-        if checklist.enabled(country_scope, 'dnsbl') and \
-           dnsbl.listed(ip_address):
-            return 'failure', 'dnsbl_rejected'
+    with transaction.manager:
+        board = DBSession.query(Board).get(board_id)
+        rule_error = _check_rules(ip_address, board)
+        if rule_error is not None:
+            return rule_error
 
-        if checklist.enabled(country_scope, 'proxy_detect') and \
-           proxy_detector.detect(ip_address):
-            return 'failure', 'proxy_rejected'
+        if check_error is not None:
+            return 'failure', check_error
 
         post = Post(body=body, ip_address=ip_address)
         post.topic = Topic(board=board, title=title)
         DBSession.add(post)
         DBSession.flush()
-        return 'topic', post.topic_id
+        post_id, topic_id = post.id, post.topic_id
+
+    _render_posts([post_id])
+    return 'topic', topic_id
 
 
 @celery.task(bind=True, max_retries=4)  # 5 total.
@@ -149,56 +268,210 @@ def add_post(self, request, topic_id, body, bumped):
     :rtype: tuple
     """
     ip_address = request['remote_addr']
-    country_code = geoip.country_code(ip_address)
-    country_scope = 'country:%s' % (str(country_code).lower())
 
     with transaction.manager:
         topic = DBSession.query(Topic).get(topic_id)
-        board = topic.board
-        board_scope = 'board:%s' % (board.slug,)
+        rule_error = _check_rules(ip_address, topic.board, topic)
+    if rule_error is not None:
+        return rule_error
 
-        if DBSession.query(RuleBan).\
-           filter(RuleBan.listed(ip_address, scopes=(board_scope,))).\
-           count() > 0:
-            return 'failure', 'ban_rejected'
+    check_error = _check_post(request, ip_address, body)
 
-        if topic.status != 'open':
-            return 'failure', 'status_rejected', topic.status
+    with transaction.manager:
+        topic = DBSession.query(Topic).get(topic_id)
+        rule_error = _check_rules(ip_address, topic.board, topic)
+        if rule_error is not None:
+            return rule_error
+
+        if check_error is not None:
+            return 'failure', check_error
+
+        post_id = None
+        if not post_queue.enabled:
+            post = Post(
+                topic=topic,
+                body=body,
+                bumped=bumped,
+                ip_address=ip_address)
+
+            try:
+                DBSession.add(post)
+                DBSession.flush()
+            except IntegrityError as e:
+                raise self.retry(exc=e)
+            post_id = post.id
+
+    if post_id is not None:
+        _render_posts([post_id])
+        return 'post', post_id
+
+    post_queue.push(topic_id, {
+        'task_id': self.request.id,
+        'ip_address': ip_address,
+        'body': body,
+        'bumped': bumped,
+    })
+
+    result = _drain_posts(topic_id, task_id=self.request.id)
+    if result is None:
+        raise Ignore()  # Result is stored by the worker that drained it.
+    return result
+
+
+def _insert_posts(topic_id, entries):
+    """Insert a batch of queued posts into a topic in a single transaction.
+    Posts are flushed together and receive consecutive numbers from a single
+    reservation. Posts that arrive after the topic has reached its maximum
+    number of posts are rejected individually. Inserted posts are rendered
+    after the transaction is committed.
 
-        override = {}
-        rule_override = DBSession.query(RuleOverride).filter(
-            RuleOverride.listed(ip_address, scopes=(board_scope,))).\
-            first()
+    :param topic_id: An :type:`int` referencing topic ID.
+    :param entries: A :type:`list` of queued post :type:`dict`.
 
-        if rule_override is not None:
-            override = rule_override.override
+    :type topic_id: int
+    :type entries: list
+    :rtype: list
+    """
+    results = []
+    with transaction.manager:
+        topic = DBSession.query(Topic).get(topic_id)
 
-        board_status = override.get('status', board.status)
-        if not board_status in ('open', 'restricted'):
-            return 'failure', 'status_rejected', board_status
+        posts = []
+        post_count = topic.meta.post_count
+        max_posts = topic.board.settings['max_posts']
+        for entry in entries:
+            status = topic.status
+            if status == 'open' and post_count >= max_posts:
+                status = 'archived'
+            if status != 'open':
+                results.append((entry['task_id'], (
+                    'failure',
+                    'status_rejected',
+                    status)))
+                continue
+
+            post = Post(
+                topic=topic,
+                body=entry['body'],
+                bumped=entry['bumped'],
+                ip_address=entry['ip_address'])
+            DBSession.add(post)
+            posts.append((entry['task_id'], post))
+            post_count += 1
+
+        DBSession.flush()
+        post_ids = []
+        for task_id, post in posts:
+            results.append((task_id, ('post', post.id)))
+            post_ids.append(post.id)
 
-        if checklist.enabled(country_scope, 'akismet') and \
-           akismet.spam(request, body):
-            return 'failure', 'spam_rejected'
+    _render_posts(post_ids)
+    return results
 
-        if checklist.enabled(country_scope, 'dnsbl') and \
-           dnsbl.listed(ip_address):
-            return 'failure', 'dnsbl_rejected'
 
-        if checklist.enabled(country_scope, 'proxy_detect') and \
-           proxy_detector.detect(ip_address):
-            return 'failure', 'proxy_rejected'
+def _insert_posts_each(topic_id, entries):
+    """Insert queued posts into a topic one at a time after a batch insert
+    failed, so a single bad post does not fail every post in the batch.
+    Posts that still fail are returned with the raised exception instead
+    of a result.
 
-        post = Post(
-            topic=topic,
-            body=body,
-            bumped=bumped,
-            ip_address=ip_address)
+    :param topic_id: An :type:`int` referencing topic ID.
+    :param entries: A :type:`list` of queued post :type:`dict`.
 
+    :type topic_id: int
+    :type entries: list
+    :rtype: list
+    """
+    results = []
+    for entry in entries:
         try:
-            DBSession.add(post)
-            DBSession.flush()
-        except IntegrityError as e:
-            raise self.retry(exc=e)
+            results.extend(_insert_posts(topic_id, [entry]))
+        except Exception as e:
+            results.append((entry['task_id'], e))
+    return results
+
+
+def _drain_posts(topic_id, task_id=None):
+    """Drain queued posts for a topic in batches and store the result of
+    each queued task individually. Only one worker may drain a topic at a
+    time; if another worker is already draining, this function returns
+    immediately and leaves the queued posts to that worker. Posts left in
+    the processing list by a worker that died while draining are inserted
+    first. If a batch failed to insert, its posts are retried individually
+    and only the posts that failed again are marked as failed.
+
+    :param topic_id: An :type:`int` referencing topic ID.
+    :param task_id: A :type:`str` task ID of the caller. The result for this
+                    task is returned instead of being stored.
+
+    :type topic_id: int
+    :type task_id: str
+    :rtype: tuple or None
+    """
+    result = None
+    token = post_queue.acquire(topic_id)
+    while token:
+        try:
+            entries = post_queue.processing(topic_id) or \
+                post_queue.pop(topic_id)
+            while entries:
+                try:
+                    batch_results = _insert_posts(topic_id, entries)
+                except Exception:
+                    batch_results = _insert_posts_each(topic_id, entries)
+                for entry_task_id, entry_result in batch_results:
+                    if entry_task_id == task_id:
+                        result = entry_result
+                    elif isinstance(entry_result, Exception):
+                        celery.backend.mark_as_failure(
+                            entry_task_id,
+                            entry_result)
+                        _notify_task(entry_task_id, states.FAILURE)
+                    else:
+                        celery.backend.store_result(
+                            entry_task_id,
+                            entry_result,
+                            states.SUCCESS)
+                        _notify_task(entry_task_id, states.SUCCESS)
+                post_queue.ack(topic_id, entries)
+
+                # The lock may have expired while inserting, in which case
+                # another worker may already be draining the queue.
+                if not post_queue.extend(topic_id, token):
+                    token = None
+                    break
+                entries = post_queue.pop(topic_id)
+        finally:
+            if token:
+                post_queue.release(topic_id, token)
+
+        # A post may have been queued after the last pop but before the lock
+        # was released, in which case its worker failed to acquire the lock.
+        # If the lock was lost instead, it is acquired again unless another
+        # worker is already draining the queue.
+        if not post_queue.pending(topic_id):
+            break
+        token = post_queue.acquire(topic_id)
+
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+@celery.task()
+def recover_posts():
+    """Drain topics that have posts left in their processing list by a
+    worker that died while draining, so those posts are inserted even if
+    their topic receives no new post. This task is queued whenever a worker
+    is started.
+
+    :rtype: None
+    """
+    for topic_id in post_queue.stale_topics():
+        _drain_posts(topic_id)
+
 
-        return 'post', post.id
+@worker_ready.connect
+def _recover_posts(**kwargs):
+    """Queue :func:`recover_posts` when a worker is started."""
+    recover_posts.delay()
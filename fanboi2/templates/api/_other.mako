@@ -6,6 +6,20 @@
             <div class="api-request-endpoint"><span class="api-request-verb verb-get">GET</span> ${formatters.unquoted_path(request, 'api_task', task='{task.id}')}</div>
             <div class="api-request-body">
                 <p>Use this endpoint to retrieve a status of a task.</p>
+                <table class="api-table">
+                    <thead class="api-table-header">
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">Query string</th>
+                            <th class="api-table-item title">Description</th>
+                        </tr>
+                    </thead>
+                    <tbody class="api-table-body">
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?wait={s}</th>
+                            <td class="api-table-item">Wait up to <em>s</em> seconds (at most 5) for the task to finish before responding. Responds immediately if the server has too many waiting requests.</td>
+                        </tr>
+                    </tbody>
+                </table>
             </div>
         </div>
     </div>
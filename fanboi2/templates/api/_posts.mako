@@ -59,6 +59,14 @@
                             <th class="api-table-item title">?topic=1</th>
                             <td class="api-table-item">Include the topic in a <code>topic</code> object.</td>
                         </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?after={n}</th>
+                            <td class="api-table-item">Only return posts numbered above <em>n</em>.</td>
+                        </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?wait={s}</th>
+                            <td class="api-table-item">Only if <code>after</code> is present. Wait up to <em>s</em> seconds (at most 30) for a post numbered above <em>after</em> before responding. Responds immediately if the server has too many waiting requests.</td>
+                        </tr>
                         <tr class="api-table-row">
                             <th class="api-table-item title">?board=1</th>
                             <td class="api-table-item">Include the board in a <code>boards</code> object. Only if <code>topic</code> is present.</td>
@@ -221,6 +229,14 @@
                             <th class="api-table-item title">?topic=1</th>
                             <td class="api-table-item">Include the topic in a <code>topic</code> object.</td>
                         </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?after={n}</th>
+                            <td class="api-table-item">Only return posts numbered above <em>n</em>.</td>
+                        </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?wait={s}</th>
+                            <td class="api-table-item">Only if <code>after</code> is present. Wait up to <em>s</em> seconds (at most 30) for a post numbered above <em>after</em> before responding. Responds immediately if the server has too many waiting requests.</td>
+                        </tr>
                         <tr class="api-table-row">
                             <th class="api-table-item title">?board=1</th>
                             <td class="api-table-item">Include the board in a <code>boards</code> object. Only if <code>topic</code> is present.</td>
@@ -239,3 +255,37 @@
         </div>
     </div>
 </div>
+
+<div class="api-section" id="api-topic-stream">
+    <div class="api-request">
+        <div class="container">
+            <h2 class="api-request-title">Streaming new posts in a topic <span class="api-request-name">#api-topic-stream</span></h2>
+            <div class="api-request-endpoint"><span class="api-request-verb verb-get">GET</span> ${formatters.unquoted_path(request, 'api_topic_stream', topic='{api-topic.id}')}</div>
+            <div class="api-request-body">
+                <p>Use this endpoint to receive posts as they are made in the specific topic as <a href="https://html.spec.whatwg.org/multipage/server-sent-events.html">Server-Sent Events</a>. Each post is sent as a <code>post</code> event with the post number as its ID. The stream is closed every few minutes and clients are expected to reconnect with the <code>Last-Event-ID</code> header, which <code>EventSource</code> does automatically. Posts made while disconnected are sent first after reconnecting. When the server is busy, the stream may be closed right after sending those posts, in which case clients should reconnect after the <code>retry</code> interval sent by the stream.</p>
+                <table class="api-table">
+                    <thead class="api-table-header">
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">Query string</th>
+                            <th class="api-table-item title">Description</th>
+                        </tr>
+                    </thead>
+                    <tbody class="api-table-body">
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?after={n}</th>
+                            <td class="api-table-item">Send posts numbered above <em>n</em> first. Ignored if <code>Last-Event-ID</code> is given.</td>
+                        </tr>
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    </div>
+    <div class="api-response">
+        <div class="container">
+            <h3 class="api-response-title">Response</h3>
+            <div class="api-response-body">
+                <p>A <code>text/event-stream</code> of <code>post</code> events with <a href="#api-topic-posts">#api-topic-posts</a> object as its data.</p>
+            </div>
+        </div>
+    </div>
+</div>
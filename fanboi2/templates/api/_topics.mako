@@ -47,6 +47,7 @@
             <div class="api-request-endpoint"><span class="api-request-verb verb-get">GET</span> ${formatters.unquoted_path(request, 'api_board_topics', board='{api-board.slug}')}</div>
             <div class="api-request-body">
                 <p>Use this endpoint to retrieve a list of topics associated to the specific board. By default this API will return the same data as board's "All topics" page which includes open topic and topic that are closed (locked and archived) within 1 week of last posted date. It is also possible to include recent posts with <em>query string</em> but doing so with this API is not recommended.</p>
+                <p>Topics are returned in pages ordered by the last bumped date. If there are more topics, the response includes a <code>Link</code> header with <code>rel="next"</code> pointing to the next page.</p>
                 <table class="api-table">
                     <thead class="api-table-header">
                         <tr class="api-table-row">
@@ -63,6 +64,14 @@
                             <th class="api-table-item title">?posts=1</th>
                             <td class="api-table-item">Include the recent 30 posts in a <code>posts</code> object.</td>
                         </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?limit=50</th>
+                            <td class="api-table-item">Return at most this number of topics. Defaults to 50 and is capped at 200.</td>
+                        </tr>
+                        <tr class="api-table-row">
+                            <th class="api-table-item title">?cursor=...</th>
+                            <td class="api-table-item">Return topics after the given cursor. Cursor is an opaque string and should be taken from the <code>Link</code> header of the previous response.</td>
+                        </tr>
                     </tbody>
                 </table>
             </div>
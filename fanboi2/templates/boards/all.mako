@@ -15,3 +15,12 @@
         </div>
     </div>
 % endfor
+% if topics.next_cursor:
+    <div class="topic-footer">
+        <div class="container">
+            <ul class="actions">
+                <li class="actions-item"><a class="button action" href="${request.route_path('board_all', board=board.slug, _query={'cursor': topics.next_cursor, 'limit': topics.limit})}">Older topics</a></li>
+            </ul>
+        </div>
+    </div>
+% endif
@@ -13,7 +13,7 @@
             </div>
         </div>
         <div class="topic-body">
-            ${post.render_posts(topic, topic.recent_posts(5), shorten=500)}
+            ${post.render_posts(topic, recent_posts[topic.id], shorten=500)}
         </div>
         <div class="topic-footer">
             <div class="container">
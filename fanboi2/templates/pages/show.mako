@@ -5,7 +5,7 @@
 <div class="sheet">
     <div class="container">
          <div class="sheet-body content">
-              ${formatters.format_page(request, page)}
+              ${formatters.rendered_page(request, page).body}
          </div>
     </div>
 </div>
\ No newline at end of file
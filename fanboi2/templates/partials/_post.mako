@@ -1,10 +1,14 @@
 <%namespace name="formatters" module="fanboi2.helpers.formatters" />
 <%def name="render_posts(topic, posts, shorten=None)">
+    <%
+        board_slug = topic.board.slug
+        post_path = formatters.route_template(request, 'topic_scoped', board=board_slug, topic=topic.id)
+    %>
     % for post in posts:
         <div class="post">
             <div class="container">
                 <div class="post-header">
-                    <a href="${request.route_path('topic_scoped', board=post.topic.board.slug, topic=post.topic.id, query=post.number)}" class="post-header-item number${' bumped' if post.bumped else ''}" data-topic-quick-reply="${post.number}">${post.number}</a>
+                    <a href="${post_path(query=post.number)}" class="post-header-item number${' bumped' if post.bumped else ''}" data-topic-quick-reply="${post.number}">${post.number}</a>
                     <span class="post-header-item name">${post.name}</span>
                     <time class="post-header-item date" datetime="${formatters.format_isotime(request, post.created_at)}">Posted ${formatters.format_datetime(request, post.created_at)}</time>
                     % if post.ident:
@@ -12,7 +16,7 @@
                     % endif
                 </div>
                 <div class="post-body">
-                    ${formatters.format_post(request, post, shorten=shorten)}
+                    ${formatters.rendered_post(request, post, shorten=shorten, board_slug=board_slug, topic_id=topic.id)}
                 </div>
             </div>
         </div>
@@ -6,7 +6,8 @@ from pyramid import testing
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Query
 from webob.multidict import MultiDict
-from fanboi2.models import DBSession, Base, redis_conn
+from fanboi2.models import DBSession, Base, redis_conn, rule_index
+from fanboi2.utils import page_cache
 
 
 logging.basicConfig()
@@ -17,6 +18,10 @@ DATABASE_URI = os.environ.get(
     'POSTGRESQL_TEST_DATABASE',
     'postgresql://fanboi2:@localhost:5432/fanboi2_test')
 
+REDIS_URI = os.environ.get(
+    'REDIS_TEST_URL',
+    'redis://localhost:6379/15')
+
 
 class DummyRedis(object):
 
@@ -27,16 +32,25 @@ class DummyRedis(object):
     def __init__(self):
         self._store = {}
         self._expire = {}
+        self._subscribers = []
 
     def get(self, key):
         return self._store.get(key)
 
-    def set(self, key, value):
+    def mget(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self._store:
+            return None
         try:
             value = bytes(value.encode('utf-8'))
         except AttributeError:
             pass
         self._store[key] = value
+        if ex is not None:
+            self.expire(key, ex)
+        return True
 
     def setnx(self, key, value):
         if not self.get(key):
@@ -45,9 +59,59 @@ class DummyRedis(object):
     def exists(self, key):
         return key in self._store
 
+    def delete(self, key):
+        self._store.pop(key, None)
+        self._expire.pop(key, None)
+
     def expire(self, key, time):
         self._expire[key] = time
 
+    def incr(self, key):
+        value = int(self._store.get(key, 0)) + 1
+        self.set(key, str(value))
+        return value
+
+    def rpush(self, key, value):
+        try:
+            value = bytes(value.encode('utf-8'))
+        except AttributeError:
+            pass
+        self._store.setdefault(key, []).append(value)
+        return len(self._store[key])
+
+    def llen(self, key):
+        return len(self._store.get(key, []))
+
+    def lrange(self, key, start, end):
+        items = self._store.get(key, [])
+        if end == -1:
+            return items[start:]
+        return items[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        self._store[key] = self.lrange(key, start, end)
+
+    def pipeline(self):
+        return DummyRedisPipeline(self)
+
+    def publish(self, channel, message):
+        if not isinstance(message, bytes):
+            message = bytes(str(message).encode('utf-8'))
+        receivers = 0
+        for pubsub in self._subscribers:
+            if channel in pubsub.channels:
+                pubsub.messages.append({
+                    'type': 'message',
+                    'channel': channel,
+                    'data': message})
+                receivers += 1
+        return receivers
+
+    def pubsub(self):
+        pubsub = DummyRedisPubSub(self)
+        self._subscribers.append(pubsub)
+        return pubsub
+
     def ttl(self, key):
         return self._expire.get(key, 0)
 
@@ -55,6 +119,119 @@ class DummyRedis(object):
         return True
 
 
+class DummyRedisPubSub(object):
+
+    def __init__(self, redis):
+        self._redis = redis
+        self.channels = set()
+        self.messages = []
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def get_message(self, timeout=0):
+        import time
+        if self.messages:
+            return self.messages.pop(0)
+        time.sleep(timeout)
+        return None
+
+    def close(self):
+        self.channels = set()
+        if self in self._redis._subscribers:
+            self._redis._subscribers.remove(self)
+
+
+class DummyRedisPipeline(object):
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        def _queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return _queue
+
+    def execute(self):
+        results = []
+        for name, args, kwargs in self._calls:
+            results.append(getattr(self._redis, name)(*args, **kwargs))
+        self._calls = []
+        return results
+
+
+class DummyDnsServer(object):
+    """A stub DNS server listening on a random local UDP port that answers
+    A queries from :attr:`records` and NXDOMAIN otherwise. Queries for names
+    in :attr:`delayed` are answered after :attr:`delay` seconds. Queries for
+    names in :attr:`held` are not answered until the name it maps to was
+    also queried.
+    """
+
+    def __init__(self, records=None, delayed=None, delay=0, held=None):
+        import socket
+        self.records = records or {}
+        self.delayed = delayed or []
+        self.delay = delay
+        self.held = held or {}
+        self.queries = []
+        self._pending = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.settimeout(0.1)
+        self._running = False
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._socket.getsockname()[1]
+
+    def start(self):
+        import threading
+        self._running = True
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._socket.close()
+
+    def _serve(self):
+        import socket
+        import time
+        import dns.message
+        import dns.rcode
+        import dns.rrset
+        while self._running:
+            try:
+                data, addr = self._socket.recvfrom(512)
+            except socket.timeout:
+                continue
+            query = dns.message.from_wire(data)
+            name = query.question[0].name.to_text()
+            self.queries.append(name)
+            response = dns.message.make_response(query)
+            if name in self.records:
+                response.answer.append(dns.rrset.from_text(
+                    name, 60, 'IN', 'A', self.records[name]))
+            else:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            if name in self.delayed:
+                time.sleep(self.delay)
+            self._pending.append((self.held.get(name), response, addr))
+            pending = []
+            for wait_name, response, addr in self._pending:
+                if wait_name is None or wait_name in self.queries:
+                    self._socket.sendto(response.to_wire(), addr)
+                else:
+                    pending.append((wait_name, response, addr))
+            self._pending = pending
+
+
 class _ModelInstanceSetup(object):
 
     def _newBoard(self, **kwargs):
@@ -159,6 +336,8 @@ class ModelMixin(_ModelInstanceSetup, unittest.TestCase):
     def setUp(self):
         super(ModelMixin, self).setUp()
         redis_conn._redis = DummyRedis()
+        rule_index.invalidate()
+        page_cache.clear()
         Base.metadata.drop_all()
         Base.metadata.create_all()
         transaction.begin()
@@ -232,6 +411,10 @@ class DummyAsyncResult(object):
     def get(self):
         return self._result
 
+    def ready(self):
+        from celery import states
+        return self.state in states.READY_STATES
+
 
 class TaskMixin(unittest.TestCase):
 
@@ -284,3 +467,26 @@ class CacheMixin(unittest.TestCase):
         from dogpile.cache import make_region
         return make_region().configure('dogpile.cache.memory', arguments={
             'cache_dict': store if store is not None else {}})
+
+
+class RedisMixin(unittest.TestCase):
+    """Binds :data:`fanboi2.models.redis_conn` to a real Redis database at
+    :data:`REDIS_URI` for tests that need server-side scripts, which
+    :class:`DummyRedis` does not implement. The database is flushed before
+    and after each test. Tests are skipped if Redis is not reachable.
+    """
+
+    def setUp(self):
+        import redis
+        client = redis.StrictRedis.from_url(REDIS_URI)
+        try:
+            client.flushdb()
+        except redis.exceptions.ConnectionError:
+            self.skipTest('Redis is not available at %s' % (REDIS_URI,))
+        super(RedisMixin, self).setUp()
+        redis_conn._redis = client
+
+    def tearDown(self):
+        redis_conn._redis.flushdb()
+        super(RedisMixin, self).tearDown()
+        redis_conn._redis = None
@@ -179,6 +179,8 @@ class TestNormalizeSettings(unittest.TestCase):
         self.assertEqual(result['app.secret'], '')
         self.assertEqual(result['app.akismet_key'], '')
         self.assertEqual(result['app.dnsbl_providers'], [])
+        self.assertEqual(result['app.dnsbl_nameservers'], [])
+        self.assertEqual(result['app.dnsbl_timeout'], '')
         self.assertEqual(result['app.proxy_detect.providers'], [])
         self.assertEqual(result['app.proxy_detect.blackbox.url'], '')
         self.assertEqual(result['app.proxy_detect.getipintel.url'], '')
@@ -186,6 +188,19 @@ class TestNormalizeSettings(unittest.TestCase):
         self.assertEqual(result['app.proxy_detect.getipintel.flags'], '')
         self.assertEqual(result['app.geoip2_database'], '')
         self.assertEqual(result['app.checklist'], [])
+        self.assertEqual(result['app.post_batch.size'], '')
+        self.assertEqual(result['app.post_batch.wait'], '')
+        self.assertEqual(result['app.ident_engine'], '')
+        self.assertEqual(result['app.json_renderer'], '')
+        self.assertEqual(result['app.wait_limit'], '')
+        self.assertEqual(result['app.http.timeout'], '')
+        self.assertEqual(result['app.http.retries'], '')
+        self.assertEqual(result['app.http.pool_size'], '')
+        self.assertEqual(result['app.http.circuit_threshold'], '')
+        self.assertEqual(result['app.http.circuit_window'], '')
+        self.assertEqual(result['app.http.circuit_reset'], '')
+        self.assertEqual(result['app.http.circuit_latency'], '')
+        self.assertEqual(result['app.http.circuit_fail'], '')
 
     def test_settings(self):
         r = self._makeOne({
@@ -265,6 +280,21 @@ class TestNormalizeSettings(unittest.TestCase):
             'APP_PROXY_DETECT_GETIPINTEL_FLAGS': 'm',
             'APP_GEOIP2_DATABASE': '/var/geoip2/database',
             'APP_CHECKLIST': 'country:th/\ncountry:jp/proxy_detect */*',
+            'APP_DNSBL_NAMESERVERS': '127.0.0.1 127.0.0.2',
+            'APP_DNSBL_TIMEOUT': '1.5',
+            'APP_POST_BATCH_SIZE': '20',
+            'APP_POST_BATCH_WAIT': '50',
+            'APP_IDENT_ENGINE': 'hmac',
+            'APP_JSON_RENDERER': 'pyramid',
+            'APP_WAIT_LIMIT': '8',
+            'APP_HTTP_TIMEOUT': '3',
+            'APP_HTTP_RETRIES': '1',
+            'APP_HTTP_POOL_SIZE': '20',
+            'APP_HTTP_CIRCUIT_THRESHOLD': '10',
+            'APP_HTTP_CIRCUIT_WINDOW': '30',
+            'APP_HTTP_CIRCUIT_RESET': '15',
+            'APP_HTTP_CIRCUIT_LATENCY': '2',
+            'APP_HTTP_CIRCUIT_FAIL': 'closed',
         })
 
         self.assertEqual(r['sqlalchemy.url'], 'postgresql://localhost:5432/foo')
@@ -304,6 +334,24 @@ class TestNormalizeSettings(unittest.TestCase):
             'country:jp/proxy_detect',
             '*/*',
         ])
+        self.assertEqual(r['app.dnsbl_nameservers'], [
+            '127.0.0.1',
+            '127.0.0.2',
+        ])
+        self.assertEqual(r['app.dnsbl_timeout'], '1.5')
+        self.assertEqual(r['app.post_batch.size'], '20')
+        self.assertEqual(r['app.post_batch.wait'], '50')
+        self.assertEqual(r['app.ident_engine'], 'hmac')
+        self.assertEqual(r['app.json_renderer'], 'pyramid')
+        self.assertEqual(r['app.wait_limit'], '8')
+        self.assertEqual(r['app.http.timeout'], '3')
+        self.assertEqual(r['app.http.retries'], '1')
+        self.assertEqual(r['app.http.pool_size'], '20')
+        self.assertEqual(r['app.http.circuit_threshold'], '10')
+        self.assertEqual(r['app.http.circuit_window'], '30')
+        self.assertEqual(r['app.http.circuit_reset'], '15')
+        self.assertEqual(r['app.http.circuit_latency'], '2')
+        self.assertEqual(r['app.http.circuit_fail'], 'closed')
 
     def test_override(self):
         r = self._makeOne({
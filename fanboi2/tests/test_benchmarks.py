@@ -0,0 +1,88 @@
+import io
+import unittest
+import unittest.mock
+from pyramid import testing
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_benchmark(self):
+        from fanboi2.benchmarks import benchmark, BENCHMARKS
+        with unittest.mock.patch.dict(BENCHMARKS, clear=True):
+            @benchmark('foo')
+            def foo():
+                return lambda: None
+            self.assertEqual(list(BENCHMARKS.keys()), ['foo'])
+            with self.assertRaises(ValueError):
+                benchmark('foo')(foo)
+
+    def test_run(self):
+        from fanboi2.benchmarks import benchmark, run, BENCHMARKS
+        from fanboi2.benchmarks import load_benchmarks
+        load_benchmarks()
+        calls = []
+        with unittest.mock.patch.dict(BENCHMARKS):
+            @benchmark('test.foo')
+            def foo():
+                return lambda: calls.append(1)
+            results = run(['test.foo'], repeat=3, min_time=0.01)
+        self.assertEqual(list(results.keys()), ['test.foo'])
+        result = results['test.foo']
+        self.assertEqual(result['repeat'], 3)
+        self.assertGreater(result['number'], 0)
+        self.assertLessEqual(result['min'], result['median'])
+        self.assertGreater(len(calls), 0)
+
+    def test_calibrate(self):
+        from fanboi2.benchmarks import _calibrate
+        timer = unittest.mock.Mock()
+        timer.timeit.side_effect = lambda number: number * 0.01
+        self.assertEqual(_calibrate(timer, 0.05), 8)
+        self.assertEqual(
+            [c[0][0] for c in timer.timeit.call_args_list],
+            [1, 2, 4, 8])
+
+    def test_compare(self):
+        from fanboi2.benchmarks import compare
+        baseline = {
+            'foo': {'min': 1.0},
+            'bar': {'min': 1.0},
+            'baz': {'min': 1.0},
+        }
+        results = {
+            'foo': {'min': 1.1},
+            'bar': {'min': 1.5},
+            'qux': {'min': 1.0},
+        }
+        self.assertEqual(compare(results, baseline, 0.2), [
+            ('bar', 1.0, 1.5, 0.5),
+        ])
+        self.assertEqual(len(compare(results, baseline, 0.05)), 2)
+
+    def test_dump_results(self):
+        from fanboi2.benchmarks import dump_results, load_results
+        results = {'foo': {'min': 1.0, 'median': 2.0}}
+        fp = io.StringIO()
+        dump_results(results, fp)
+        fp.seek(0)
+        self.assertEqual(load_results(fp), results)
+
+    def test_corpus(self):
+        from fanboi2.benchmarks.corpus import post_bodies
+        bodies = post_bodies(5, 1000)
+        self.assertEqual(bodies, post_bodies(5, 1000))
+        self.assertNotEqual(bodies, post_bodies(5, 1000, seed=1))
+        for body in bodies:
+            self.assertEqual(len(body), 1000)
+
+    def test_setup(self):
+        from fanboi2.benchmarks import load_benchmarks
+        benchmarks = load_benchmarks()
+        self.assertIn('formatters.format_post', benchmarks)
+        self.assertIn('models.rule_index_match', benchmarks)
+        for name, setup in benchmarks.items():
+            setup()()
+            testing.tearDown()
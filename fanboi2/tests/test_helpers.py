@@ -343,6 +343,27 @@ class TestFormattersWithRegistry(RegistryMixin):
             unquoted_path(None, request, 'board', board='{board.id}'),
             '/test/{board.id}')
 
+    def test_route_template(self):
+        from fanboi2.helpers.formatters import route_template
+        request = self._makeRequest()
+        config = self._makeConfig()
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}/')
+        template = route_template(
+            None,
+            request,
+            'topic_scoped',
+            board='foo',
+            topic=1)
+        self.assertEqual(template(query='1-5'), '/foo/1/1-5/')
+        self.assertIs(
+            route_template(
+                None,
+                request,
+                'topic_scoped',
+                board='foo',
+                topic=1),
+            template)
+
 
 class TestFormattersWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
 
@@ -421,6 +442,53 @@ class TestFormattersWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         for source, target in tests:
             self.assertEqual(format_post(None, request, source), Markup(target))
 
+    def test_format_post_link_anchor(self):
+        from fanboi2.helpers.formatters import format_post
+        from markupsafe import Markup
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('board', '/{board}')
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}')
+        board = self._makeBoard(title="Foobar", slug="foobar")
+        topic = self._makeTopic(board=board, title="Hogehogehogehogehoge")
+        post = self._makePost(
+            topic=topic,
+            body=">>>/foohttp://example.com/ >>1")
+        self.assertEqual(
+            format_post(None, request, post),
+            Markup("<p><a data-anchor-board=\"foo\" "
+                   "data-anchor-topic=\"\" "
+                   "data-anchor=\"\" "
+                   "href=\"/foo\" "
+                   "class=\"anchor\">&gt;&gt;&gt;/foo</a>"
+                   "<a href=\"http://example.com/\" class=\"link\" "
+                   "target=\"_blank\" rel=\"nofollow\">"
+                   "http://example.com/</a> "
+                   "<a data-anchor-topic=\"1\" "
+                   "data-anchor=\"1\" "
+                   "href=\"/foobar/1/1\" "
+                   "class=\"anchor\">&gt;&gt;1</a></p>"))
+
+    def test_format_post_context(self):
+        from fanboi2.helpers.formatters import format_post
+        from markupsafe import Markup
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}')
+        board = self._makeBoard(title="Foobar", slug="foobar")
+        topic = self._makeTopic(board=board, title="Hogehogehogehogehoge")
+        post = self._makePost(topic=topic, body=">>1 >>2")
+        self.assertEqual(
+            format_post(None, request, post, board_slug='baz', topic_id=5),
+            Markup("<p><a data-anchor-topic=\"5\" "
+                   "data-anchor=\"1\" "
+                   "href=\"/baz/5/1\" "
+                   "class=\"anchor\">&gt;&gt;1</a> "
+                   "<a data-anchor-topic=\"5\" "
+                   "data-anchor=\"2\" "
+                   "href=\"/baz/5/2\" "
+                   "class=\"anchor\">&gt;&gt;2</a></p>"))
+
     def test_format_post_shorten(self):
         from fanboi2.helpers.formatters import format_post
         from markupsafe import Markup
@@ -435,6 +503,73 @@ class TestFormattersWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
                                 "Post shortened. <a href=\"/foobar/1/1-\" "
                                 "class=\"anchor\">See full post</a>.</p>"))
 
+    def test_render_post(self):
+        from fanboi2.helpers.formatters import render_post, FORMATTER_VERSION
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}')
+        board = self._makeBoard(title="Foobar", slug="foobar")
+        topic = self._makeTopic(board=board, title="Hogehogehogehogehoge")
+        post1 = self._makePost(topic=topic, body=">>1")
+        post2 = self._makePost(topic=topic, body="Hello\n" * 200)
+        render1 = render_post(request, post1)
+        render2 = render_post(request, post2)
+        self.assertEqual(post1.render, render1)
+        self.assertEqual(render1.version, FORMATTER_VERSION)
+        self.assertEqual(
+            render1.body,
+            "<p><a data-anchor-topic=\"1\" data-anchor=\"1\" "
+            "href=\"/foobar/1/1\" class=\"anchor\">&gt;&gt;1</a></p>")
+        self.assertIsNone(render1.body_preview)
+        self.assertIsNotNone(render2.body_preview)
+        self.assertIn('class="shortened"', render2.body_preview)
+        self.assertNotIn('class="shortened"', render2.body)
+
+    def test_render_post_script_name(self):
+        from fanboi2.helpers.formatters import render_post, rendered_post
+        from markupsafe import Markup
+        request = self._makeRequest()
+        request.script_name = '/app'
+        config = self._makeConfig(request)
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}')
+        board = self._makeBoard(title="Foobar", slug="foobar")
+        topic = self._makeTopic(board=board, title="Hogehogehogehogehoge")
+        post = self._makePost(topic=topic, body=">>1")
+        render = render_post(request, post)
+        self.assertEqual(
+            render.body,
+            "<p><a data-anchor-topic=\"1\" data-anchor=\"1\" "
+            "href=\"/foobar/1/1\" class=\"anchor\">&gt;&gt;1</a></p>")
+        self.assertEqual(
+            rendered_post(None, request, post),
+            Markup("<p><a data-anchor-topic=\"1\" data-anchor=\"1\" "
+                   "href=\"/app/foobar/1/1\" class=\"anchor\">"
+                   "&gt;&gt;1</a></p>"))
+
+    def test_rendered_post(self):
+        from fanboi2.helpers.formatters import rendered_post, PREVIEW_LENGTH
+        from fanboi2.models import PostRender
+        from markupsafe import Markup
+        request = self._makeRequest()
+        board = self._makeBoard(title="Foobar", slug="foobar")
+        topic = self._makeTopic(board=board, title="Hogehogehogehogehoge")
+        post1 = self._makePost(topic=topic, body="Hello")
+        post1.render = PostRender(version=1, body="Full", body_preview="Short")
+        post2 = self._makePost(topic=topic, body="Hello")
+        post2.render = PostRender(version=1, body="Full")
+        post3 = self._makePost(topic=topic, body="Hello")
+        post3.render = PostRender(version=0, body="Outdated")
+        self.assertEqual(rendered_post(None, request, post1), Markup("Full"))
+        self.assertEqual(
+            rendered_post(None, request, post1, shorten=PREVIEW_LENGTH),
+            Markup("Short"))
+        self.assertEqual(
+            rendered_post(None, request, post2, shorten=PREVIEW_LENGTH),
+            Markup("Full"))
+        self.assertEqual(
+            rendered_post(None, request, post3),
+            Markup("<p>Hello</p>"))
+
     def test_format_page(self):
         from fanboi2.helpers.formatters import format_page
         from markupsafe import Markup
@@ -461,3 +596,27 @@ class TestFormattersWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         )
         for source, target in tests:
             self.assertEqual(format_page(None, request, source), Markup(target))
+
+    def test_rendered_page(self):
+        from fanboi2.helpers.formatters import rendered_page, page_etag
+        from fanboi2.models import DBSession
+        from fanboi2.utils import PageCache
+        from markupsafe import Markup
+        request = self._makeRequest()
+        page_cache = PageCache()
+        page = self._makePage(body='**Foo**', slug='foo', title='Foo')
+        rendered = rendered_page(None, request, page, page_cache)
+        self.assertEqual(
+            rendered.body,
+            Markup('<p><strong>Foo</strong></p>\n'))
+        self.assertEqual(rendered.etag, page_etag(page.id, page.version))
+        self.assertIsNone(page_cache.get(page.id, page.version))
+        DBSession().info.pop('rendered_pages')
+        rendered = rendered_page(None, request, page, page_cache)
+        self.assertIs(page_cache.get(page.id, page.version), rendered)
+        self.assertIs(rendered_page(None, request, page, page_cache), rendered)
+        page.body = 'Bar'
+        self.assertEqual(
+            rendered_page(None, request, page, page_cache).body,
+            Markup('<p>Bar</p>\n'))
+        self.assertIs(page_cache.get(page.id, page.version), rendered)
@@ -1,5 +1,6 @@
 import transaction
 import unittest
+import unittest.mock
 from fanboi2.models import DBSession
 from fanboi2.tests import DummyRedis, DATABASE_URI, ModelMixin
 from sqlalchemy.ext.declarative import declarative_base
@@ -71,6 +72,39 @@ class TestIdentity(unittest.TestCase):
         self.assertNotEqual(ident2, ident3)
         self.assertEqual(identity.get("127.0.0.1"), ident1)
 
+    def test_configure_engine(self):
+        identity = self._makeOne()
+        identity.configure_engine('')
+        self.assertEqual(identity.engine, 'redis')
+        with self.assertRaises(ValueError):
+            identity.configure_engine('foobar')
+        with self.assertRaises(ValueError):
+            identity.configure_engine('hmac')
+
+    def test_get_hmac(self):
+        identity = self._makeOne()
+        identity.configure_engine('hmac', 'SECRET')
+        ident1 = identity.get("127.0.0.1")
+        ident2 = identity.get("127.0.0.1", "foobar")
+        ident3 = identity.get("192.168.1.1", "foobar")
+        self.assertNotEqual(ident1, ident2)
+        self.assertNotEqual(ident1, ident3)
+        self.assertNotEqual(ident2, ident3)
+        self.assertEqual(identity.get("127.0.0.1"), ident1)
+        self.assertEqual(len(ident1), 9)
+        self.assertTrue(all(c in identity.STRINGS for c in ident1))
+        self.assertEqual(identity.redis._store, {})
+
+    def test_get_hmac_rotate(self):
+        identity = self._makeOne()
+        identity.configure_engine('hmac', 'SECRET')
+        with unittest.mock.patch.object(identity, '_today') as today:
+            today.return_value = '20161025'
+            ident1 = identity.get("127.0.0.1")
+            today.return_value = '20161026'
+            ident2 = identity.get("127.0.0.1")
+        self.assertNotEqual(ident1, ident2)
+
 
 class TestJsonType(unittest.TestCase):
 
@@ -1180,9 +1214,37 @@ class TestBoardModel(ModelMixin, unittest.TestCase):
             body="Hax",
             bumped=False)
         DBSession.refresh(board)
-        self.assertEqual([topic5, topic2, topic3, topic1, topic4],
+        # topic1 and topic4 are bumped within the same transaction and
+        # share the same bump time, so the newer topic comes first.
+        self.assertEqual([topic5, topic2, topic3, topic4, topic1],
                          list(board.topics))
 
+    def test_topics_query(self):
+        from datetime import datetime, timedelta, timezone
+        board1 = self._makeBoard(title="Foobar", slug="foobar")
+        board2 = self._makeBoard(title="Foobaz", slug="foobaz")
+        now = datetime.now(timezone.utc)
+        topic1 = self._makeTopic(board=board1, title="Topic 1")
+        topic2 = self._makeTopic(board=board1, title="Topic 2")
+        topic3 = self._makeTopic(board=board1, title="Topic 3")
+        topic4 = self._makeTopic(board=board2, title="Topic 4")
+        self._makePost(
+            topic=topic2,
+            body="Hello",
+            created_at=now + timedelta(hours=2))
+        self._makePost(
+            topic=topic3,
+            body="Hello",
+            created_at=now + timedelta(hours=1))
+        self._makePost(topic=topic4, body="Hello", created_at=now)
+        self.assertEqual(list(board1.topics), [topic2, topic3, topic1])
+        self.assertEqual(list(board2.topics), [topic4])
+        topic1.board = board2
+        DBSession.add(topic1)
+        DBSession.flush()
+        self.assertEqual(list(board1.topics), [topic2, topic3])
+        self.assertEqual(list(board2.topics), [topic4, topic1])
+
 
 class TestTopicModel(ModelMixin, unittest.TestCase):
 
@@ -1297,7 +1359,8 @@ class TestTopicModel(ModelMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Lorem ipsum dolor')
         self.assertEqual(topic.meta.post_count, 0)
         self.assertIsNone(topic.meta.posted_at)
-        self.assertIsNone(topic.meta.bumped_at)
+        self.assertEqual(topic.meta.bumped_at, topic.created_at)
+        self.assertEqual(topic.meta.board_id, board.id)
 
     def test_auto_archive(self):
         board = self._makeBoard(title="Foobar", slug="foo", settings={
@@ -1466,6 +1529,17 @@ class TestTopicMetaModel(ModelMixin, unittest.TestCase):
             self._makePost(topic=topic, body="Hello, world!")
         self.assertEqual(topic.meta.post_count, 3)
 
+    def test_board_id(self):
+        board1 = self._makeBoard(title="Foobar", slug="foo")
+        board2 = self._makeBoard(title="Lorem", slug="lorem")
+        topic = self._makeTopic(board=board1, title="Lorem ipsum dolor")
+        self.assertEqual(topic.meta.board_id, board1.id)
+        topic.board = board2
+        DBSession.add(topic)
+        DBSession.flush()
+        self.assertEqual(topic.meta.board_id, board2.id)
+        self.assertEqual([topic], list(board2.topics))
+
     def test_post_count_deletion(self):
         board = self._makeBoard(title="Foobar", slug="foo")
         topic = self._makeTopic(board=board, title="Lorem ipsum dolor")
@@ -1497,7 +1571,7 @@ class TestTopicMetaModel(ModelMixin, unittest.TestCase):
         from datetime import datetime, timezone
         board = self._makeBoard(title="Foobar", slug="foo")
         topic = self._makeTopic(board=board, title="Lorem ipsum dolor")
-        self.assertIsNone(topic.meta.bumped_at)
+        self.assertEqual(topic.meta.bumped_at, topic.created_at)
         post1 = self._makePost(
             topic=topic,
             body="Hello, world",
@@ -1506,6 +1580,26 @@ class TestTopicMetaModel(ModelMixin, unittest.TestCase):
         self.assertEqual(topic.meta.bumped_at, post1.created_at)
         self.assertNotEqual(topic.meta.bumped_at, post2.created_at)
 
+    def test_version(self):
+        board = self._makeBoard(title="Foobar", slug="foo")
+        topic1 = self._makeTopic(board=board, title="Lorem ipsum dolor")
+        topic2 = self._makeTopic(board=board, title="Hello, world")
+        self.assertEqual(topic1.meta.version, 0)
+        post1 = self._makePost(topic=topic1, body="Hello, world!")
+        post2 = self._makePost(topic=topic1, body="Hello, world!")
+        self._makePost(topic=topic2, body="Hello, world!")
+        self.assertEqual(topic1.meta.version, 0)
+        post1.body = "Hello, edited world!"
+        DBSession.add(post1)
+        DBSession.flush()
+        self.assertEqual(topic1.meta.version, 1)
+        DBSession.delete(post2)
+        DBSession.flush()
+        self.assertEqual(topic1.meta.version, 2)
+        DBSession.expire_all()
+        self.assertEqual(topic1.meta.version, 2)
+        self.assertEqual(topic2.meta.version, 0)
+
 
 class TestPostModel(ModelMixin, unittest.TestCase):
 
@@ -1538,6 +1632,89 @@ class TestPostModel(ModelMixin, unittest.TestCase):
         self.assertIsNotNone(post_v1.created_at)
         self.assertIsNone(post_v1.updated_at)
 
+    def test_render_changed(self):
+        from fanboi2.models import PostRender
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Lorem ipsum dolor')
+        post = self._makePost(topic=topic, body='Foobar baz')
+        post.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        DBSession.flush()
+        self.assertEqual(DBSession.query(PostRender).count(), 1)
+        post.name = 'Nameless'
+        DBSession.flush()
+        self.assertEqual(post.render.body, '<p>Foobar baz</p>')
+        post.body = 'Foobar baz updated'
+        DBSession.flush()
+        DBSession.expire_all()
+        self.assertEqual(post.render.body, '<p>Foobar baz updated</p>')
+        self.assertEqual(DBSession.query(PostRender).count(), 1)
+
+    @unittest.mock.patch('fanboi2.helpers.formatters.format_post')
+    def test_render_changed_failure(self, format_post):
+        from fanboi2.models import PostRender
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Lorem ipsum dolor')
+        post = self._makePost(topic=topic, body='Foobar baz')
+        post.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        DBSession.flush()
+        format_post.side_effect = ValueError('Formatter failed')
+        post.body = 'Foobar baz updated'
+        DBSession.flush()
+        self.assertIsNone(post.render)
+        self.assertEqual(DBSession.query(PostRender).count(), 0)
+
+    def test_render_topic_moved(self):
+        from fanboi2.models import PostRender
+        board1 = self._makeBoard(title='Foobar', slug='foo')
+        board2 = self._makeBoard(title='Bazbar', slug='baz')
+        topic1 = self._makeTopic(board=board1, title='Lorem ipsum dolor')
+        topic2 = self._makeTopic(board=board1, title='Hello, world')
+        post1 = self._makePost(topic=topic1, body='Foobar baz')
+        post2 = self._makePost(topic=topic2, body='Foobar baz')
+        post1.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        post2.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        DBSession.flush()
+        topic1.board = board2
+        DBSession.flush()
+        self.assertIsNone(post1.render)
+        self.assertIsNotNone(post2.render)
+        self.assertEqual(
+            [r.post_id for r in DBSession.query(PostRender)],
+            [post2.id])
+
+    def test_render_board_slug_changed(self):
+        from fanboi2.models import PostRender
+        board1 = self._makeBoard(title='Foobar', slug='foo')
+        board2 = self._makeBoard(title='Bazbar', slug='baz')
+        topic1 = self._makeTopic(board=board1, title='Lorem ipsum dolor')
+        topic2 = self._makeTopic(board=board2, title='Hello, world')
+        post1 = self._makePost(topic=topic1, body='Foobar baz')
+        post2 = self._makePost(topic=topic2, body='Foobar baz')
+        post1.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        post2.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        DBSession.flush()
+        board1.title = 'Foobar updated'
+        DBSession.flush()
+        self.assertEqual(DBSession.query(PostRender).count(), 2)
+        board1.slug = 'foobar'
+        DBSession.flush()
+        self.assertIsNone(post1.render)
+        self.assertIsNotNone(post2.render)
+        self.assertEqual(
+            [r.post_id for r in DBSession.query(PostRender)],
+            [post2.id])
+
+    def test_render_cascade(self):
+        from fanboi2.models import Post, PostRender
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Lorem ipsum dolor')
+        post = self._makePost(topic=topic, body='Foobar baz')
+        post.render = PostRender(version=1, body='<p>Foobar baz</p>')
+        DBSession.flush()
+        DBSession.execute(
+            Post.__table__.delete().where(Post.__table__.c.id == post.id))
+        self.assertEqual(DBSession.query(PostRender).count(), 0)
+
     def test_versioned_deleted(self):
         from sqlalchemy import inspect
         from fanboi2.models import Post
@@ -1578,6 +1755,57 @@ class TestPostModel(ModelMixin, unittest.TestCase):
         post6 = self._makePost(topic=topic2, body="Topic 2, post 3")
         self.assertEqual(post6.number, 3)
 
+    def test_number_committed(self):
+        import transaction
+        from fanboi2.models import Topic
+        with transaction.manager:
+            board = self._makeBoard(title="Foobar", slug="foo")
+            topic = self._makeTopic(board=board, title="Numbering")
+            topic_id = topic.id  # topic is not bound outside transaction!
+        with transaction.manager:
+            topic = DBSession.query(Topic).get(topic_id)
+            post1 = self._makePost(topic=topic, body="Post 1")
+            post2 = self._makePost(topic=topic, body="Post 2")
+            self.assertEqual(post1.number, 1)
+            self.assertEqual(post2.number, 2)
+            self.assertEqual(topic.meta.post_count, 2)
+
+    def test_number_rollback(self):
+        import transaction
+        from fanboi2.models import Topic
+        with transaction.manager:
+            board = self._makeBoard(title="Foobar", slug="foo")
+            topic = self._makeTopic(board=board, title="Numbering")
+            topic_id = topic.id  # topic is not bound outside transaction!
+        transaction.begin()
+        topic = DBSession.query(Topic).get(topic_id)
+        self._makePost(topic=topic, body="Rolled back")
+        transaction.abort()
+        with transaction.manager:
+            topic = DBSession.query(Topic).get(topic_id)
+            post = self._makePost(topic=topic, body="Committed")
+            self.assertEqual(post.number, 1)
+            self.assertEqual(topic.meta.post_count, 1)
+
+    def test_number_moved(self):
+        import transaction
+        from fanboi2.models import Board, Topic
+        with transaction.manager:
+            board1 = self._makeBoard(title="Foobar", slug="foo")
+            self._makeBoard(title="Bazbar", slug="baz")
+            topic = self._makeTopic(board=board1, title="Numbering")
+            self._makePost(topic=topic, body="Post 1")
+            topic_id = topic.id  # topic is not bound outside transaction!
+        with transaction.manager:
+            topic = DBSession.query(Topic).get(topic_id)
+            topic.board = DBSession.query(Board).filter_by(slug="baz").one()
+            DBSession.flush()
+            post = self._makePost(topic=topic, body="Post 2")
+            self.assertEqual(post.number, 2)
+        topic = DBSession.query(Topic).get(topic_id)
+        self.assertEqual(topic.meta.post_count, 2)
+        self.assertEqual(topic.meta.board_id, topic.board_id)
+
     def test_name(self):
         board = self._makeBoard(title="Foobar", slug="foo", settings={
             'name': 'Nobody Nowhere',
@@ -1666,6 +1894,33 @@ class TestPageModel(ModelMixin, unittest.TestCase):
         self.assertIsNotNone(page_v1.created_at)
         self.assertIsNone(page_v1.updated_at)
 
+    def test_rendered_on_commit(self):
+        from markupsafe import Markup
+        from fanboi2.models import Page
+        from fanboi2.utils import page_cache
+        with transaction.manager:
+            page = self._makePage(title='Foo', slug='foo', body='**Foo**')
+            page_id = page.id
+            self.assertIsNone(page_cache.get(page_id, 1))
+        self.assertEqual(
+            page_cache.get(page_id, 1).body,
+            Markup('<p><strong>Foo</strong></p>\n'))
+        with transaction.manager:
+            page = DBSession.query(Page).get(page_id)
+            page.body = 'Bar'
+            DBSession.add(page)
+        self.assertEqual(
+            page_cache.get(page_id, 2).body,
+            Markup('<p>Bar</p>\n'))
+
+    def test_rendered_on_commit_rollback(self):
+        from fanboi2.utils import page_cache
+        transaction.begin()
+        page = self._makePage(title='Foo', slug='foo', body='**Foo**')
+        page_id = page.id
+        transaction.abort()
+        self.assertIsNone(page_cache.get(page_id, 1))
+
 
 class TestRuleModel(ModelMixin, unittest.TestCase):
 
@@ -1785,3 +2040,170 @@ class TestRuleOverrideModel(ModelMixin, unittest.TestCase):
         self.assertEqual(None, _makeQuery('10.0.5.1'))
         self.assertEqual(None, _makeQuery('10.0.6.1'))
         self.assertEqual(None, _makeQuery('10.0.7.1'))
+
+
+class TestRuleIndex(ModelMixin, unittest.TestCase):
+
+    def _makeOne(self):
+        from fanboi2.models import RuleIndex, redis_conn
+        return RuleIndex(redis=redis_conn)
+
+    def test_banned(self):
+        from datetime import datetime, timedelta
+        self._makeRuleBan(ip_address='10.0.1.0/24')
+        self._makeRuleBan(ip_address='10.0.3.1')
+        self._makeRuleBan(ip_address='10.0.4.0/24', scope='foo:bar')
+        self._makeRuleOverride(ip_address='10.0.6.0/24')
+        self._makeRuleBan(ip_address='10.0.7.0/24', active=False)
+        self._makeRuleBan(
+            ip_address='10.0.8.0/24',
+            active_until=datetime.now() - timedelta(days=1))
+        self._makeRuleBan(ip_address='2001:db8::/32')
+        rule_index = self._makeOne()
+        self.assertTrue(rule_index.banned('10.0.1.1'))
+        self.assertTrue(rule_index.banned('10.0.3.1'))
+        self.assertFalse(rule_index.banned('10.0.3.2'))
+        self.assertTrue(rule_index.banned('10.0.4.1', scopes=['foo:bar']))
+        self.assertFalse(rule_index.banned('10.0.4.1'))
+        self.assertFalse(rule_index.banned('10.0.4.1', scopes=['foo:baz']))
+        self.assertFalse(rule_index.banned('10.0.6.1'))
+        self.assertFalse(rule_index.banned('10.0.7.1'))
+        self.assertFalse(rule_index.banned('10.0.8.1'))
+        self.assertTrue(rule_index.banned('2001:db8::1'))
+        self.assertFalse(rule_index.banned('2001:db9::1'))
+        self.assertFalse(rule_index.banned('foobar'))
+
+    def test_banned_expired(self):
+        from datetime import datetime, timedelta, timezone
+        self._makeRuleBan(
+            ip_address='10.0.1.0/24',
+            active_until=datetime.now() + timedelta(days=1))
+        rule_index = self._makeOne()
+        self.assertTrue(rule_index.banned('10.0.1.1'))
+        with unittest.mock.patch('fanboi2.models._rule_index.datetime') as dt:
+            dt.datetime.now.return_value = \
+                datetime.now(timezone.utc) + timedelta(days=2)
+            self.assertFalse(rule_index.banned('10.0.1.1'))
+
+    def test_override(self):
+        self._makeRuleOverride(
+            ip_address='10.0.0.0/16',
+            override={'status': 'restricted'})
+        self._makeRuleOverride(
+            ip_address='10.0.1.0/24',
+            override={'status': 'open'})
+        self._makeRuleOverride(
+            ip_address='10.0.2.0/24',
+            scope='board:foo',
+            override={'status': 'locked'})
+        self._makeRuleBan(ip_address='10.0.3.0/24')
+        rule_index = self._makeOne()
+        self.assertEqual(rule_index.override('10.0.1.1'), {'status': 'open'})
+        self.assertEqual(
+            rule_index.override('10.0.2.1'),
+            {'status': 'restricted'})
+        self.assertEqual(
+            rule_index.override('10.0.2.1', scopes=['board:foo']),
+            {'status': 'locked'})
+        self.assertEqual(
+            rule_index.override('10.0.3.1'),
+            {'status': 'restricted'})
+        self.assertEqual(rule_index.override('10.1.0.1'), {})
+
+    def test_invalidate(self):
+        from fanboi2.models import rule_index
+        self.assertFalse(rule_index.banned('10.0.1.1'))
+        self._makeRuleBan(ip_address='10.0.1.0/24')
+        self.assertTrue(rule_index.banned('10.0.1.1'))
+
+    def test_version(self):
+        import transaction
+        from fanboi2.models import redis_conn
+        rule_index = self._makeOne()
+        rule_index.check_interval = 0
+        self.assertFalse(rule_index.banned('10.0.1.1'))
+        with transaction.manager:
+            self._makeRuleBan(ip_address='10.0.1.0/24')
+        self.assertIsNotNone(redis_conn.get(rule_index.VERSION_KEY))
+        self.assertTrue(rule_index.banned('10.0.1.1'))
+
+
+class TestNotifier(ModelMixin, unittest.TestCase):
+
+    def _makeOne(self):
+        from fanboi2.models import Notifier, redis_conn
+        return Notifier(redis=redis_conn)
+
+    def test_subscribe(self):
+        notifier = self._makeOne()
+        with notifier.subscribe('foo') as subscription:
+            notifier.publish('foo', 1)
+            notifier.publish('bar', 2)
+            notifier.publish('foo', 'baz')
+            self.assertEqual(subscription.get(0), '1')
+            self.assertEqual(subscription.get(0), 'baz')
+            self.assertIsNone(subscription.get(0))
+
+    def test_wait(self):
+        notifier = self._makeOne()
+        checks = []
+
+        def _check(message):
+            checks.append(message)
+            if message is None:
+                notifier.publish('foo', 'bar')
+            return message
+
+        self.assertEqual(notifier.wait('foo', _check, 1), 'bar')
+        self.assertEqual(checks, [None, 'bar'])
+
+    def test_wait_timeout(self):
+        notifier = self._makeOne()
+        self.assertFalse(notifier.wait('foo', lambda m: False, 0.1))
+
+    def test_wait_limit(self):
+        import time
+        notifier = self._makeOne()
+        notifier.configure_wait_limit('1')
+        self.assertEqual(notifier.wait_limit, 1)
+        self.assertTrue(notifier.reserve())
+        self.assertFalse(notifier.reserve())
+        start = time.time()
+        self.assertEqual(notifier.wait('foo', lambda m: 'bar', 10), 'bar')
+        self.assertFalse(notifier.wait('foo', lambda m: False, 10))
+        self.assertLess(time.time() - start, 1)
+        notifier.release()
+        self.assertTrue(notifier.reserve())
+        notifier.release()
+
+    def test_wait_limit_default(self):
+        notifier = self._makeOne()
+        notifier.configure_wait_limit('')
+        self.assertEqual(notifier.wait_limit, notifier.DEFAULT_WAIT_LIMIT)
+
+    def test_publish_new_posts(self):
+        from fanboi2.models import Topic, notifier, topic_channel
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello')
+            topic_id = topic.id
+        with notifier.subscribe(topic_channel(topic_id)) as subscription:
+            with transaction.manager:
+                topic = DBSession.query(Topic).get(topic_id)
+                self._makePost(topic=topic, body='Hello')
+                self._makePost(topic=topic, body='World')
+            self.assertEqual(subscription.get(0), '2')
+            self.assertIsNone(subscription.get(0))
+
+    def test_publish_new_posts_rollback(self):
+        from fanboi2.models import Topic, notifier, topic_channel
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello')
+            topic_id = topic.id
+        with notifier.subscribe(topic_channel(topic_id)) as subscription:
+            transaction.begin()
+            topic = DBSession.query(Topic).get(topic_id)
+            self._makePost(topic=topic, body='Hello')
+            transaction.abort()
+            self.assertIsNone(subscription.get(0))
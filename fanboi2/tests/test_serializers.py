@@ -1,5 +1,6 @@
 import json
 import unittest
+import unittest.mock
 from pyramid import testing
 from fanboi2.tests import ModelMixin, RegistryMixin, TaskMixin, DummyAsyncResult
 
@@ -13,8 +14,14 @@ class TestJSONRenderer(RegistryMixin, unittest.TestCase):
     def _makeOne(self, object, request=None):
         if request is None:  # pragma: no cover
             request = testing.DummyRequest()
+        from fanboi2.serializers import initialize_renderer
         renderer = self._getTargetFunction()(None)
-        return json.loads(renderer(object, {'request': request}))
+        result = renderer(object, {'request': request})
+        pyramid_renderer = initialize_renderer('pyramid')(None)
+        self.assertEqual(
+            result,
+            pyramid_renderer(object, {'request': request}))
+        return json.loads(result)
 
     def test_datetime(self):
         from datetime import datetime, timezone
@@ -26,6 +33,22 @@ class TestJSONRenderer(RegistryMixin, unittest.TestCase):
             self._makeOne(date, request=request),
             '2013-01-02T07:04:01+07:00')
 
+    def test_datetime_timezone_once(self):
+        from datetime import datetime, timezone
+        from fanboi2 import serializers
+        request = self._makeRequest()
+        registry = self._makeRegistry(settings={'app.timezone': 'Asia/Bangkok'})
+        self._makeConfig(request, registry)
+        dates = [datetime(2013, 1, 2, 0, 4, i, 0, timezone.utc)
+                 for i in range(3)]
+        with unittest.mock.patch.object(
+                serializers,
+                '_timezone',
+                wraps=serializers._timezone) as timezone_:
+            result = self._makeOne(dates, request=request)
+        self.assertEqual(result[2], '2013-01-02T07:04:02+07:00')
+        self.assertEqual(timezone_.call_count, 1)
+
     def test_error_serializer(self):
         from fanboi2.errors import BaseError
         error = BaseError()
@@ -35,6 +58,94 @@ class TestJSONRenderer(RegistryMixin, unittest.TestCase):
         self.assertEqual(response['status'], error.name)
         self.assertEqual(response['message'], error.message(request))
 
+    def test_pyramid(self):
+        from pyramid.renderers import JSON
+        from fanboi2.serializers import initialize_renderer
+        self.assertIsInstance(initialize_renderer('pyramid'), JSON)
+
+    def test_fast(self):
+        from fanboi2.serializers import initialize_renderer, JSONRenderer
+        self.assertIsInstance(initialize_renderer('fast'), JSONRenderer)
+        self.assertIsInstance(initialize_renderer(''), JSONRenderer)
+
+    def test_unknown(self):
+        from fanboi2.serializers import initialize_renderer
+        with self.assertRaises(ValueError):
+            initialize_renderer('foobar')
+
+
+class TestJSONRendererClass(unittest.TestCase):
+
+    def _getTargetClass(self):
+        from fanboi2.serializers import JSONRenderer
+        return JSONRenderer
+
+    def _makeOne(self, *args, **kwargs):
+        return self._getTargetClass()(*args, **kwargs)
+
+    def test_render(self):
+        request = testing.DummyRequest()
+        renderer = self._makeOne()(None)
+        result = renderer({'a': [1, 'b', None]}, {'request': request})
+        self.assertEqual(result, '{"a": [1, "b", null]}')
+        self.assertEqual(request.response.content_type, 'application/json')
+
+    def test_render_content_type(self):
+        request = testing.DummyRequest()
+        request.response.content_type = 'text/plain'
+        renderer = self._makeOne()(None)
+        renderer({}, {'request': request})
+        self.assertEqual(request.response.content_type, 'text/plain')
+
+    def test_render_without_request(self):
+        renderer = self._makeOne()(None)
+        self.assertEqual(renderer([1, 2], {}), '[1, 2]')
+
+    def test_render_kw(self):
+        renderer = self._makeOne(sort_keys=True)(None)
+        self.assertEqual(renderer({'b': 1, 'a': 2}, {}), '{"a": 2, "b": 1}')
+
+    def test_adapter(self):
+        class Foo(object):
+            pass
+
+        class Bar(Foo):
+            pass
+
+        request = testing.DummyRequest()
+        requests = []
+
+        def _adapter(obj, request):
+            requests.append(request)
+            return obj.__class__.__name__
+
+        renderer = self._makeOne()
+        renderer.add_adapter(Foo, _adapter)
+        result = renderer(None)([Foo(), Bar()], {'request': request})
+        self.assertEqual(result, '["Foo", "Bar"]')
+        self.assertEqual(requests, [request, request])
+
+    def test_adapter_json(self):
+        class Foo(object):
+            def __json__(self, request):
+                return {'foo': 'bar'}
+
+        class Bar(Foo):
+            pass
+
+        renderer = self._makeOne()
+        self.assertEqual(renderer(None)(Foo(), {}), '{"foo": "bar"}')
+        renderer = self._makeOne()
+        renderer.add_adapter(Foo, lambda obj, request: 'adapted')
+        self.assertEqual(
+            renderer(None)([Foo(), Bar()], {}),
+            '["adapted", "adapted"]')
+
+    def test_adapter_missing(self):
+        renderer = self._makeOne()(None)
+        with self.assertRaises(TypeError):
+            renderer(object(), {})
+
 
 class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
 
@@ -45,8 +156,14 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
     def _makeOne(self, object, request=None):
         if request is None:  # pragma: no cover
             request = testing.DummyRequest()
+        from fanboi2.serializers import initialize_renderer
         renderer = self._getTargetFunction()(None)
-        return json.loads(renderer(object, {'request': request}))
+        result = renderer(object, {'request': request})
+        pyramid_renderer = initialize_renderer('pyramid')(None)
+        self.assertEqual(
+            result,
+            pyramid_renderer(object, {'request': request}))
+        return json.loads(result)
 
     def test_query(self):
         from fanboi2.models import DBSession
@@ -63,6 +180,19 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         self.assertEqual(response[0]['title'], board1.title)
         self.assertEqual(response[1]['title'], board2.title)
 
+    def test_pagination(self):
+        from fanboi2.utils import Pagination
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Lorem ipsum dolor sit')
+        request = self._makeRequest()
+        config = self._makeConfig(request, self._makeRegistry())
+        config.add_route('api_topic', '/topic/{topic}/')
+        response = self._makeOne(
+            Pagination([topic], 1, 'abc'),
+            request=request)
+        self.assertEqual(len(response), 1)
+        self.assertEqual(response[0]['id'], topic.id)
+
     def test_board(self):
         board = self._makeBoard(title='Foobar', slug='foo', status='open')
         request = self._makeRequest()
@@ -78,8 +208,24 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         self.assertIn('description', response)
         self.assertIn('id', response)
         self.assertIn('settings', response)
+        self.assertNotIn('post_limits', response['settings'])
+        self.assertNotIn('post_limit_policy', response['settings'])
         self.assertNotIn('topics', response)
 
+
+    def test_board_fields(self):
+        board = self._makeBoard(title='Foobar', slug='foo', status='open')
+        request = self._makeRequest(params={'fields[board]': 'title,slug'})
+        config = self._makeConfig(request, self._makeRegistry())
+        config.add_route('api_board', '/board/{board}/')
+        response = self._makeOne(board, request=request)
+        self.assertEqual(response, {
+            'type': 'board',
+            'id': board.id,
+            'title': 'Foobar',
+            'slug': 'foo',
+        })
+
     def test_board_with_topics(self):
         board = self._makeBoard(title='Foobar', slug='foo')
         topic = self._makeTopic(board=board, title='Heavenly Moon')
@@ -100,6 +246,40 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         response = self._makeOne(board, request=request)
         self.assertNotIn('topics', response)
 
+    def test_board_query_with_topics_posts(self):
+        from sqlalchemy import event
+        from fanboi2.models import DBSession, Board
+        for i in range(3):
+            board = self._makeBoard(title='Foo', slug='foo%s' % (i,))
+            for j in range(3):
+                topic = self._makeTopic(board=board, title='Bar')
+                self._makePost(topic=topic, body='Hello, world!')
+        DBSession.expire_all()
+        request = self._makeRequest(params={'topics': True, 'posts': True})
+        config = self._makeConfig(request, self._makeRegistry())
+        config.add_route('api_board', '/board/{board}/')
+        config.add_route('api_topic', '/topic/{topic}/')
+        config.add_route('api_topic_posts_scoped', '/topic/{topic}/{query}/')
+        renderer = self._getTargetFunction()(None)
+        queries = []
+
+        def _count(*args, **kwargs):
+            queries.append(args)
+
+        engine = DBSession.get_bind()
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            result = renderer(DBSession.query(Board), {'request': request})
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        self.assertEqual(len(queries), 3)
+        response = json.loads(result)
+        self.assertEqual(len(response), 3)
+        for board in response:
+            self.assertEqual(len(board['topics']), 3)
+            for topic in board['topics']:
+                self.assertEqual(len(topic['posts']), 1)
+
     def test_topic(self):
         board = self._makeBoard(title='Foobar', slug='foo')
         topic = self._makeTopic(board=board, title='Heavenly Moon')
@@ -118,6 +298,25 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         self.assertIn('status', response)
         self.assertNotIn('posts', response)
 
+
+    def test_topic_fields(self):
+        from sqlalchemy import inspect
+        from fanboi2.models import DBSession, Topic
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Heavenly Moon')
+        DBSession.flush()
+        DBSession.expire_all()
+        topic = DBSession.query(Topic).get(topic.id)
+        request = self._makeRequest(params={'fields[topic]': 'title'})
+        self._makeConfig(request, self._makeRegistry())
+        response = self._makeOne(topic, request=request)
+        self.assertEqual(response, {
+            'type': 'topic',
+            'id': topic.id,
+            'title': 'Heavenly Moon',
+        })
+        self.assertIn('meta', inspect(topic).unloaded)
+
     def test_topic_with_board(self):
         board = self._makeBoard(title='Foobar', slug='foo')
         topic = self._makeTopic(board=board, title='Heavenly Moon')
@@ -184,6 +383,36 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         self.assertIn('number', response)
         self.assertNotIn('ip_address', response)
 
+
+    @unittest.mock.patch('fanboi2.serializers.rendered_post')
+    def test_post_fields(self, rendered_post):
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Baz')
+        post = self._makePost(topic=topic, body='Hello, world!')
+        request = self._makeRequest(params={
+            'fields[post]': 'number, ident,body,foo',
+            'fields[topic]': 'title',
+        })
+        self._makeConfig(request, self._makeRegistry())
+        response = self._makeOne(post, request=request)
+        self.assertEqual(response, {
+            'type': 'post',
+            'id': post.id,
+            'body': 'Hello, world!',
+            'ident': post.ident,
+            'number': post.number,
+        })
+        self.assertFalse(rendered_post.called)
+
+    def test_post_fields_empty(self):
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Baz')
+        post = self._makePost(topic=topic, body='Hello, world!')
+        request = self._makeRequest(params={'fields[post]': ''})
+        self._makeConfig(request, self._makeRegistry())
+        response = self._makeOne(post, request=request)
+        self.assertEqual(response, {'type': 'post', 'id': post.id})
+
     def test_post_with_topic(self):
         board = self._makeBoard(title='Foobar', slug='foo')
         topic = self._makeTopic(board=board, title='Baz')
@@ -195,6 +424,25 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         response = self._makeOne(post, request=request)
         self.assertIn('topic', response)
 
+
+    def test_post_with_topic_fields(self):
+        board = self._makeBoard(title='Foobar', slug='foo')
+        topic = self._makeTopic(board=board, title='Baz')
+        post = self._makePost(topic=topic, body='Hello, world!')
+        request = self._makeRequest(params={
+            'topic': True,
+            'fields[post]': 'number',
+            'fields[topic]': 'title',
+        })
+        self._makeConfig(request, self._makeRegistry())
+        response = self._makeOne(post, request=request)
+        self.assertEqual(response['number'], post.number)
+        self.assertEqual(response['topic'], {
+            'type': 'topic',
+            'id': topic.id,
+            'title': 'Baz',
+        })
+
     def test_post_with_topic_board(self):
         board = self._makeBoard(title='Foobar', slug='foo')
         topic = self._makeTopic(board=board, title='Baz')
@@ -237,6 +485,20 @@ class TestJSONRendererWithModel(ModelMixin, RegistryMixin, unittest.TestCase):
         self.assertEqual(response['path'], '/page/test')
         self.assertIn('updated_at', response)
 
+    @unittest.mock.patch('fanboi2.serializers.rendered_page')
+    def test_page_fields(self, rendered_page):
+        page = self._makePage(title='Test', body='**Test**', slug='test')
+        request = self._makeRequest(params={'fields[page]': 'title,slug'})
+        self._makeConfig(request, self._makeRegistry())
+        response = self._makeOne(page, request=request)
+        self.assertEqual(response, {
+            'type': 'page',
+            'id': page.id,
+            'title': 'Test',
+            'slug': 'test',
+        })
+        self.assertFalse(rendered_page.called)
+
 
 class TestJSONRendererWithTask(
         TaskMixin,
@@ -251,8 +513,14 @@ class TestJSONRendererWithTask(
     def _makeOne(self, object, request=None):
         if request is None:  # pragma: no cover
             request = testing.DummyRequest()
+        from fanboi2.serializers import initialize_renderer
         renderer = self._getTargetFunction()(None)
-        return json.loads(renderer(object, {'request': request}))
+        result = renderer(object, {'request': request})
+        pyramid_renderer = initialize_renderer('pyramid')(None)
+        self.assertEqual(
+            result,
+            pyramid_renderer(object, {'request': request}))
+        return json.loads(result)
 
     def test_result_proxy(self):
         from fanboi2.tasks import ResultProxy
@@ -3,6 +3,7 @@ import unittest
 import unittest.mock
 from fanboi2.models import DBSession
 from fanboi2.tests import ModelMixin, TaskMixin, DummyAsyncResult
+from fanboi2.tests import RedisMixin
 
 
 class TestResultProxy(TaskMixin, ModelMixin, unittest.TestCase):
@@ -45,6 +46,119 @@ class TestResultProxy(TaskMixin, ModelMixin, unittest.TestCase):
         self.assertEqual(proxy.dummy(), "dummy")
 
 
+class TestCheckPost(unittest.TestCase):
+
+    def _getTargetFunction(self):
+        from fanboi2.tasks import _check_post
+        return _check_post
+
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('fanboi2.utils.Akismet.spam')
+    def test_check_post(self, akismet, dnsbl, proxy):
+        akismet.return_value = False
+        dnsbl.return_value = False
+        proxy.return_value = False
+        request = {'remote_addr': '127.0.0.1'}
+        self.assertIsNone(
+            self._getTargetFunction()(request, '127.0.0.1', 'Hi!'))
+        akismet.assert_called_with(request, 'Hi!')
+        dnsbl.assert_called_with('127.0.0.1')
+        proxy.assert_called_with('127.0.0.1')
+
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('fanboi2.utils.Akismet.spam')
+    def test_check_post_order(self, akismet, dnsbl, proxy):
+        akismet.return_value = False
+        dnsbl.return_value = True
+        proxy.return_value = True
+        request = {'remote_addr': '127.0.0.1'}
+        self.assertEqual(
+            self._getTargetFunction()(request, '127.0.0.1', 'Hi!'),
+            'dnsbl_rejected')
+
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('fanboi2.utils.Akismet.spam')
+    def test_check_post_concurrent(self, akismet, dnsbl, proxy):
+        import time
+        def _slow_check(*args):
+            time.sleep(0.3)
+            return False
+        akismet.side_effect = _slow_check
+        dnsbl.side_effect = _slow_check
+        proxy.side_effect = _slow_check
+        request = {'remote_addr': '127.0.0.1'}
+        started_at = time.time()
+        self.assertIsNone(
+            self._getTargetFunction()(request, '127.0.0.1', 'Hi!'))
+        self.assertLess(time.time() - started_at, 0.6)
+
+    @unittest.mock.patch('fanboi2.tasks.CHECK_TIMEOUT', 0.1)
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('fanboi2.utils.Akismet.spam')
+    def test_check_post_timeout(self, akismet, dnsbl, proxy):
+        import time
+        def _slow_check(*args):
+            time.sleep(0.3)
+            return True
+        akismet.side_effect = _slow_check
+        dnsbl.return_value = False
+        proxy.return_value = False
+        request = {'remote_addr': '127.0.0.1'}
+        self.assertIsNone(
+            self._getTargetFunction()(request, '127.0.0.1', 'Hi!'))
+
+    @unittest.mock.patch('fanboi2.tasks.CHECK_TIMEOUT', 0.1)
+    @unittest.mock.patch('fanboi2.utils.Akismet.fail_closed')
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('fanboi2.utils.Akismet.spam')
+    def test_check_post_timeout_fail_closed(
+            self, akismet, dnsbl, proxy, fail_closed):
+        import time
+        def _slow_check(*args):
+            time.sleep(0.3)
+            return False
+        akismet.side_effect = _slow_check
+        dnsbl.return_value = False
+        proxy.return_value = False
+        fail_closed.return_value = True
+        request = {'remote_addr': '127.0.0.1'}
+        self.assertEqual(
+            self._getTargetFunction()(request, '127.0.0.1', 'Hi!'),
+            'spam_rejected')
+
+    @unittest.mock.patch('fanboi2.utils.Akismet.fail_closed')
+    @unittest.mock.patch('fanboi2.utils.ProxyDetector.detect')
+    @unittest.mock.patch('fanboi2.utils.Dnsbl.listed')
+    @unittest.mock.patch('requests.Session.request')
+    def test_check_post_error_fail_closed(
+            self, api_call, dnsbl, proxy, fail_closed):
+        import requests
+        from fanboi2.models import redis_conn
+        from fanboi2.tests import DummyRedis
+        from fanboi2.utils import akismet
+        api_call.side_effect = requests.Timeout('connection timed out')
+        dnsbl.return_value = False
+        proxy.return_value = False
+        fail_closed.return_value = True
+        request = {
+            'remote_addr': '127.0.0.1',
+            'application_url': 'http://www.example.com',
+            'user_agent': 'TestBrowser/1.0',
+            'referrer': 'http://www.example.com/foo',
+            'url': 'http://www.example.com/foo/bar',
+        }
+        with unittest.mock.patch.object(akismet, 'key', 'hogehoge'), \
+                unittest.mock.patch.object(redis_conn, '_redis', DummyRedis()):
+            self.assertEqual(
+                self._getTargetFunction()(request, '127.0.0.1', 'Hi!'),
+                'spam_rejected')
+
+
 class TestAddTopicTask(TaskMixin, ModelMixin, unittest.TestCase):
 
     def _makeOne(self, *args, **kwargs):
@@ -65,6 +179,7 @@ class TestAddTopicTask(TaskMixin, ModelMixin, unittest.TestCase):
         self.assertEqual(DBSession.query(Topic).get(result.get()[1]), topic)
         self.assertEqual(topic.title, 'Foobar')
         self.assertEqual(topic.posts[0].body, 'Hello, world!')
+        self.assertEqual(topic.posts[0].render.body, '<p>Hello, world!</p>')
         self.assertEqual(result.result, ('topic', topic.id))
 
     def test_add_topic_overridden(self):
@@ -229,6 +344,17 @@ class TestAddTopicTask(TaskMixin, ModelMixin, unittest.TestCase):
             'status_rejected',
             'archived'))
 
+    @unittest.mock.patch('fanboi2.tasks._check_post')
+    def test_add_topic_ban_no_check(self, check_post):
+        request = {'remote_addr': '10.0.1.1'}
+        with transaction.manager:
+            self._makeRuleBan(ip_address='10.0.1.0/24')
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            board_id = board.id  # board is not bound outside transaction!
+        result = self._makeOne(request, board_id, 'Foobar', 'Hello, world!')
+        self.assertEqual(result.result, ('failure', 'ban_rejected'))
+        self.assertFalse(check_post.called)
+
     @unittest.mock.patch('fanboi2.utils.Akismet.spam')
     def test_add_topic_spam(self, akismet):
         from fanboi2.models import Topic
@@ -344,8 +470,41 @@ class TestAddPostTask(TaskMixin, ModelMixin, unittest.TestCase):
         self.assertEqual(DBSession.query(Post).get(result.get()[1]), post)
         self.assertEqual(post.body, 'Hi!')
         self.assertEqual(post.bumped, True)
+        self.assertEqual(post.render.body, '<p>Hi!</p>')
         self.assertEqual(result.result, ('post', post.id))
 
+    @unittest.mock.patch('fanboi2.tasks.render_post')
+    def test_add_post_render_failure(self, render_post):
+        import transaction
+        from fanboi2.models import Post
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        render_post.side_effect = ValueError('Formatter failed')
+        result = self._makeOne(request, topic_id, 'Hi!', True)
+        post = DBSession.query(Post).first()
+        self.assertTrue(result.successful())
+        self.assertEqual(result.result, ('post', post.id))
+        self.assertIsNone(post.render)
+        self.assertEqual(render_post.call_count, 1)
+
+    def test_add_post_notify(self):
+        import transaction
+        from fanboi2.models import notifier, task_channel
+        from fanboi2.tasks import add_post
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        with notifier.subscribe(task_channel('dummy')) as subscription:
+            add_post.apply_async(
+                (request, topic_id, 'Hi!', True),
+                task_id='dummy')
+            self.assertEqual(subscription.get(0), 'SUCCESS')
+
     def test_add_post_overridden(self):
         import transaction
         from fanboi2.models import Post
@@ -463,6 +622,24 @@ class TestAddPostTask(TaskMixin, ModelMixin, unittest.TestCase):
         self.assertEqual(post.bumped, True)
         self.assertEqual(result.result, ('post', post.id))
 
+    @unittest.mock.patch('fanboi2.tasks._check_post')
+    def test_add_post_locked_no_check(self, check_post):
+        import transaction
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(
+                board=board,
+                title='Hello, world!',
+                status='locked')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        result = self._makeOne(request, topic_id, 'Hi!', True)
+        self.assertEqual(result.result, (
+            'failure',
+            'status_rejected',
+            'locked'))
+        self.assertFalse(check_post.called)
+
     def test_add_post_locked(self):
         import transaction
         from fanboi2.models import Post
@@ -640,3 +817,237 @@ class TestAddPostTask(TaskMixin, ModelMixin, unittest.TestCase):
             result = self._makeOne(request, topic_id, 'Hi!', True)
         self.assertEqual(dbs.call_count, 5)
         self.assertFalse(result.successful())
+
+
+class TestAddPostBatchedTask(
+        RedisMixin,
+        TaskMixin,
+        ModelMixin,
+        unittest.TestCase):
+
+    def setUp(self):
+        from fanboi2.utils import post_queue
+        super(TestAddPostBatchedTask, self).setUp()
+        post_queue.configure_batch(10)
+
+    def tearDown(self):
+        from fanboi2.utils import post_queue
+        super(TestAddPostBatchedTask, self).tearDown()
+        post_queue.configure_batch(None)
+
+    def _makeOne(self, *args, **kwargs):
+        from fanboi2.tasks import add_post
+        return add_post.delay(*args, **kwargs)
+
+    def _queuePost(self, topic_id, task_id, body):
+        from fanboi2.utils import post_queue
+        post_queue.push(topic_id, {
+            'task_id': task_id,
+            'ip_address': '127.0.0.1',
+            'body': body,
+            'bumped': True,
+        })
+
+    def test_add_post(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        result = self._makeOne(request, topic_id, 'Hi!', True)
+        post = DBSession.query(Post).first()
+        self.assertTrue(result.successful())
+        self.assertEqual(DBSession.query(Post).count(), 1)
+        self.assertEqual(post.body, 'Hi!')
+        self.assertEqual(post.number, 1)
+        self.assertEqual(result.result, ('post', post.id))
+        self.assertEqual(post_queue.pending(topic_id), 0)
+
+    def test_add_post_drain(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.tasks import celery
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        self._queuePost(topic_id, 'task1', 'First!')
+        self._queuePost(topic_id, 'task2', 'Second!')
+        with unittest.mock.patch.object(celery, 'backend') as backend:
+            result = self._makeOne(request, topic_id, 'Third!', True)
+        posts = DBSession.query(Post).order_by(Post.number).all()
+        self.assertTrue(result.successful())
+        self.assertEqual(
+            [(p.number, p.body) for p in posts],
+            [(1, 'First!'), (2, 'Second!'), (3, 'Third!')])
+        self.assertEqual(result.result, ('post', posts[2].id))
+        backend.store_result.assert_any_call(
+            'task1', ('post', posts[0].id), 'SUCCESS')
+        backend.store_result.assert_any_call(
+            'task2', ('post', posts[1].id), 'SUCCESS')
+
+    def test_add_post_drain_locked(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        post_queue.acquire(topic_id)
+        result = self._makeOne(request, topic_id, 'Hi!', True)
+        self.assertEqual(result.state, 'IGNORED')
+        self.assertEqual(DBSession.query(Post).count(), 0)
+        self.assertEqual(post_queue.pending(topic_id), 1)
+
+    def test_add_post_drain_failure(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.tasks import celery
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        self._queuePost(topic_id, 'task1', 'First!')
+        post_queue.push(topic_id, {'task_id': 'task2'})
+        with unittest.mock.patch.object(celery, 'backend') as backend:
+            result = self._makeOne(request, topic_id, 'Third!', True)
+        posts = DBSession.query(Post).order_by(Post.number).all()
+        self.assertTrue(result.successful())
+        self.assertEqual(
+            [(p.number, p.body) for p in posts],
+            [(1, 'First!'), (2, 'Third!')])
+        self.assertEqual(result.result, ('post', posts[1].id))
+        backend.store_result.assert_called_once_with(
+            'task1', ('post', posts[0].id), 'SUCCESS')
+        self.assertEqual(backend.mark_as_failure.call_count, 1)
+        self.assertEqual(backend.mark_as_failure.call_args[0][0], 'task2')
+        self.assertEqual(post_queue.pending(topic_id), 0)
+        self.assertIsNotNone(post_queue.acquire(topic_id))
+
+    def test_add_post_drain_lock_lost(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        with unittest.mock.patch.object(post_queue, 'extend') as extend:
+            extend.return_value = False
+            result = self._makeOne(request, topic_id, 'Hi!', True)
+        self.assertTrue(result.successful())
+        self.assertEqual(DBSession.query(Post).count(), 1)
+        self.assertIsNone(post_queue.acquire(topic_id))
+
+    def test_add_post_drain_lock_lost_pending(self):
+        import transaction
+        from fanboi2.models import Post, redis_conn
+        from fanboi2.tasks import celery
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+
+        def _extend(topic_id, token):
+            if extend.call_count == 1:
+                self._queuePost(topic_id, 'task2', 'Second!')
+            redis_conn.delete(post_queue._lock_key(topic_id))
+            return False
+
+        with unittest.mock.patch.object(post_queue, 'extend') as extend, \
+                unittest.mock.patch.object(celery, 'backend') as backend:
+            extend.side_effect = _extend
+            result = self._makeOne(request, topic_id, 'First!', True)
+        posts = DBSession.query(Post).order_by(Post.number).all()
+        self.assertTrue(result.successful())
+        self.assertEqual(
+            [(p.number, p.body) for p in posts],
+            [(1, 'First!'), (2, 'Second!')])
+        backend.store_result.assert_called_once_with(
+            'task2', ('post', posts[1].id), 'SUCCESS')
+        self.assertEqual(post_queue.pending(topic_id), 0)
+
+    def test_add_post_drain_processing(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.tasks import celery
+        from fanboi2.utils import post_queue
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        self._queuePost(topic_id, 'task1', 'First!')
+        post_queue.pop(topic_id)  # Worker died while inserting.
+        with unittest.mock.patch.object(celery, 'backend') as backend:
+            result = self._makeOne(request, topic_id, 'Second!', True)
+        posts = DBSession.query(Post).order_by(Post.number).all()
+        self.assertTrue(result.successful())
+        self.assertEqual(
+            [(p.number, p.body) for p in posts],
+            [(1, 'First!'), (2, 'Second!')])
+        self.assertEqual(result.result, ('post', posts[1].id))
+        backend.store_result.assert_called_once_with(
+            'task1', ('post', posts[0].id), 'SUCCESS')
+        self.assertEqual(post_queue.processing(topic_id), [])
+
+    def test_recover_posts(self):
+        import transaction
+        from fanboi2.models import Post
+        from fanboi2.tasks import celery, recover_posts
+        from fanboi2.utils import post_queue
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic1 = self._makeTopic(board=board, title='Hello, world!')
+            topic2 = self._makeTopic(board=board, title='Hello, again!')
+            topic1_id = topic1.id  # topic is not bound outside transaction!
+            topic2_id = topic2.id
+        self._queuePost(topic1_id, 'task1', 'First!')
+        self._queuePost(topic1_id, 'task2', 'Second!')
+        self._queuePost(topic2_id, 'task3', 'Third!')
+        post_queue.pop(topic1_id)  # Worker died while inserting.
+        post_queue.pop(topic2_id)
+        post_queue.acquire(topic2_id)  # Another worker is draining.
+        with unittest.mock.patch.object(celery, 'backend') as backend:
+            recover_posts.delay()
+        posts = DBSession.query(Post).order_by(Post.number).all()
+        self.assertEqual(
+            [(p.topic_id, p.number, p.body) for p in posts],
+            [(topic1_id, 1, 'First!'), (topic1_id, 2, 'Second!')])
+        self.assertEqual(backend.store_result.call_count, 2)
+        self.assertEqual(post_queue.stale_topics(), [topic2_id])
+
+    def test_add_post_drain_max_posts(self):
+        import transaction
+        from fanboi2.models import Post, Topic
+        from fanboi2.tasks import celery
+        request = {'remote_addr': '127.0.0.1'}
+        with transaction.manager:
+            board = self._makeBoard(
+                title='Foobar',
+                slug='foobar',
+                settings={'max_posts': 2})
+            topic = self._makeTopic(board=board, title='Hello, world!')
+            topic_id = topic.id  # topic is not bound outside transaction!
+        self._queuePost(topic_id, 'task1', 'First!')
+        self._queuePost(topic_id, 'task2', 'Second!')
+        with unittest.mock.patch.object(celery, 'backend'):
+            result = self._makeOne(request, topic_id, 'Third!', True)
+        self.assertTrue(result.successful())
+        self.assertEqual(DBSession.query(Post).count(), 2)
+        self.assertEqual(DBSession.query(Topic).get(topic_id).status, 'archived')
+        self.assertEqual(result.result, (
+            'failure',
+            'status_rejected',
+            'archived'))
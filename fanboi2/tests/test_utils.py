@@ -1,7 +1,8 @@
 import unittest
 import unittest.mock
 from fanboi2.models import redis_conn
-from fanboi2.tests import DummyRedis, RegistryMixin, CacheMixin
+from fanboi2.tests import DummyRedis, RegistryMixin, CacheMixin, ModelMixin
+from fanboi2.tests import RedisMixin
 from pyramid import testing
 
 
@@ -34,14 +35,343 @@ class TestRequestSerializer(unittest.TestCase):
         self.assertEqual(self._getTargetFunction()(request), request)
 
 
-class TestDnsBl(unittest.TestCase):
+class TestCursor(unittest.TestCase):
+
+    def test_encode_decode(self):
+        from datetime import datetime, timezone
+        from fanboi2.utils import encode_cursor, decode_cursor
+        timestamp = datetime(2016, 10, 25, 11, 52, 14, 806880, timezone.utc)
+        cursor = encode_cursor(timestamp, 123)
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), (timestamp, 123))
+
+    def test_decode_invalid(self):
+        from fanboi2.utils import decode_cursor
+        for cursor in ('', 'invalid', '!!!', 'MTIz'):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_decode_out_of_range(self):
+        from base64 import urlsafe_b64encode
+        from fanboi2.utils import decode_cursor
+        for value in (b'999999999999999999999:1',
+                      b'-999999999999999999999:1',
+                      b'0:99999999999999999999',
+                      b'0:2147483648',
+                      b'0:0',
+                      b'0:-1'):
+            cursor = urlsafe_b64encode(value).decode('utf8')
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class TestPageCache(unittest.TestCase):
+
+    def _makeOne(self, max_size=256):
+        from fanboi2.utils import PageCache
+        return PageCache(max_size=max_size)
+
+    def test_get_set(self):
+        page_cache = self._makeOne()
+        self.assertIsNone(page_cache.get(1, 1))
+        page_cache.set(1, 1, 'foo')
+        page_cache.set(1, 2, 'bar')
+        self.assertEqual(page_cache.get(1, 1), 'foo')
+        self.assertEqual(page_cache.get(1, 2), 'bar')
+        self.assertIsNone(page_cache.get(2, 1))
+
+    def test_evict(self):
+        page_cache = self._makeOne(max_size=2)
+        page_cache.set(1, 1, 'foo')
+        page_cache.set(2, 1, 'bar')
+        page_cache.get(1, 1)
+        page_cache.set(3, 1, 'baz')
+        self.assertEqual(page_cache.get(1, 1), 'foo')
+        self.assertIsNone(page_cache.get(2, 1))
+        self.assertEqual(page_cache.get(3, 1), 'baz')
+
+    def test_clear(self):
+        page_cache = self._makeOne()
+        page_cache.set(1, 1, 'foo')
+        page_cache.clear()
+        self.assertIsNone(page_cache.get(1, 1))
+
+
+class TestEmbedLoader(ModelMixin, unittest.TestCase):
+
+    def _makeOne(self):
+        from fanboi2.utils import EmbedLoader
+        return EmbedLoader()
+
+    def _countQueries(self, fn):
+        from sqlalchemy import event
+        from fanboi2.models import DBSession
+        queries = []
+
+        def _count(*args, **kwargs):
+            queries.append(args)
+
+        engine = DBSession.get_bind()
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            fn()
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        return len(queries)
+
+    def _makeTopics(self, board, count):
+        from datetime import datetime, timedelta, timezone
+        from fanboi2.models import DBSession
+        now = datetime(2016, 1, 1, tzinfo=timezone.utc)
+        topics = []
+        for i in range(count):
+            topic = self._makeTopic(board=board, title='Topic %s' % (i,))
+            topic.meta.bumped_at = now - timedelta(hours=(i * 7) % count)
+            topics.append(topic)
+        DBSession.flush()
+        return topics
+
+    def test_load_recent_topics(self):
+        from fanboi2.utils import load_recent_topics
+        board1 = self._makeBoard(title='Foo', slug='foo')
+        board2 = self._makeBoard(title='Bar', slug='bar')
+        board3 = self._makeBoard(title='Baz', slug='baz')
+        self._makeTopics(board1, 5)
+        self._makeTopics(board2, 2)
+        recent_topics = {}
+
+        def _load():
+            recent_topics.update(load_recent_topics(
+                [board1.id, board2.id, board3.id],
+                3))
+
+        self.assertEqual(self._countQueries(_load), 1)
+        self.assertEqual(recent_topics, {
+            board1.id: list(board1.topics.limit(3)),
+            board2.id: list(board2.topics.limit(3)),
+            board3.id: [],
+        })
+        self.assertEqual(load_recent_topics([], 3), {})
 
-    def _makeOne(self, providers=None):
+    def test_load_recent_topics_single(self):
+        from fanboi2.utils import load_recent_topics
+        board = self._makeBoard(title='Foo', slug='foo')
+        self._makeTopics(board, 5)
+        self.assertEqual(
+            load_recent_topics([board.id], 2),
+            {board.id: list(board.topics.limit(2))})
+
+    def test_load_recent_posts(self):
+        from fanboi2.utils import load_recent_posts
+        board = self._makeBoard(title='Foo', slug='foo')
+        topic1 = self._makeTopic(board=board, title='Foo')
+        topic2 = self._makeTopic(board=board, title='Bar')
+        posts = [self._makePost(topic=topic1, body='Foo') for _ in range(4)]
+        self.assertEqual(load_recent_posts([topic1.id, topic2.id], 2), {
+            topic1.id: posts[2:],
+            topic2.id: [],
+        })
+
+    def test_load_recent_posts_deleted(self):
+        from fanboi2.models import DBSession
+        from fanboi2.utils import load_recent_posts
+        board = self._makeBoard(title='Foo', slug='foo')
+        topic = self._makeTopic(board=board, title='Foo')
+        posts = [self._makePost(topic=topic, body='Foo') for _ in range(4)]
+        DBSession.delete(posts[3])
+        DBSession.flush()
+        self.assertEqual(
+            load_recent_posts([topic.id], 2),
+            {topic.id: posts[2:3]})
+
+    def test_load(self):
+        boards = [
+            self._makeBoard(title='Board %s' % (i,), slug='board%s' % (i,))
+            for i in range(3)]
+        topics = []
+        for board in boards:
+            topics.extend(self._makeTopics(board, 3))
+        for topic in topics:
+            self._makePost(topic=topic, body='Foo')
+            self._makePost(topic=topic, body='Bar')
+        embed_loader = self._makeOne()
+        embed_loader.prime(boards)
+        results = {}
+
+        def _load():
+            for board in boards:
+                results[board] = embed_loader.load('topics', board)
+                for topic in results[board]:
+                    results[topic] = embed_loader.load('posts', topic)
+
+        self.assertEqual(self._countQueries(_load), 2)
+        for board in boards:
+            self.assertEqual(results[board], list(board.topics.limit(10)))
+        for topic in topics:
+            self.assertEqual(results[topic], topic.recent_posts())
+
+    def test_load_unprimed(self):
+        board = self._makeBoard(title='Foo', slug='foo')
+        topic = self._makeTopic(board=board, title='Foo')
+        post = self._makePost(topic=topic, body='Foo')
+        embed_loader = self._makeOne()
+        self.assertEqual(embed_loader.load('posts', topic), [post])
+        self.assertEqual(embed_loader.load('topics', board), [topic])
+
+    def test_load_many_to_one(self):
+        from fanboi2.models import DBSession
+        board1 = self._makeBoard(title='Foo', slug='foo')
+        board2 = self._makeBoard(title='Bar', slug='bar')
+        topic1 = self._makeTopic(board=board1, title='Foo')
+        topic2 = self._makeTopic(board=board2, title='Bar')
+        embed_loader = self._makeOne()
+        embed_loader.prime([topic1, topic2])
+        DBSession.expunge(board1)
+        DBSession.expunge(board2)
+        results = []
+
+        def _load():
+            results.append(embed_loader.load('board', topic1))
+            results.append(embed_loader.load('board', topic2))
+
+        self.assertEqual(self._countQueries(_load), 1)
+        self.assertEqual([b.slug for b in results], ['foo', 'bar'])
+
+    def test_load_many_to_one_identity(self):
+        board = self._makeBoard(title='Foo', slug='foo')
+        topic = self._makeTopic(board=board, title='Foo')
+        post = self._makePost(topic=topic, body='Foo')
+        embed_loader = self._makeOne()
+        results = []
+
+        def _load():
+            results.append(embed_loader.load('topic', post))
+
+        self.assertEqual(self._countQueries(_load), 0)
+        self.assertEqual(results, [topic])
+
+
+class TestRouteTemplates(RegistryMixin, unittest.TestCase):
+
+    def _makeOne(self, request):
+        from fanboi2.utils import RouteTemplates
+        return RouteTemplates(request)
+
+    def test_path(self):
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route(
+            'topic_scoped',
+            r'/{board:\w+}/{topic:\d+}/{query}/')
+        config.add_route('page', '/pages/{page:.*}/')
+        config.commit()
+        templates = self._makeOne(request)
+        tests = (
+            ('topic_scoped', {'board': 'foo', 'topic': 1, 'query': '1-5'}),
+            ('topic_scoped', {'board': 'f o', 'topic': '2', 'query': 'l5'}),
+            ('topic_scoped', {'board': 'ฟู', 'topic': 3, 'query': '%s'}),
+            ('page', {'page': 'foo/bar'}),
+            ('page', {'page': '100%'}),
+            ('page', {'page': ':@&+$,'}),
+            ('page', {'page': 'a:b@c&d+e$f,g;h=i?j#k'}),
+            ('topic_scoped', {'board': 'f:@', 'topic': 4, 'query': '&+$,'}),
+        )
+        for name, kwargs in tests:
+            self.assertEqual(
+                templates.path(name, **kwargs),
+                request.route_path(name, **kwargs))
+
+    def test_path_reserved_pattern(self):
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('reserved', '/a:b@c&d+e$f,g/{slug}/')
+        config.commit()
+        templates = self._makeOne(request)
+        self.assertEqual(
+            templates.path('reserved', slug=':@&+$,'),
+            request.route_path('reserved', slug=':@&+$,'))
+
+    def test_path_script_name(self):
+        request = self._makeRequest()
+        request.script_name = '/app%'
+        config = self._makeConfig(request)
+        config.add_route('board', '/{board}/')
+        config.commit()
+        templates = self._makeOne(request)
+        self.assertEqual(templates.path('board', board='foo'), '/app%/foo/')
+
+    def test_path_missing(self):
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('board', '/{board}/')
+        config.commit()
+        templates = self._makeOne(request)
+        with self.assertRaises(KeyError):
+            templates.path('board')
+        with self.assertRaises(KeyError):
+            templates.path('foobar', board='foo')
+
+    def test_template(self):
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route('topic_scoped', '/{board}/{topic}/{query}/')
+        config.commit()
+        templates = self._makeOne(request)
+        template = templates.template('topic_scoped', board='f%', topic=1)
+        self.assertEqual(template.names, ('query',))
+        self.assertEqual(template(query='1-'), '/f%25/1/1-/')
+        self.assertEqual(template(query='%s'), '/f%25/1/%25s/')
+        self.assertIs(
+            templates.template('topic_scoped', topic=1, board='f%'),
+            template)
+
+    def test_template_pregenerator(self):
+        request = self._makeRequest()
+        config = self._makeConfig(request)
+        config.add_route(
+            'board',
+            '/{board}/',
+            pregenerator=lambda r, e, kw: (e, dict(kw, board=kw['board'] * 2)),
+        )
+        config.add_route('static', '/static/*subpath')
+        config.commit()
+        templates = self._makeOne(request)
+        self.assertEqual(
+            templates.template('board', board='foo')(),
+            '/foofoo/')
+        self.assertEqual(
+            templates.template('static')(subpath='foo/bar.css'),
+            '/static/foo/bar.css')
+
+
+class TestDnsBl(CacheMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+
+    def _makeServer(self, **kwargs):
+        from fanboi2.tests import DummyDnsServer
+        self.server = DummyDnsServer(**kwargs)
+        self.server.start()
+        return self.server
+
+    def _makeOne(self, providers=None, server=None, region=None, timeout=2):
         from fanboi2.utils import Dnsbl
         if providers is None:
             providers = ['xbl.spamhaus.org']
-        dnsbl = Dnsbl()
+        if region is None:
+            region = self._getRegion()
+        dnsbl = Dnsbl(cache_region=region)
         dnsbl.configure_providers(providers)
+        if server is not None:
+            dnsbl.configure_resolver(
+                nameservers=['127.0.0.1'],
+                port=server.port,
+                timeout=timeout)
         return dnsbl
 
     def test_init(self):
@@ -56,32 +386,113 @@ class TestDnsBl(unittest.TestCase):
         dnsbl = self._makeOne(providers='xbl.spamhaus.org tor.ahbl.org')
         self.assertEqual(dnsbl.providers, ['xbl.spamhaus.org', 'tor.ahbl.org'])
 
-    @unittest.mock.patch('socket.gethostbyname')
-    def test_listed(self, lookup_call):
-        lookup_call.return_value = '127.0.0.2'
+    def test_configure_resolver(self):
         dnsbl = self._makeOne()
-        self.assertEqual(dnsbl.listed('10.0.100.254'), True)
-        lookup_call.assert_called_with('254.100.0.10.xbl.spamhaus.org.')
+        dnsbl.configure_resolver('127.0.0.1 127.0.0.2', timeout='1.5')
+        self.assertEqual(dnsbl.resolver.nameservers, ['127.0.0.1', '127.0.0.2'])
+        self.assertEqual(dnsbl.resolver.timeout, 1.5)
+        self.assertEqual(dnsbl.resolver.lifetime, 1.5)
 
-    @unittest.mock.patch('socket.gethostbyname')
-    def test_listed_unlisted(self, lookup_call):
-        import socket
-        lookup_call.side_effect = socket.gaierror('foobar')
+    def test_configure_resolver_empty(self):
         dnsbl = self._makeOne()
-        self.assertEqual(dnsbl.listed('10.0.100.1'), False)
-        lookup_call.assert_called_with('1.100.0.10.xbl.spamhaus.org.')
+        dnsbl.configure_resolver([], timeout='')
+        self.assertIsNone(dnsbl.nameservers)
+        self.assertEqual(dnsbl.timeout, 2)
 
-    @unittest.mock.patch('socket.gethostbyname')
-    def test_listed_invalid(self, lookup_call):
-        lookup_call.return_value = '192.168.1.1'
+    def test_executor(self):
         dnsbl = self._makeOne()
+        executor = dnsbl.executor
+        self.assertIs(dnsbl.executor, executor)
+        with unittest.mock.patch('os.getpid') as getpid:
+            getpid.return_value = -1
+            self.assertIsNot(dnsbl.executor, executor)
+
+    def test_listed(self):
+        server = self._makeServer(records={
+            '254.100.0.10.xbl.spamhaus.org.': '127.0.0.2',
+        })
+        dnsbl = self._makeOne(server=server)
+        self.assertEqual(dnsbl.listed('10.0.100.254'), True)
+        self.assertEqual(server.queries, ['254.100.0.10.xbl.spamhaus.org.'])
+
+    def test_listed_ipv6(self):
+        query = '.'.join(reversed('20010db8000000000000000000000001'))
+        server = self._makeServer(records={
+            '%s.xbl.spamhaus.org.' % (query,): '127.0.0.2',
+        })
+        dnsbl = self._makeOne(server=server)
+        self.assertEqual(dnsbl.listed('2001:db8::1'), True)
+        self.assertEqual(server.queries, ['%s.xbl.spamhaus.org.' % (query,)])
+
+    def test_listed_unlisted(self):
+        server = self._makeServer()
+        dnsbl = self._makeOne(server=server)
+        self.assertEqual(dnsbl.listed('10.0.100.1'), False)
+        self.assertEqual(server.queries, ['1.100.0.10.xbl.spamhaus.org.'])
+
+    def test_listed_invalid(self):
+        server = self._makeServer(records={
+            '2.100.0.10.xbl.spamhaus.org.': '192.168.1.1',
+        })
+        dnsbl = self._makeOne(server=server)
         self.assertEqual(dnsbl.listed('10.0.100.2'), False)
 
-    @unittest.mock.patch('socket.gethostbyname')
-    def test_listed_malformed(self, lookup_call):
-        lookup_call.return_value = 'foobarbaz'
-        dnsbl = self._makeOne()
+    def test_listed_malformed(self):
+        server = self._makeServer()
+        dnsbl = self._makeOne(server=server)
+        self.assertEqual(dnsbl.listed('foobarbaz'), False)
+        self.assertEqual(server.queries, [])
+
+    def test_listed_parallel(self):
+        server = self._makeServer(
+            records={'2.100.0.10.b.example.com.': '127.0.0.2'},
+            held={'2.100.0.10.b.example.com.': '2.100.0.10.a.example.com.'})
+        dnsbl = self._makeOne(
+            providers=['a.example.com', 'b.example.com'],
+            server=server)
+        self.assertEqual(dnsbl.listed('10.0.100.2'), True)
+        self.assertIn('2.100.0.10.a.example.com.', server.queries)
+        self.assertIn('2.100.0.10.b.example.com.', server.queries)
+
+    def test_listed_timeout(self):
+        import time
+        server = self._makeServer(
+            records={'2.100.0.10.xbl.spamhaus.org.': '127.0.0.2'},
+            delayed=['2.100.0.10.xbl.spamhaus.org.'],
+            delay=0.5)
+        dnsbl = self._makeOne(server=server, timeout=0.1)
+        started_at = time.time()
         self.assertEqual(dnsbl.listed('10.0.100.2'), False)
+        self.assertLess(time.time() - started_at, 0.5)
+
+    def test_listed_cached(self):
+        store = {}
+        region = self._getRegion(store)
+        server = self._makeServer(records={
+            '2.100.0.10.xbl.spamhaus.org.': '127.0.0.2',
+        })
+        dnsbl = self._makeOne(server=server, region=region)
+        self.assertEqual(dnsbl.listed('10.0.100.2'), True)
+        self.assertEqual(dnsbl.listed('10.0.100.2'), True)
+        self.assertEqual(dnsbl.listed('10.0.100.3'), False)
+        self.assertEqual(dnsbl.listed('10.0.100.3'), False)
+        self.assertEqual(server.queries, [
+            '2.100.0.10.xbl.spamhaus.org.',
+            '3.100.0.10.xbl.spamhaus.org.',
+        ])
+
+    def test_listed_cached_expire(self):
+        store = {}
+        region = self._getRegion(store)
+        server = self._makeServer()
+        dnsbl = self._makeOne(server=server, region=region)
+        dnsbl.unlisted_expire = -1
+        self.assertEqual(dnsbl.listed('10.0.100.3'), False)
+        self.assertEqual(dnsbl.listed('10.0.100.3'), False)
+        self.assertEqual(server.queries, [
+            '3.100.0.10.xbl.spamhaus.org.',
+            '3.100.0.10.xbl.spamhaus.org.',
+        ])
 
 
 class TestGeoIP(unittest.TestCase):
@@ -166,6 +577,55 @@ class TestGeoIP(unittest.TestCase):
         geoip.configure_geoip2('/tmp/some/path')
         self.assertIsNone(geoip.country_code('127.0.0.1'))
 
+    @unittest.mock.patch('geoip2.database.Reader')
+    def test_init_mmap(self, reader):
+        from maxminddb import MODE_MMAP
+        reader.return_value = self._makeGeoIP2()
+        geoip = self._makeOne()
+        geoip.configure_geoip2('/tmp/some/path')
+        reader.assert_called_with('/tmp/some/path', mode=MODE_MMAP)
+
+    @unittest.mock.patch('geoip2.database.Reader')
+    def test_country_code_cached(self, reader):
+        geoip2 = self._makeGeoIP2(country_code='TH')
+        geoip2.country = unittest.mock.Mock(wraps=geoip2.country)
+        reader.return_value = geoip2
+        geoip = self._makeOne()
+        geoip.cache_size = 2
+        geoip.configure_geoip2('/tmp/some/path')
+        self.assertEqual(geoip.country_code('127.0.0.1'), 'TH')
+        self.assertEqual(geoip.country_code('127.0.0.1'), 'TH')
+        self.assertEqual(geoip2.country.call_count, 1)
+        geoip.country_code('127.0.0.2')
+        geoip.country_code('127.0.0.1')
+        geoip.country_code('127.0.0.3')
+        self.assertEqual(list(geoip._cache.keys()), [
+            '127.0.0.1',
+            '127.0.0.3',
+        ])
+
+    @unittest.mock.patch('geoip2.database.Reader')
+    def test_reload(self, reader):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'GeoLite2-Country.mmdb')
+            with open(path, 'wb') as f:
+                f.write(b'foo')
+            reader.return_value = self._makeGeoIP2(country_code='TH')
+            geoip = self._makeOne()
+            geoip.reload_interval = 0
+            geoip.configure_geoip2(path)
+            self.assertEqual(geoip.country_code('127.0.0.1'), 'TH')
+            self.assertFalse(geoip.reload())
+            new_path = os.path.join(tmpdir, 'GeoLite2-Country.mmdb.new')
+            with open(new_path, 'wb') as f:
+                f.write(b'foobar')
+            os.rename(new_path, path)
+            reader.return_value = self._makeGeoIP2(country_code='JP')
+            self.assertEqual(geoip.country_code('127.0.0.1'), 'JP')
+            self.assertEqual(reader.call_count, 2)
+
 
 class TestChecklist(unittest.TestCase):
 
@@ -228,8 +688,264 @@ class TestChecklist(unittest.TestCase):
         self.assertTrue(checklist.enabled('scope3', 'baz'))
 
 
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        redis_conn._redis = DummyRedis()
+
+    def tearDown(self):
+        redis_conn._redis = None
+
+    def _makeOne(self):
+        from fanboi2.utils import CircuitBreaker
+        return CircuitBreaker()
+
+    def _record(self, breaker, state, failed):
+        breaker.record(
+            'akismet',
+            state,
+            failed,
+            threshold=3,
+            window=60,
+            reset=30)
+
+    def test_allow(self):
+        breaker = self._makeOne()
+        self.assertEqual(breaker.allow('akismet'), 'closed')
+        self.assertEqual(breaker.state('akismet'), 'closed')
+
+    def test_record_success(self):
+        breaker = self._makeOne()
+        self._record(breaker, 'closed', False)
+        self.assertEqual(redis_conn._redis._store, {})
+
+    def test_record_failure(self):
+        breaker = self._makeOne()
+        self._record(breaker, 'closed', True)
+        self._record(breaker, 'closed', True)
+        self.assertEqual(breaker.state('akismet'), 'closed')
+        self.assertEqual(redis_conn.get('circuit:akismet:failures'), b'2')
+        self.assertEqual(redis_conn.ttl('circuit:akismet:failures'), 60)
+        self._record(breaker, 'closed', True)
+        self.assertEqual(breaker.state('akismet'), 'open')
+        self.assertEqual(redis_conn.ttl('circuit:akismet:open'), 30)
+        self.assertEqual(redis_conn.ttl('circuit:akismet:half_open'), 90)
+        self.assertIsNone(redis_conn.get('circuit:akismet:failures'))
+        self.assertIsNone(breaker.allow('akismet'))
+
+    def test_allow_half_open(self):
+        breaker = self._makeOne()
+        redis_conn.set('circuit:akismet:half_open', 1)
+        self.assertEqual(breaker.state('akismet'), 'half_open')
+        self.assertEqual(breaker.allow('akismet'), 'probe')
+        self.assertIsNone(breaker.allow('akismet'))
+
+    def test_record_probe_success(self):
+        breaker = self._makeOne()
+        redis_conn.set('circuit:akismet:half_open', 1)
+        self._record(breaker, breaker.allow('akismet'), False)
+        self.assertEqual(breaker.state('akismet'), 'closed')
+        self.assertEqual(breaker.allow('akismet'), 'closed')
+        self.assertIsNone(redis_conn.get('circuit:akismet:probe'))
+
+    def test_record_probe_failure(self):
+        breaker = self._makeOne()
+        redis_conn.set('circuit:akismet:half_open', 1)
+        self._record(breaker, breaker.allow('akismet'), True)
+        self.assertEqual(breaker.state('akismet'), 'open')
+        self.assertIsNone(redis_conn.get('circuit:akismet:probe'))
+
+
+class TestCircuitBreakerRedis(RedisMixin, unittest.TestCase):
+
+    def _makeOne(self):
+        from fanboi2.utils import CircuitBreaker
+        return CircuitBreaker()
+
+    def test_record_failure_expire(self):
+        breaker = self._makeOne()
+        for i in range(2):
+            breaker.record(
+                'akismet',
+                'closed',
+                True,
+                threshold=3,
+                window=60,
+                reset=30)
+            self.assertEqual(
+                redis_conn.get('circuit:akismet:failures'),
+                str(i + 1).encode('utf-8'))
+            ttl = redis_conn.ttl('circuit:akismet:failures')
+            self.assertGreater(ttl, 0)
+            self.assertLessEqual(ttl, 60)
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        redis_conn._redis = DummyRedis()
+
+    def tearDown(self):
+        redis_conn._redis = None
+
+    def _makeOne(self, settings=None, key=None):
+        from fanboi2.utils import HttpClient
+        http_client = HttpClient()
+        if settings is not None:
+            http_client.configure_from_config(settings, key)
+        return http_client
+
+    def _makeResponse(self, status_code):
+        class MockResponse(object):
+
+            def __init__(self, status_code):
+                self.status_code = status_code
+
+        return MockResponse(status_code)
+
+    def test_init(self):
+        http_client = self._makeOne()
+        self.assertIsNone(http_client.timeout)
+        self.assertEqual(http_client.retries, 0)
+        self.assertEqual(http_client.pool_size, 10)
+
+    def test_configure(self):
+        http_client = self._makeOne({
+            'http.timeout': '3',
+            'http.retries': '',
+            'http.pool_size': '20',
+            'http.akismet.timeout': '1.5',
+            'http.akismet.retries': '2',
+        }, 'http.')
+        self.assertEqual(http_client.timeout, 3.0)
+        self.assertEqual(http_client.retries, 0)
+        self.assertEqual(http_client.pool_size, 20)
+        self.assertEqual(http_client.providers, {
+            'akismet': {'timeout': '1.5', 'retries': '2'},
+        })
+        session = http_client.session('akismet')
+        adapter = session.get_adapter('https://www.example.com/')
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_session(self):
+        http_client = self._makeOne()
+        session = http_client.session('akismet')
+        self.assertIs(http_client.session('akismet'), session)
+        self.assertIsNot(http_client.session('blackbox'), session)
+        self.assertIn('Fanboi2/', session.headers['User-Agent'])
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_request(self, api_call):
+        api_call.return_value = response = self._makeResponse(200)
+        http_client = self._makeOne({'akismet.timeout': '1'})
+        self.assertEqual(
+            http_client.get('akismet', 'http://www.example.com/', timeout=5),
+            response)
+        api_call.assert_called_with(
+            'GET',
+            'http://www.example.com/',
+            timeout=1.0)
+        http_client.post('blackbox', 'http://www.example.com/', timeout=5)
+        api_call.assert_called_with(
+            'POST',
+            'http://www.example.com/',
+            timeout=5)
+        stats = http_client.stats('akismet')
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['timeouts'], 0)
+        self.assertIn('blackbox', http_client.stats())
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_request_timeout(self, api_call):
+        api_call.return_value = self._makeResponse(200)
+        http_client = self._makeOne({'timeout': '3', 'akismet.timeout': '4'})
+        http_client.get('blackbox', 'http://www.example.com/', timeout=1)
+        self.assertEqual(api_call.call_args[1]['timeout'], 1)
+        http_client.get('blackbox', 'http://www.example.com/', timeout=5)
+        self.assertEqual(api_call.call_args[1]['timeout'], 3.0)
+        http_client.get('blackbox', 'http://www.example.com/')
+        self.assertEqual(api_call.call_args[1]['timeout'], 3.0)
+        http_client.get('akismet', 'http://www.example.com/', timeout=5)
+        self.assertEqual(api_call.call_args[1]['timeout'], 4.0)
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_request_error(self, api_call):
+        import requests
+        http_client = self._makeOne()
+        api_call.return_value = self._makeResponse(500)
+        http_client.get('akismet', 'http://www.example.com/')
+        api_call.side_effect = requests.Timeout('connection timed out')
+        with self.assertRaises(requests.Timeout):
+            http_client.get('akismet', 'http://www.example.com/')
+        api_call.side_effect = requests.ConnectionError('connection refused')
+        with self.assertRaises(requests.ConnectionError):
+            http_client.get('akismet', 'http://www.example.com/')
+        stats = http_client.stats('akismet')
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['errors'], 3)
+        self.assertEqual(stats['timeouts'], 1)
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_request_circuit_open(self, api_call):
+        from fanboi2.utils import CircuitOpenError
+        api_call.return_value = self._makeResponse(503)
+        http_client = self._makeOne({
+            'circuit_threshold': '2',
+            'akismet.circuit_fail': 'closed',
+        })
+        http_client.get('akismet', 'http://www.example.com/')
+        http_client.get('akismet', 'http://www.example.com/')
+        self.assertEqual(http_client.breaker.state('akismet'), 'open')
+        api_call.reset_mock()
+        with self.assertRaises(CircuitOpenError) as cm:
+            http_client.get('akismet', 'http://www.example.com/')
+        self.assertTrue(cm.exception.fail_closed)
+        self.assertFalse(api_call.called)
+        self.assertEqual(http_client.breaker.state('blackbox'), 'closed')
+        http_client.get('blackbox', 'http://www.example.com/')
+        self.assertTrue(api_call.called)
+
+    @unittest.mock.patch('time.monotonic')
+    @unittest.mock.patch('requests.Session.request')
+    def test_request_circuit_latency(self, api_call, monotonic):
+        api_call.return_value = self._makeResponse(200)
+        monotonic.side_effect = [0, 5]
+        http_client = self._makeOne({
+            'circuit_threshold': '1',
+            'circuit_latency': '2',
+        })
+        http_client.get('akismet', 'http://www.example.com/')
+        self.assertEqual(http_client.breaker.state('akismet'), 'open')
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_request_circuit_disabled(self, api_call):
+        api_call.return_value = self._makeResponse(503)
+        http_client = self._makeOne({'circuit_threshold': '0'})
+        for i in range(10):
+            http_client.get('akismet', 'http://www.example.com/')
+        self.assertEqual(http_client.breaker.state('akismet'), 'closed')
+        self.assertEqual(redis_conn._redis._store, {})
+
+    def test_fail_closed(self):
+        http_client = self._makeOne({'akismet.circuit_fail': 'closed'})
+        self.assertTrue(http_client.fail_closed('akismet'))
+        self.assertFalse(http_client.fail_closed('blackbox'))
+        http_client = self._makeOne({'circuit_fail': 'closed'})
+        self.assertTrue(http_client.fail_closed('blackbox'))
+
+
 class TestAkismet(RegistryMixin, unittest.TestCase):
 
+    def setUp(self):
+        super(TestAkismet, self).setUp()
+        redis_conn._redis = DummyRedis()
+
+    def tearDown(self):
+        super(TestAkismet, self).tearDown()
+        redis_conn._redis = None
+
     def _makeOne(self, key='hogehoge'):
         from fanboi2.utils import Akismet
         akismet = Akismet()
@@ -240,6 +956,7 @@ class TestAkismet(RegistryMixin, unittest.TestCase):
         class MockResponse(object):
 
             def __init__(self, content):
+                self.status_code = 200
                 self.content = content
 
         return MockResponse(content)
@@ -253,33 +970,33 @@ class TestAkismet(RegistryMixin, unittest.TestCase):
         akismet = self._makeOne(key=None)
         self.assertEqual(akismet.key, None)
 
-    @unittest.mock.patch('requests.post')
+    @unittest.mock.patch('requests.Session.request')
     def test_spam(self, api_call):
         api_call.return_value = self._makeResponse(b'true')
         request = self._makeRequest()
         akismet = self._makeOne()
         self.assertEqual(akismet.spam(request, 'buy viagra'), True)
         api_call.assert_called_with(
+            'POST',
             'https://hogehoge.rest.akismet.com/1.1/comment-check',
-            headers=unittest.mock.ANY,
             data=unittest.mock.ANY,
             timeout=unittest.mock.ANY,
         )
 
-    @unittest.mock.patch('requests.post')
+    @unittest.mock.patch('requests.Session.request')
     def test_spam_ham(self, api_call):
         api_call.return_value = self._makeResponse(b'false')
         request = self._makeRequest()
         akismet = self._makeOne()
         self.assertEqual(akismet.spam(request, 'Hogehogehogehoge!'), False)
         api_call.assert_called_with(
+            'POST',
             'https://hogehoge.rest.akismet.com/1.1/comment-check',
-            headers=unittest.mock.ANY,
             data=unittest.mock.ANY,
             timeout=unittest.mock.ANY,
         )
 
-    @unittest.mock.patch('requests.post')
+    @unittest.mock.patch('requests.Session.request')
     def test_spam_timeout(self, api_call):
         import requests
         request = self._makeRequest()
@@ -287,8 +1004,64 @@ class TestAkismet(RegistryMixin, unittest.TestCase):
         api_call.side_effect = requests.Timeout('connection timed out')
         self.assertEqual(akismet.spam(request, 'buy viagra'), False)
 
+    @unittest.mock.patch('requests.Session.request')
+    def test_spam_error(self, api_call):
+        import requests
+        request = self._makeRequest()
+        akismet = self._makeOne()
+        api_call.side_effect = requests.ConnectionError('connection refused')
+        self.assertEqual(akismet.spam(request, 'buy viagra'), False)
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_spam_error_fail_closed(self, api_call):
+        import requests
+        request = self._makeRequest()
+        akismet = self._makeOne()
+        akismet.http_client.providers = {
+            'akismet': {'circuit_fail': 'closed'},
+        }
+        api_call.side_effect = requests.Timeout('connection timed out')
+        self.assertEqual(akismet.spam(request, 'buy viagra'), True)
+        api_call.side_effect = requests.ConnectionError('connection refused')
+        self.assertEqual(akismet.spam(request, 'buy viagra'), True)
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_spam_server_error(self, api_call):
+        response = self._makeResponse(b'')
+        response.status_code = 503
+        api_call.return_value = response
+        request = self._makeRequest()
+        akismet = self._makeOne()
+        self.assertEqual(akismet.spam(request, 'buy viagra'), False)
+        akismet.http_client.providers = {
+            'akismet': {'circuit_fail': 'closed'},
+        }
+        self.assertEqual(akismet.spam(request, 'buy viagra'), True)
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_spam_circuit_open(self, api_call):
+        request = self._makeRequest()
+        akismet = self._makeOne()
+        redis_conn.set('circuit:akismet:open', 1)
+        self.assertEqual(akismet.spam(request, 'buy viagra'), False)
+        akismet.http_client.providers = {
+            'akismet': {'circuit_fail': 'closed'},
+        }
+        self.assertEqual(akismet.spam(request, 'buy viagra'), True)
+        assert not api_call.called
+
+    def test_fail_closed(self):
+        akismet = self._makeOne()
+        self.assertFalse(akismet.fail_closed())
+        akismet.http_client.providers = {
+            'akismet': {'circuit_fail': 'closed'},
+        }
+        self.assertTrue(akismet.fail_closed())
+        akismet.configure_key(None)
+        self.assertFalse(akismet.fail_closed())
+
     # noinspection PyTypeChecker
-    @unittest.mock.patch('requests.post')
+    @unittest.mock.patch('requests.Session.request')
     def test_spam_no_key(self, api_call):
         request = self._makeRequest()
         akismet = self._makeOne(key=None)
@@ -298,6 +1071,12 @@ class TestAkismet(RegistryMixin, unittest.TestCase):
 
 class TestBlackBoxProxyDetector(unittest.TestCase):
 
+    def setUp(self):
+        redis_conn._redis = DummyRedis()
+
+    def tearDown(self):
+        redis_conn._redis = None
+
     def _makeOne(self, settings={}):
         from fanboi2.utils.proxy import BlackBoxProxyDetector
         blackbox = BlackBoxProxyDetector(settings)
@@ -322,32 +1101,43 @@ class TestBlackBoxProxyDetector(unittest.TestCase):
             blackbox.url,
             'http://www.shroomery.org/ythan/proxycheck.php')
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check(self, api_call):
         api_call.return_value = self._makeResponse(200, b'Y')
         blackbox = self._makeOne({'url': 'http://www.example.com/'})
         self.assertEqual(blackbox.check('8.8.8.8'), b'Y')
         api_call.assert_called_with(
+            'GET',
             'http://www.example.com/',
-            headers=unittest.mock.ANY,
             timeout=unittest.mock.ANY,
             params={'ip': '8.8.8.8'},
         )
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_timeout(self, api_call):
         import requests
         api_call.side_effect = requests.Timeout('connection timed out')
         blackbox = self._makeOne()
-        self.assertIsNone(blackbox.check('8.8.8.8'))
+        with self.assertRaises(requests.Timeout):
+            blackbox.check('8.8.8.8')
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
+    def test_check_error(self, api_call):
+        import requests
+        api_call.side_effect = requests.ConnectionError('connection refused')
+        blackbox = self._makeOne()
+        with self.assertRaises(requests.ConnectionError):
+            blackbox.check('8.8.8.8')
+
+    @unittest.mock.patch('requests.Session.request')
     def test_check_status_error(self, api_call):
+        import requests
         api_call.return_value = self._makeResponse(500, b'Error')
         blackbox = self._makeOne()
-        self.assertIsNone(blackbox.check('8.8.8.8'))
+        with self.assertRaises(requests.HTTPError):
+            blackbox.check('8.8.8.8')
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_response_error(self, api_call):
         api_call.return_value = self._makeResponse(200, b'X')
         blackbox = self._makeOne()
@@ -368,6 +1158,12 @@ class TestBlackBoxProxyDetector(unittest.TestCase):
 
 class TestGetIPIntelProxyDetector(unittest.TestCase):
 
+    def setUp(self):
+        redis_conn._redis = DummyRedis()
+
+    def tearDown(self):
+        redis_conn._redis = None
+
     def _makeOne(self, settings={}):
         from fanboi2.utils.proxy import GetIPIntelProxyDetector
         getipintel = GetIPIntelProxyDetector(settings)
@@ -404,7 +1200,7 @@ class TestGetIPIntelProxyDetector(unittest.TestCase):
         self.assertEqual(getipintel.email, 'foo@example.com')
         self.assertEqual(getipintel.flags, None)
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check(self, api_call):
         api_call.return_value = self._makeResponse(200, b'1')
         getipintel = self._makeOne({
@@ -414,8 +1210,8 @@ class TestGetIPIntelProxyDetector(unittest.TestCase):
         })
         self.assertEqual(getipintel.check('8.8.8.8'), b'1')
         api_call.assert_called_with(
+            'GET',
             'http://www.example.com/',
-            headers=unittest.mock.ANY,
             timeout=unittest.mock.ANY,
             params={
                 'ip': '8.8.8.8',
@@ -424,7 +1220,7 @@ class TestGetIPIntelProxyDetector(unittest.TestCase):
             },
         )
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_no_flags(self, api_call):
         api_call.return_value = self._makeResponse(200, b'1')
         getipintel = self._makeOne({
@@ -433,8 +1229,8 @@ class TestGetIPIntelProxyDetector(unittest.TestCase):
         })
         self.assertEqual(getipintel.check('8.8.8.8'), b'1')
         api_call.assert_called_with(
+            'GET',
             'http://www.example.com/',
-            headers=unittest.mock.ANY,
             timeout=unittest.mock.ANY,
             params={
                 'ip': '8.8.8.8',
@@ -442,20 +1238,31 @@ class TestGetIPIntelProxyDetector(unittest.TestCase):
             },
         )
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_timeout(self, api_call):
         import requests
         api_call.side_effect = requests.Timeout('connection timed out')
         getipintel = self._makeOne({'email': 'foo@example.com'})
-        self.assertIsNone(getipintel.check('8.8.8.8'))
+        with self.assertRaises(requests.Timeout):
+            getipintel.check('8.8.8.8')
+
+    @unittest.mock.patch('requests.Session.request')
+    def test_check_error(self, api_call):
+        import requests
+        api_call.side_effect = requests.ConnectionError('connection refused')
+        getipintel = self._makeOne({'email': 'foo@example.com'})
+        with self.assertRaises(requests.ConnectionError):
+            getipintel.check('8.8.8.8')
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_status_error(self, api_call):
+        import requests
         api_call.return_value = self._makeResponse(500, b'1')
         getipintel = self._makeOne({'email': 'foo@example.com'})
-        self.assertIsNone(getipintel.check('8.8.8.8'))
+        with self.assertRaises(requests.HTTPError):
+            getipintel.check('8.8.8.8')
 
-    @unittest.mock.patch('requests.get')
+    @unittest.mock.patch('requests.Session.request')
     def test_check_response_error(self, api_call):
         api_call.return_value = self._makeResponse(200, b'-1')
         getipintel = self._makeOne({'email': 'foo@example.com'})
@@ -503,12 +1310,12 @@ class TestProxyDetector(CacheMixin, RegistryMixin, unittest.TestCase):
             )
             BlackBoxProxyDetector.assert_called_with({
                 'url': 'http://www.example.com/blackbox'
-            })
+            }, http_client=proxy_detector.http_client)
             GetIPIntelProxyDetector.assert_called_with({
                 'url': 'http://www.example.com/getipintel',
                 'email': 'foo@example.com',
                 'flags': 'm',
-            })
+            }, http_client=proxy_detector.http_client)
 
     @unittest.mock.patch('fanboi2.utils.proxy.BlackBoxProxyDetector.check')
     @unittest.mock.patch('fanboi2.utils.proxy.GetIPIntelProxyDetector.check')
@@ -579,6 +1386,67 @@ class TestProxyDetector(CacheMixin, RegistryMixin, unittest.TestCase):
         blackbox_check.assert_called_with('8.8.8.8')
         getipintel_check.assert_called_with('8.8.8.8')
 
+    @unittest.mock.patch('fanboi2.utils.proxy.BlackBoxProxyDetector.check')
+    @unittest.mock.patch('fanboi2.utils.proxy.GetIPIntelProxyDetector.check')
+    def test_check_circuit_open(self, getipintel_check, blackbox_check):
+        from fanboi2.utils import CircuitOpenError
+        blackbox_check.side_effect = CircuitOpenError('blackbox')
+        getipintel_check.return_value = b'1'
+        proxy_detector = self._makeOne({
+            'providers': ['blackbox', 'getipintel'],
+            'getipintel.email': 'foo@example.com',
+        })
+        self.assertEqual(proxy_detector.detect('8.8.8.8'), True)
+        getipintel_check.assert_called_with('8.8.8.8')
+
+    @unittest.mock.patch('fanboi2.utils.proxy.BlackBoxProxyDetector.check')
+    @unittest.mock.patch('fanboi2.utils.proxy.GetIPIntelProxyDetector.check')
+    def test_check_circuit_open_fail_closed(
+            self, getipintel_check, blackbox_check):
+        from fanboi2.utils import CircuitOpenError
+        blackbox_check.side_effect = CircuitOpenError(
+            'blackbox',
+            fail_closed=True)
+        proxy_detector = self._makeOne({
+            'providers': ['blackbox', 'getipintel'],
+            'getipintel.email': 'foo@example.com',
+        })
+        proxy_detector.http_client.providers = {
+            'blackbox': {'circuit_fail': 'closed'},
+        }
+        self.assertEqual(proxy_detector.detect('8.8.8.8'), True)
+        self.assertFalse(getipintel_check.called)
+
+    @unittest.mock.patch('fanboi2.utils.proxy.BlackBoxProxyDetector.check')
+    @unittest.mock.patch('fanboi2.utils.proxy.GetIPIntelProxyDetector.check')
+    def test_check_request_error(self, getipintel_check, blackbox_check):
+        import requests
+        blackbox_check.side_effect = requests.Timeout('connection timed out')
+        getipintel_check.return_value = b'0.5'
+        proxy_detector = self._makeOne({
+            'providers': ['blackbox', 'getipintel'],
+            'getipintel.email': 'foo@example.com',
+        })
+        self.assertEqual(proxy_detector.detect('8.8.8.8'), False)
+        self.assertEqual(getipintel_check.call_count, 1)
+        proxy_detector.http_client.providers = {
+            'blackbox': {'circuit_fail': 'closed'},
+        }
+        self.assertEqual(proxy_detector.detect('8.8.8.8'), True)
+        self.assertEqual(blackbox_check.call_count, 2)
+        self.assertEqual(getipintel_check.call_count, 1)
+
+    def test_fail_closed(self):
+        proxy_detector = self._makeOne({
+            'providers': ['blackbox', 'getipintel'],
+            'getipintel.email': 'foo@example.com',
+        })
+        self.assertFalse(proxy_detector.fail_closed())
+        proxy_detector.http_client.providers = {
+            'getipintel': {'circuit_fail': 'closed'},
+        }
+        self.assertTrue(proxy_detector.fail_closed())
+
 
 class TestRateLimiter(unittest.TestCase):
 
@@ -616,18 +1484,222 @@ class TestRateLimiter(unittest.TestCase):
         self.assertEqual(ratelimit.key,
                          "rate:None:%s" % self._getHash('127.0.0.1'))
 
-    def test_limit(self):
+    def test_hit(self):
+        from fanboi2.utils.rate_limiter import SCRIPT_SHAS
+        request = self._makeRequest()
+        ratelimit = self._getTargetClass()(request, namespace='foobar')
+        with unittest.mock.patch.object(
+                redis_conn._redis,
+                'evalsha',
+                create=True,
+                return_value=[1, 0]) as evalsha:
+            self.assertEqual(ratelimit.hit([(1, 10), (20, 3600)]), (True, 0))
+        args = evalsha.call_args[0]
+        self.assertEqual(args[0], SCRIPT_SHAS['sliding_window'])
+        self.assertEqual(args[1], 2)
+        self.assertEqual(args[2:4], (
+            "rate:foobar:%s:sliding_window:1:10" % self._getHash('127.0.0.1'),
+            "rate:foobar:%s:sliding_window:20:3600" % (
+                self._getHash('127.0.0.1'),),
+        ))
+        self.assertEqual(args[6:], (1, 10000, 20, 3600000))
+
+    def test_hit_denied(self):
         request = self._makeRequest()
         ratelimit = self._getTargetClass()(request, namespace='foobar')
-        self.assertFalse(ratelimit.limited())
-        self.assertEqual(ratelimit.timeleft(), 0)
-        ratelimit.limit(seconds=30)
-        self.assertTrue(ratelimit.limited())
-        self.assertEqual(ratelimit.timeleft(), 30)
+        with unittest.mock.patch.object(
+                redis_conn._redis,
+                'evalsha',
+                create=True,
+                return_value=[0, 7]):
+            self.assertEqual(
+                ratelimit.hit([(1, 10)], 'token_bucket'),
+                (False, 7))
 
-    def test_limit_no_seconds(self):
+    def test_hit_no_script(self):
+        from redis.exceptions import NoScriptError
+        from fanboi2.utils.rate_limiter import SCRIPTS
+        request = self._makeRequest()
+        ratelimit = self._getTargetClass()(request, namespace='foobar')
+        with unittest.mock.patch.object(
+                redis_conn._redis,
+                'evalsha',
+                create=True,
+                side_effect=NoScriptError()), \
+            unittest.mock.patch.object(
+                redis_conn._redis,
+                'eval',
+                create=True,
+                return_value=[1, 0]) as eval_:
+            self.assertEqual(ratelimit.hit([(1, 10)]), (True, 0))
+        self.assertEqual(eval_.call_args[0][0], SCRIPTS['sliding_window'])
+
+    def test_hit_invalid(self):
         request = self._makeRequest()
         ratelimit = self._getTargetClass()(request, namespace='foobar')
-        ratelimit.limit()
-        self.assertTrue(ratelimit.limited())
-        self.assertEqual(ratelimit.timeleft(), 10)
+        with self.assertRaises(ValueError):
+            ratelimit.hit([(1, 10)], 'foobar')
+        with self.assertRaises(ValueError):
+            ratelimit.hit([(0, 10)])
+        self.assertEqual(ratelimit.hit([]), (True, 0))
+
+
+class TestRateLimiterScripts(RedisMixin, unittest.TestCase):
+
+    def _makeOne(self):
+        from fanboi2.utils import RateLimiter
+        request = testing.DummyRequest()
+        request.remote_addr = '127.0.0.1'
+        request.user_agent = 'TestBrowser/1.0'
+        request.referrer = 'http://www.example.com/foo'
+        return RateLimiter(request, namespace='foobar')
+
+    def test_sliding_window(self):
+        ratelimit = self._makeOne()
+        self.assertEqual(ratelimit.hit([(2, 10)]), (True, 0))
+        self.assertEqual(ratelimit.hit([(2, 10)]), (True, 0))
+        allowed, timeleft = ratelimit.hit([(2, 10)])
+        self.assertFalse(allowed)
+        self.assertGreater(timeleft, 0)
+        self.assertLessEqual(timeleft, 10)
+
+    def test_sliding_window_multiple(self):
+        ratelimit = self._makeOne()
+        limits = [(1, 10), (3, 3600)]
+        self.assertEqual(ratelimit.hit(limits), (True, 0))
+        allowed, timeleft = ratelimit.hit(limits)
+        self.assertFalse(allowed)
+        self.assertLessEqual(timeleft, 10)
+        # A denied hit is not recorded in any window.
+        self.assertEqual(ratelimit.hit([(3, 3600)]), (True, 0))
+        self.assertEqual(ratelimit.hit([(3, 3600)]), (True, 0))
+        allowed, timeleft = ratelimit.hit([(3, 3600)])
+        self.assertFalse(allowed)
+        self.assertGreater(timeleft, 10)
+
+    def test_token_bucket(self):
+        ratelimit = self._makeOne()
+        self.assertEqual(ratelimit.hit([(2, 10)], 'token_bucket'), (True, 0))
+        self.assertEqual(ratelimit.hit([(2, 10)], 'token_bucket'), (True, 0))
+        allowed, timeleft = ratelimit.hit([(2, 10)], 'token_bucket')
+        self.assertFalse(allowed)
+        self.assertGreater(timeleft, 0)
+        self.assertLessEqual(timeleft, 5)
+
+    def test_token_bucket_same_window(self):
+        ratelimit = self._makeOne()
+        limits = [(1, 10), (5, 10)]
+        self.assertEqual(ratelimit.hit(limits, 'token_bucket'), (True, 0))
+        allowed, timeleft = ratelimit.hit(limits, 'token_bucket')
+        self.assertFalse(allowed)
+        self.assertLessEqual(timeleft, 10)
+
+    def test_no_script(self):
+        ratelimit = self._makeOne()
+        redis_conn._redis.script_flush()
+        self.assertEqual(ratelimit.hit([(1, 10)]), (True, 0))
+        self.assertFalse(ratelimit.hit([(1, 10)])[0])
+
+    def test_expire(self):
+        ratelimit = self._makeOne()
+        ratelimit.hit([(1, 10)])
+        ratelimit.hit([(1, 10)], 'token_bucket')
+        keys = redis_conn._redis.keys('rate:foobar:*')
+        self.assertEqual(len(keys), 2)
+        for key in keys:
+            ttl = redis_conn._redis.pttl(key)
+            self.assertGreater(ttl, 0)
+            self.assertLessEqual(ttl, 10000)
+
+
+class TestPostQueue(RedisMixin, unittest.TestCase):
+
+    def _makeOne(self, size=3, wait=None):
+        from fanboi2.utils import PostQueue
+        post_queue = PostQueue()
+        post_queue.configure_batch(size, wait)
+        return post_queue
+
+    def test_init(self):
+        post_queue = self._makeOne(size='5', wait='200')
+        self.assertEqual(post_queue.size, 5)
+        self.assertEqual(post_queue.wait, 0.2)
+        self.assertTrue(post_queue.enabled)
+
+    def test_init_disabled(self):
+        post_queue = self._makeOne(size='', wait='')
+        self.assertEqual(post_queue.size, 0)
+        self.assertEqual(post_queue.wait, 0)
+        self.assertFalse(post_queue.enabled)
+
+    def test_push_pop(self):
+        post_queue = self._makeOne(size=2)
+        for i in range(3):
+            post_queue.push(1, {'task_id': str(i)})
+        self.assertEqual(post_queue.pending(1), 3)
+        self.assertEqual(post_queue.pending(2), 0)
+        self.assertEqual(post_queue.pop(1), [{'task_id': '0'}, {'task_id': '1'}])
+        self.assertEqual(post_queue.pop(1), [{'task_id': '2'}])
+        self.assertEqual(post_queue.pop(1), [])
+        self.assertEqual(post_queue.pending(1), 0)
+
+    def test_pop_processing(self):
+        post_queue = self._makeOne(size=2)
+        for i in range(3):
+            post_queue.push(1, {'task_id': str(i)})
+        entries = post_queue.pop(1)
+        self.assertEqual(post_queue.processing(1), entries)
+        self.assertEqual(post_queue.processing(2), [])
+        post_queue.ack(1, entries[:1])
+        self.assertEqual(post_queue.processing(1), [{'task_id': '1'}])
+        self.assertEqual(
+            post_queue.pop(1),
+            [{'task_id': '2'}])
+        self.assertEqual(
+            post_queue.processing(1),
+            [{'task_id': '1'}, {'task_id': '2'}])
+        post_queue.ack(1, post_queue.processing(1))
+        self.assertEqual(post_queue.processing(1), [])
+
+    def test_stale_topics(self):
+        post_queue = self._makeOne()
+        post_queue.push(1, {'task_id': '1'})
+        post_queue.push(2, {'task_id': '2'})
+        post_queue.push(3, {'task_id': '3'})
+        self.assertEqual(post_queue.stale_topics(), [])
+        post_queue.pop(1)
+        post_queue.pop(3)
+        self.assertEqual(sorted(post_queue.stale_topics()), [1, 3])
+        post_queue.ack(1, [{'task_id': '1'}])
+        self.assertEqual(post_queue.stale_topics(), [3])
+
+    def test_acquire(self):
+        post_queue = self._makeOne()
+        token = post_queue.acquire(1)
+        self.assertTrue(token)
+        self.assertIsNone(post_queue.acquire(1))
+        self.assertTrue(post_queue.acquire(2))
+        self.assertTrue(post_queue.release(1, token))
+        self.assertTrue(post_queue.acquire(1))
+
+    def test_release_token(self):
+        post_queue = self._makeOne()
+        token = post_queue.acquire(1)
+        redis_conn.delete(post_queue._lock_key(1))
+        other_token = post_queue.acquire(1)
+        self.assertFalse(post_queue.release(1, token))
+        self.assertIsNone(post_queue.acquire(1))
+        self.assertTrue(post_queue.release(1, other_token))
+        self.assertTrue(post_queue.acquire(1))
+
+    def test_extend(self):
+        post_queue = self._makeOne()
+        token = post_queue.acquire(1)
+        redis_conn.expire(post_queue._lock_key(1), 5)
+        self.assertTrue(post_queue.extend(1, token))
+        self.assertEqual(
+            redis_conn.ttl(post_queue._lock_key(1)),
+            post_queue.lock_expire)
+        self.assertFalse(post_queue.extend(1, 'foobar'))
+        redis_conn.delete(post_queue._lock_key(1))
+        self.assertFalse(post_queue.extend(1, token))
@@ -3,6 +3,9 @@ import unittest.mock
 from fanboi2.tests import ViewMixin, ModelMixin, TaskMixin, DummyAsyncResult
 
 
+TASK_ID = '5f6b3c1e-7d2a-4e8b-9c0f-1a2b3c4d5e6f'
+
+
 class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
     def test_root(self):
@@ -47,6 +50,35 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(NoResultFound):
             board_get(request)
 
+    def test_get_recent_posts(self):
+        from sqlalchemy import event
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _get_recent_posts
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic1 = self._makeTopic(board=board, title='Foo')
+        topic2 = self._makeTopic(board=board, title='Bar')
+        topic3 = self._makeTopic(board=board, title='Baz')
+        posts1 = [self._makePost(topic=topic1, body='Foo') for _ in range(4)]
+        posts2 = [self._makePost(topic=topic2, body='Bar') for _ in range(2)]
+        queries = []
+
+        def _count(*args, **kwargs):
+            queries.append(args)
+
+        engine = DBSession.get_bind()
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            recent_posts = _get_recent_posts([topic1, topic2, topic3], 3)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(recent_posts, {
+            topic1.id: posts1[1:],
+            topic2.id: posts2,
+            topic3.id: [],
+        })
+        self.assertEqual(_get_recent_posts([], 3), {})
+
     def test_board_topics_get(self):
         from fanboi2.views.api import board_topics_get
 
@@ -80,7 +112,8 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         request = self._GET()
         request.matchdict['board'] = board1.slug
         response = board_topics_get(request)
-        self.assertSAEqual(response, [
+        self.assertIsNone(response.next_cursor)
+        self.assertSAEqual(response.items, [
             topic1,
             topic2,
             topic3,
@@ -94,6 +127,55 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
             topic11,
         ])
 
+    def test_board_topics_get_cursor(self):
+        from fanboi2.views.api import board_topics_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topics = [self._makeTopic(board=board, title='Foo') for _ in range(5)]
+        topics.reverse()
+        request = self._GET({'limit': '2'})
+        request.matchdict['board'] = board.slug
+        response = board_topics_get(request)
+        self.assertEqual(response.limit, 2)
+        self.assertSAEqual(response.items, topics[0:2])
+        self.assertEqual(
+            request.response.headers['Link'],
+            '<%s?limit=2&cursor=%s>; rel="next"' % (
+                request.path,
+                response.next_cursor))
+        request = self._GET({'limit': '2', 'cursor': response.next_cursor})
+        request.matchdict['board'] = board.slug
+        response = board_topics_get(request)
+        self.assertSAEqual(response.items, topics[2:4])
+        request = self._GET({'limit': '2', 'cursor': response.next_cursor})
+        request.matchdict['board'] = board.slug
+        response = board_topics_get(request)
+        self.assertSAEqual(response.items, topics[4:5])
+        self.assertIsNone(response.next_cursor)
+        self.assertNotIn('Link', request.response.headers)
+
+    def test_board_topics_get_invalid_cursor(self):
+        from fanboi2.errors import ParamsInvalidError
+        from fanboi2.views.api import board_topics_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        request = self._GET({'cursor': 'invalid'})
+        request.matchdict['board'] = board.slug
+        with self.assertRaises(ParamsInvalidError):
+            board_topics_get(request)
+
+    def test_board_topics_get_out_of_range_cursor(self):
+        from base64 import urlsafe_b64encode
+        from fanboi2.errors import ParamsInvalidError
+        from fanboi2.views.api import board_topics_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        for value in (b'999999999999999999999:1',
+                      b'0:99999999999999999999'):
+            cursor = urlsafe_b64encode(value).decode('utf8')
+            request = self._GET({'cursor': cursor})
+            request.matchdict['board'] = board.slug
+            with self.assertRaises(ParamsInvalidError) as cm:
+                board_topics_get(request)
+            self.assertEqual(cm.exception.http_status, '400 Bad Request')
+
     def test_board_topics_get_not_found(self):
         from sqlalchemy.orm.exc import NoResultFound
         from fanboi2.views.api import board_topics_get
@@ -103,9 +185,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
             board_topics_get(request)
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_topics_post(self, add_, limit_):
+    def test_board_topics_post(self, add_, hit_):
         from fanboi2.views.api import board_topics_post
         board = self._makeBoard(title='Foobar', slug='foobar')
 
@@ -116,7 +200,9 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
         response = board_topics_post(request)
         self.assertEqual(response, mock_response)
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             board_id=board.id,
@@ -125,9 +211,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         )
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_topics_post_json(self, add_, limit_):
+    def test_board_topics_post_json(self, add_, hit_):
         from fanboi2.views.api import board_topics_post
         board = self._makeBoard(title='Foobar', slug='foobar')
 
@@ -138,7 +226,9 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
         response = board_topics_post(request)
         self.assertEqual(response, mock_response)
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             board_id=board.id,
@@ -154,9 +244,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(NoResultFound):
             board_topics_post(request)
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_topics_post_failed(self, add_, limit_):
+    def test_board_topics_post_failed(self, add_, hit_):
         from fanboi2.errors import ParamsInvalidError
         from fanboi2.models import DBSession, Topic
         from fanboi2.views.api import board_topics_post
@@ -168,14 +260,13 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(ParamsInvalidError):
             board_topics_post(request)
 
-        self.assertFalse(limit_.called)
+        self.assertFalse(hit_.called)
         self.assertFalse(add_.called)
         self.assertEqual(DBSession.query(Topic).count(), 0)
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.timeleft')
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limited')
+    @unittest.mock.patch('fanboi2.utils.RateLimiter.hit')
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_topics_post_limited(self, add_, limited_, time_):
+    def test_board_topics_post_limited(self, add_, hit_):
         from fanboi2.errors import RateLimitedError
         from fanboi2.models import DBSession, Topic
         from fanboi2.views.api import board_topics_post
@@ -184,16 +275,32 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         request = self._POST({'title': 'Thread thread', 'body': 'Words words'})
         request.matchdict['board'] = board.slug
         self._makeConfig(request, self._makeRegistry())
-        limited_.return_value = True
-        time_.return_value = 10
+        hit_.return_value = (False, 10)
         with self.assertRaises(RateLimitedError):
             board_topics_post(request)
 
         self.assertFalse(add_.called)
-        self.assertTrue(limited_.called)
-        self.assertTrue(time_.called)
+        self.assertTrue(hit_.called)
         self.assertEqual(DBSession.query(Topic).count(), 0)
 
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
+    @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
+    def test_board_topics_post_limits(self, add_, hit_):
+        from fanboi2.views.api import board_topics_post
+        board = self._makeBoard(title='Foobar', slug='foobar', settings={
+            'post_limits': [[1, 10], [20, 3600]],
+            'post_limit_policy': 'token_bucket',
+        })
+
+        request = self._POST({'title': 'Thread thread', 'body': 'Words words'})
+        request.matchdict['board'] = board.slug
+        self._makeConfig(request, self._makeRegistry())
+        board_topics_post(request)
+        hit_.assert_called_with([[1, 10], [20, 3600]], 'token_bucket')
+        self.assertTrue(add_.called)
+
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_task_get(self, result_):
         from fanboi2.views.api import task_get
@@ -201,16 +308,91 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Words words')
         result_.return_value = async_result = DummyAsyncResult(
-            'dummy',
+            TASK_ID,
             'success',
             ['topic', topic.id])
 
         request = self._GET()
-        request.matchdict['task'] = 'dummy'
+        request.matchdict['task'] = TASK_ID
         response = task_get(request)
         self.assertEqual(response.id, async_result.id)
         self.assertEqual(response.object, topic)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
+
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_task_get_wait(self, result_):
+        from fanboi2.models import notifier, task_channel
+        from fanboi2.views.api import task_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Foobar')
+        async_result = DummyAsyncResult(TASK_ID, 'pending')
+        result_.return_value = async_result
+        states = iter(['pending', 'success'])
+
+        def _ready():
+            async_result._status = next(states)
+            async_result._result = ['topic', topic.id]
+            if async_result._status == 'pending':
+                notifier.publish(task_channel(TASK_ID), 'SUCCESS')
+            return async_result._status == 'success'
+
+        async_result.ready = _ready
+        request = self._GET({'wait': '10'})
+        request.matchdict['task'] = TASK_ID
+        response = task_get(request)
+        self.assertTrue(response.success())
+        self.assertEqual(response.object, topic)
+
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_task_get_wait_timeout(self, result_):
+        import time
+        from fanboi2.views.api import task_get
+        result_.return_value = DummyAsyncResult(TASK_ID, 'pending')
+        request = self._GET({'wait': '1'})
+        request.matchdict['task'] = TASK_ID
+        start = time.time()
+        response = task_get(request)
+        self.assertFalse(response.success())
+        self.assertGreaterEqual(time.time() - start, 1)
+
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_task_get_wait_ready(self, result_):
+        from fanboi2.models import notifier
+        from fanboi2.views.api import task_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Foobar')
+        result_.return_value = DummyAsyncResult(
+            TASK_ID,
+            'success',
+            ['topic', topic.id])
+        request = self._GET({'wait': '10'})
+        request.matchdict['task'] = TASK_ID
+        with unittest.mock.patch.object(notifier, 'subscribe') as subscribe_:
+            response = task_get(request)
+        self.assertTrue(response.success())
+        self.assertFalse(subscribe_.called)
+
+    @unittest.mock.patch('fanboi2.views.api.MAX_TASK_WAIT', 1)
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_task_get_wait_capped(self, result_):
+        import time
+        from fanboi2.views.api import task_get
+        result_.return_value = DummyAsyncResult(TASK_ID, 'pending')
+        request = self._GET({'wait': '30'})
+        request.matchdict['task'] = TASK_ID
+        start = time.time()
+        task_get(request)
+        self.assertLess(time.time() - start, 2)
+
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_task_get_invalid(self, result_):
+        from pyramid.httpexceptions import HTTPNotFound
+        from fanboi2.views.api import task_get
+        request = self._GET({'wait': '10'})
+        request.matchdict['task'] = 'dummy'
+        with self.assertRaises(HTTPNotFound):
+            task_get(request)
+        self.assertFalse(result_.called)
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_task_get_failure(self, result_):
@@ -219,12 +401,12 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Words words')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'spam_rejected'])
 
         request = self._GET()
-        request.matchdict['task'] = 'dummy'
+        request.matchdict['task'] = TASK_ID
         with self.assertRaises(SpamRejectedError):
             task_get(request)
 
@@ -245,6 +427,208 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(NoResultFound):
             topic_get(request)
 
+    def test_topic_etag(self):
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _topic_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        post = self._makePost(topic=topic, body='Hello, world!')
+        request = self._GET()
+        request.matchdict['topic'] = topic.id
+        etag1 = _topic_etag(request)
+        self.assertIsNotNone(etag1)
+        self.assertEqual(_topic_etag(request), etag1)
+        self._makePost(topic=topic, body='Hello again!')
+        DBSession.expire_all()
+        etag2 = _topic_etag(request)
+        self.assertNotEqual(etag1, etag2)
+        topic.status = 'locked'
+        DBSession.add(topic)
+        DBSession.flush()
+        etag3 = _topic_etag(request)
+        self.assertNotEqual(etag3, etag2)
+        post.body = 'Hello, edited world!'
+        DBSession.add(post)
+        DBSession.flush()
+        etag4 = _topic_etag(request)
+        self.assertNotEqual(etag4, etag3)
+        DBSession.delete(post)
+        DBSession.flush()
+        self.assertNotEqual(_topic_etag(request), etag4)
+
+    def test_topic_etag_queries(self):
+        from sqlalchemy import event
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _topic_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        for i in range(3):
+            self._makePost(topic=topic, body='Hello, world!')
+        request = self._GET()
+        request.matchdict['topic'] = topic.id
+        statements = []
+
+        def _count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = DBSession.get_bind()
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            _topic_etag(request)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('post.', statements[0])
+        self.assertNotIn('GROUP BY', statements[0])
+
+    def test_topic_etag_not_found(self):
+        from fanboi2.views.api import _topic_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        request = self._GET()
+        request.matchdict['topic'] = '1234'
+        self.assertIsNone(_topic_etag(request))
+        request.matchdict['topic'] = topic.id
+        request.matchdict['board'] = 'foobaz'
+        self.assertIsNone(_topic_etag(request))
+
+    def test_page_etag(self):
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _page_etag
+        page = self._makePage(title='Foo', body='Foo', slug='foo')
+        request = self._GET()
+        request.matchdict['page'] = page.slug
+        etag1 = _page_etag(request)
+        self.assertIsNotNone(etag1)
+        self.assertEqual(_page_etag(request), etag1)
+        page.body = 'Bar'
+        DBSession.add(page)
+        DBSession.flush()
+        self.assertNotEqual(_page_etag(request), etag1)
+        request.matchdict['page'] = 'notexists'
+        self.assertIsNone(_page_etag(request))
+
+    def test_page_etag_internal(self):
+        from fanboi2.views.api import _page_etag
+        page = self._makePage(
+            title='Foo',
+            body='Foo',
+            slug='foo',
+            namespace='internal')
+        request = self._GET()
+        request.matchdict['page'] = page.slug
+        self.assertIsNone(_page_etag(request))
+
+    def test_board_etag(self):
+        from fanboi2.views.api import _board_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        request = self._GET()
+        request.matchdict['board'] = board.slug
+        etag1 = _board_etag(request)
+        self.assertIsNotNone(etag1)
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Hello, world!')
+        etag2 = _board_etag(request)
+        self.assertNotEqual(etag1, etag2)
+        self._makePost(topic=topic, body='Hello again!')
+        self.assertNotEqual(_board_etag(request), etag2)
+        request.matchdict['board'] = 'foobaz'
+        self.assertIsNone(_board_etag(request))
+
+    def test_board_etag_page(self):
+        from fanboi2.models import DBSession
+        from fanboi2.utils import encode_cursor
+        from fanboi2.views.api import _board_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic1 = self._makeTopic(board=board, title='Demo 1')
+        topic2 = self._makeTopic(board=board, title='Demo 2')
+        topic3 = self._makeTopic(board=board, title='Demo 3')
+        request = self._GET({
+            'limit': '1',
+            'cursor': encode_cursor(topic2.meta.bumped_at, topic2.id)})
+        request.matchdict['board'] = board.slug
+        etag1 = _board_etag(request)
+        self.assertIsNotNone(etag1)
+        topic3.title = 'Demo 3 updated'
+        DBSession.add(topic3)
+        DBSession.flush()
+        self.assertEqual(_board_etag(request), etag1)
+        topic1.status = 'locked'
+        DBSession.add(topic1)
+        DBSession.flush()
+        self.assertNotEqual(_board_etag(request), etag1)
+        request.params['cursor'] = 'invalid'
+        self.assertIsNone(_board_etag(request))
+
+    def test_board_etag_post_edited(self):
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _board_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        post = self._makePost(topic=topic, body='Hello, world!')
+        request = self._GET()
+        request.matchdict['board'] = board.slug
+        etag1 = _board_etag(request)
+        post.body = 'Hello, edited world!'
+        DBSession.add(post)
+        DBSession.flush()
+        self.assertNotEqual(_board_etag(request), etag1)
+
+    def test_board_etag_queries(self):
+        from sqlalchemy import event
+        from fanboi2.models import DBSession
+        from fanboi2.views.api import _board_etag
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        for i in range(5):
+            self._makeTopic(board=board, title='Demo %s' % (i,))
+        request = self._GET({'limit': '2'})
+        request.matchdict['board'] = board.slug
+        statements = []
+
+        def _count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = DBSession.get_bind()
+        event.listen(engine, 'before_cursor_execute', _count)
+        try:
+            _board_etag(request)
+        finally:
+            event.remove(engine, 'before_cursor_execute', _count)
+        self.assertEqual(len(statements), 2)
+        self.assertNotIn('count(', statements[1].lower())
+        self.assertIn('LIMIT', statements[1])
+
+    def test_conditional(self):
+        from webob.etag import ETagMatcher
+        from fanboi2.views.api import _conditional
+
+        def _view(context, request):
+            return 'rendered'
+
+        view = _conditional(lambda request: 'foobar')(_view)
+        request = self._GET()
+        request.if_none_match = ETagMatcher(['foobaz'])
+        self.assertEqual(view(None, request), 'rendered')
+        self.assertEqual(request.response.etag, 'foobar')
+        request = self._GET()
+        request.if_none_match = ETagMatcher(['foobar'])
+        response = view(None, request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.etag, 'foobar')
+
+    def test_conditional_no_etag(self):
+        from webob.etag import ETagMatcher
+        from fanboi2.views.api import _conditional
+
+        def _view(context, request):
+            return 'rendered'
+
+        view = _conditional(lambda request: None)(_view)
+        request = self._GET()
+        request.if_none_match = ETagMatcher(['foobar'])
+        self.assertEqual(view(None, request), 'rendered')
+        self.assertIsNone(request.response.etag)
+
     def test_topic_posts_get(self):
         from fanboi2.views.api import topic_posts_get
         board = self._makeBoard(title='Foobar', slug='foobar')
@@ -272,6 +656,227 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         response = topic_posts_get(request)
         self.assertSAEqual(response, [post])
 
+    def test_topic_posts_get_after(self):
+        from fanboi2.views.api import topic_posts_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        post2 = self._makePost(topic=topic, body='Dolor sit amet')
+        post3 = self._makePost(topic=topic, body='Foobar baz')
+        request = self._GET({'after': '1'})
+        request.matchdict['topic'] = topic.id
+        response = topic_posts_get(request)
+        self.assertSAEqual(response, [post2, post3])
+
+    def test_topic_posts_get_after_uncommitted(self):
+        from fanboi2.models import DBSession, TopicMeta
+        from fanboi2.views.api import topic_posts_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        post2 = self._makePost(topic=topic, body='Dolor sit amet')
+        self._makePost(topic=topic, body='Foobar baz')
+        DBSession.execute(
+            TopicMeta.__table__.update().
+            where(TopicMeta.__table__.c.topic_id == topic.id).
+            values(post_count=2))
+        request = self._GET({'after': '1'})
+        request.matchdict['topic'] = topic.id
+        response = topic_posts_get(request)
+        self.assertSAEqual(response, [post2])
+
+    def test_topic_posts_get_after_invalid(self):
+        from fanboi2.errors import ParamsInvalidError
+        from fanboi2.views.api import topic_posts_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        request = self._GET({'after': 'foo'})
+        request.matchdict['topic'] = topic.id
+        with self.assertRaises(ParamsInvalidError):
+            topic_posts_get(request)
+        request = self._GET({'after': '-1'})
+        request.matchdict['topic'] = topic.id
+        with self.assertRaises(ParamsInvalidError) as cm:
+            topic_posts_get(request)
+        self.assertEqual(
+            cm.exception.messages,
+            {'after': ['Must be a non-negative number.']})
+
+    def test_topic_posts_get_wait(self):
+        import time
+        from fanboi2.views.api import topic_posts_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        post1 = self._makePost(topic=topic, body='Lorem ipsum')
+        request = self._GET({'after': '0', 'wait': '10'})
+        request.matchdict['topic'] = topic.id
+        start = time.time()
+        response = topic_posts_get(request)
+        self.assertSAEqual(response, [post1])
+        self.assertLess(time.time() - start, 1)
+
+    def test_topic_posts_get_wait_timeout(self):
+        import time
+        import transaction
+        from fanboi2.views.api import topic_posts_get
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Demo')
+            self._makePost(topic=topic, body='Lorem ipsum')
+            topic_id = topic.id
+        request = self._GET({'after': '1', 'wait': '1'})
+        request.matchdict['topic'] = topic_id
+        start = time.time()
+        response = topic_posts_get(request)
+        self.assertSAEqual(response, [])
+        self.assertGreaterEqual(time.time() - start, 1)
+
+    @unittest.mock.patch('fanboi2.views.api._latest_post_number')
+    def test_topic_posts_get_wait_notified(self, latest_):
+        from fanboi2.models import notifier, topic_channel
+        from fanboi2.views.api import topic_posts_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+
+        def _latest(topic_id):
+            post = self._makePost(topic=topic, body='Dolor sit amet')
+            notifier.publish(topic_channel(topic.id), post.number)
+            return 1
+
+        latest_.side_effect = _latest
+        request = self._GET({'after': '1', 'wait': '10'})
+        request.matchdict['topic'] = topic.id
+        response = topic_posts_get(request)
+        self.assertEqual([p.number for p in response], [2])
+
+    def _makeStreamConfig(self, request):
+        config = self._makeConfig(request, self._makeRegistry())
+        config.include('fanboi2.serializers')
+        config.add_route('api_topic_posts_scoped', '/topics/{topic}/{query}/')
+        return config
+
+    @unittest.mock.patch('fanboi2.views.api.STREAM_TIMEOUT', 0)
+    def test_topic_stream_get(self):
+        from fanboi2.views.api import topic_stream_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        self._makePost(topic=topic, body='Dolor sit amet')
+        self._makePost(topic=topic, body='Foobar baz')
+        request = self._GET()
+        request.headers['Last-Event-ID'] = '1'
+        request.matchdict['topic'] = topic.id
+        self._makeStreamConfig(request)
+        response = topic_stream_get(request)
+        self.assertEqual(response.content_type, 'text/event-stream')
+        events = list(response.app_iter)
+        self.assertEqual(events[0], b'retry: 3000\n\n')
+        self.assertEqual(len(events), 3)
+        self.assertTrue(events[1].startswith(b'id: 2\nevent: post\ndata: {'))
+        self.assertTrue(events[2].startswith(b'id: 3\nevent: post\ndata: {'))
+        self.assertIn(b'"body": "Foobar baz"', events[2])
+
+    @unittest.mock.patch('fanboi2.views.api.STREAM_TIMEOUT', 0)
+    def test_topic_stream_get_uncommitted(self):
+        from fanboi2.models import DBSession, TopicMeta
+        from fanboi2.views.api import topic_stream_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        self._makePost(topic=topic, body='Dolor sit amet')
+        self._makePost(topic=topic, body='Foobar baz')
+        DBSession.execute(
+            TopicMeta.__table__.update().
+            where(TopicMeta.__table__.c.topic_id == topic.id).
+            values(post_count=2))
+        request = self._GET()
+        request.headers['Last-Event-ID'] = '1'
+        request.matchdict['topic'] = topic.id
+        self._makeStreamConfig(request)
+        response = topic_stream_get(request)
+        events = list(response.app_iter)
+        self.assertEqual(len(events), 2)
+        self.assertTrue(events[1].startswith(b'id: 2\nevent: post\ndata: {'))
+
+    def test_topic_stream_get_wait_limit(self):
+        from fanboi2.models import notifier
+        from fanboi2.views.api import topic_stream_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        self._makePost(topic=topic, body='Dolor sit amet')
+        request = self._GET({'after': '1'})
+        request.matchdict['topic'] = topic.id
+        self._makeStreamConfig(request)
+        with unittest.mock.patch.object(notifier, 'wait_limit', 0):
+            response = topic_stream_get(request)
+            events = list(response.app_iter)
+        self.assertEqual(len(events), 2)
+        self.assertTrue(events[1].startswith(b'id: 2\nevent: post\ndata: {'))
+
+    @unittest.mock.patch('fanboi2.views.api.STREAM_TIMEOUT', 0)
+    def test_topic_stream_get_new(self):
+        from fanboi2.views.api import topic_stream_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topic = self._makeTopic(board=board, title='Demo')
+        self._makePost(topic=topic, body='Lorem ipsum')
+        request = self._GET()
+        request.matchdict['topic'] = topic.id
+        self._makeStreamConfig(request)
+        response = topic_stream_get(request)
+        self.assertEqual(list(response.app_iter), [b'retry: 3000\n\n'])
+
+    @unittest.mock.patch('fanboi2.views.api.STREAM_KEEPALIVE', 0)
+    def test_topic_stream_get_notified(self):
+        import transaction
+        from fanboi2.models import DBSession, Topic
+        from fanboi2.views.api import topic_stream_get
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Demo')
+            self._makePost(topic=topic, body='Lorem ipsum')
+            topic_id = topic.id
+        request = self._GET()
+        request.matchdict['topic'] = topic_id
+        self._makeStreamConfig(request)
+        response = topic_stream_get(request)
+        stream = iter(response.app_iter)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+        self.assertEqual(next(stream), b': keepalive\n\n')
+        with transaction.manager:
+            topic = DBSession.query(Topic).get(topic_id)
+            self._makePost(topic=topic, body='Dolor sit amet')
+        event = next(stream)
+        self.assertTrue(event.startswith(b'id: 2\nevent: post\ndata: {'))
+        self.assertIn(b'"body": "Dolor sit amet"', event)
+        stream.close()
+
+    @unittest.mock.patch('fanboi2.views.api.STREAM_KEEPALIVE', 0)
+    def test_topic_stream_get_subscribe_gap(self):
+        import transaction
+        from fanboi2.models import DBSession, Topic, notifier
+        from fanboi2.views.api import topic_stream_get
+        with transaction.manager:
+            board = self._makeBoard(title='Foobar', slug='foobar')
+            topic = self._makeTopic(board=board, title='Demo')
+            self._makePost(topic=topic, body='Lorem ipsum')
+            topic_id = topic.id
+        request = self._GET()
+        request.matchdict['topic'] = topic_id
+        self._makeStreamConfig(request)
+        response = topic_stream_get(request)
+        with transaction.manager:
+            topic = DBSession.query(Topic).get(topic_id)
+            self._makePost(topic=topic, body='Dolor sit amet')
+        stream = iter(response.app_iter)
+        self.assertEqual(next(stream), b'retry: 3000\n\n')
+        event = next(stream)
+        self.assertTrue(event.startswith(b'id: 2\nevent: post\ndata: {'))
+        self.assertEqual(notifier._waiting, 1)
+        stream.close()
+        self.assertEqual(notifier._waiting, 0)
+
     def test_topic_posts_not_found(self):
         from sqlalchemy.orm.exc import NoResultFound
         from fanboi2.views.api import topic_posts_get
@@ -281,9 +886,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
             topic_posts_get(request)
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_posts_post(self, add_, limit_):
+    def test_topic_posts_post(self, add_, hit_):
         from fanboi2.views.api import topic_posts_post
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
@@ -296,7 +903,9 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
         response = topic_posts_post(request)
         self.assertEqual(response, mock_response)
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             topic_id=topic.id,
@@ -305,9 +914,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         )
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_posts_post_json(self, add_, limit_):
+    def test_topic_posts_post_json(self, add_, hit_):
         from fanboi2.views.api import topic_posts_post
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
@@ -320,7 +931,9 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
         response = topic_posts_post(request)
         self.assertEqual(response, mock_response)
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             topic_id=topic.id,
@@ -336,9 +949,11 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(NoResultFound):
             topic_posts_post(request)
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_posts_post_failed(self, add_, limit_):
+    def test_topic_posts_post_failed(self, add_, hit_):
         from fanboi2.errors import ParamsInvalidError
         from fanboi2.models import DBSession, Post
         from fanboi2.views.api import topic_posts_post
@@ -353,14 +968,13 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         with self.assertRaises(ParamsInvalidError):
             topic_posts_post(request)
 
-        self.assertFalse(limit_.called)
+        self.assertFalse(hit_.called)
         self.assertFalse(add_.called)
         self.assertEqual(DBSession.query(Post).count(), post_count)
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.timeleft')
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limited')
+    @unittest.mock.patch('fanboi2.utils.RateLimiter.hit')
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_posts_post_limited(self, add_, limited_, time_):
+    def test_topic_posts_post_limited(self, add_, hit_):
         from fanboi2.errors import RateLimitedError
         from fanboi2.models import DBSession, Post
         from fanboi2.views.api import topic_posts_post
@@ -372,14 +986,12 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
         request = self._POST({'body': 'Words words'})
         request.matchdict['topic'] = topic.id
         self._makeConfig(request, self._makeRegistry())
-        limited_.return_value = True
-        time_.return_value = 10
+        hit_.return_value = (False, 10)
         with self.assertRaises(RateLimitedError):
             topic_posts_post(request)
 
         self.assertFalse(add_.called)
-        self.assertTrue(limited_.called)
-        self.assertTrue(time_.called)
+        self.assertTrue(hit_.called)
         self.assertEqual(DBSession.query(Post).count(), post_count)
 
     def test_pages_get(self):
@@ -459,6 +1071,64 @@ class TestApiViews(ViewMixin, ModelMixin, TaskMixin, unittest.TestCase):
 
 class TestBoardViews(ViewMixin, unittest.TestCase):
 
+    def test_user_etag(self):
+        from fanboi2.views.boards import _user_etag
+        validator = _user_etag(lambda request: 'foobar')
+        request = self._GET()
+        request.matchdict['board'] = 'foobar'
+        etag1 = validator(request)
+        self.assertIsNotNone(etag1)
+        self.assertEqual(validator(request), etag1)
+        request.session['csrf'] = 'token'
+        etag2 = validator(request)
+        self.assertNotEqual(etag1, etag2)
+        request.cookies['_theme'] = 'obsidian'
+        self.assertNotEqual(validator(request), etag2)
+
+    def test_user_etag_override(self):
+        from fanboi2.views.boards import _user_etag
+        validator = _user_etag(lambda request: 'foobar')
+        request = self._GET()
+        request.matchdict['board'] = 'foobar'
+        request.remote_addr = '10.0.1.1'
+        etag = validator(request)
+        self._makeRuleOverride(
+            ip_address='10.0.1.0/24',
+            override={'status': 'open'})
+        self.assertNotEqual(validator(request), etag)
+
+    def test_user_etag_task(self):
+        from fanboi2.views.boards import _user_etag
+        validator = _user_etag(lambda request: 'foobar')
+        request = self._GET({'task': '1234'})
+        request.matchdict['board'] = 'foobar'
+        self.assertIsNone(validator(request))
+
+    def test_board_show_etag(self):
+        from fanboi2.models import DBSession
+        from fanboi2.views.boards import _board_show_etag, BOARD_TOPICS
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        topics = []
+        for i in range(BOARD_TOPICS + 1):
+            topic = self._makeTopic(board=board, title='Demo %s' % (i,))
+            topics.append(topic)
+            self._makePost(topic=topic, body='Hello, world!')
+        request = self._GET()
+        request.matchdict['board'] = board.slug
+        etag1 = _board_show_etag(request)
+        self.assertIsNotNone(etag1)
+        topics[0].status = 'locked'
+        DBSession.add(topics[0])
+        DBSession.flush()
+        self.assertEqual(_board_show_etag(request), etag1)
+        post = topics[-1].posts.first()
+        post.body = 'Hello, edited world!'
+        DBSession.add(post)
+        DBSession.flush()
+        self.assertNotEqual(_board_show_etag(request), etag1)
+        request.matchdict['board'] = 'foobaz'
+        self.assertIsNone(_board_show_etag(request))
+
     def test_root(self):
         from fanboi2.views.boards import root
         board1 = self._makeBoard(title='Foobar', slug='foobar')
@@ -569,7 +1239,7 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         request.matchdict['board'] = board1.slug
         response = board_all(request)
         self.assertSAEqual(response['board'], board1)
-        self.assertSAEqual(response['topics'], [
+        self.assertSAEqual(response['topics'].items, [
             topic1,
             topic2,
             topic3,
@@ -583,6 +1253,28 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             topic11,
         ])
 
+    def test_board_all_invalid_cursor(self):
+        from pyramid.httpexceptions import HTTPBadRequest
+        from fanboi2.views.boards import board_all
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        request = self._GET({'cursor': 'invalid'})
+        request.matchdict['board'] = board.slug
+        with self.assertRaises(HTTPBadRequest):
+            board_all(request)
+
+    def test_board_all_out_of_range_cursor(self):
+        from base64 import urlsafe_b64encode
+        from pyramid.httpexceptions import HTTPBadRequest
+        from fanboi2.views.boards import board_all
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        for value in (b'999999999999999999999:1',
+                      b'0:99999999999999999999'):
+            cursor = urlsafe_b64encode(value).decode('utf8')
+            request = self._GET({'cursor': cursor})
+            request.matchdict['board'] = board.slug
+            with self.assertRaises(HTTPBadRequest):
+                board_all(request)
+
     def test_board_all_not_found(self):
         from sqlalchemy.orm.exc import NoResultFound
         from fanboi2.views.boards import board_all
@@ -697,125 +1389,139 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
         result_.return_value = DummyAsyncResult(
-            'dummy',
+            TASK_ID,
             'success',
             ['topic', topic.id])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.add_route('topic', '/{board}/{topic}')
 
         response = board_new_get(request)
         location = '/%s/%s' % (board.slug, topic.id)
         self.assertEqual(response.location, location)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    @unittest.mock.patch('fanboi2.views.boards.TASK_WAIT', 0)
     def test_board_new_get_task_wait(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'pending')
+        result_.return_value = DummyAsyncResult(TASK_ID, 'pending')
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/new_wait.mako')
 
         board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
+
+    @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    def test_board_new_get_task_invalid(self, result_):
+        from pyramid.httpexceptions import HTTPNotFound
+        from fanboi2.views.boards import board_new_get
+        board = self._makeBoard(title='Foobar', slug='foobar')
+        request = self._GET()
+        request.matchdict['board'] = board.slug
+        request.params['task'] = 'foobar'
+        self._makeConfig(request, self._makeRegistry())
+        with self.assertRaises(HTTPNotFound):
+            board_new_get(request)
+        self.assertFalse(result_.called)
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_board_new_get_spam_rejected(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'spam_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_spam.mako')
 
         response = board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_board_new_get_dnsbl_rejected(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'dnsbl_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_dnsbl.mako')
 
         response = board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_board_new_get_ban_rejected(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'ban_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_ban.mako')
 
         response = board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_board_new_get_status_rejected(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'status_rejected',
             'restricted'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_status.mako')
 
         response = board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_board_new_get_proxy_rejected(self, result_):
         from fanboi2.views.boards import board_new_get
         board = self._makeBoard(title='Foobar', slug='foobar')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'proxy_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_proxy.mako')
 
         response = board_new_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     def test_board_new_get_not_found(self):
@@ -827,9 +1533,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             board_new_get(request)
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_new_post(self, add_, limit_):
+    def test_board_new_post(self, add_, hit_):
         from fanboi2.views.boards import board_new_post
         board = self._makeBoard(title='Foobar', slug='foobar')
 
@@ -841,7 +1549,9 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
 
         response = board_new_post(self._make_csrf(request))
         self.assertEqual(response.location, '/foobar/new?task=task-uuid')
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             board_id=board.id,
@@ -849,9 +1559,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             body='Words words',
         )
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_new_post_failed(self, add_, limit_):
+    def test_board_new_post_failed(self, add_, hit_):
         from fanboi2.models import DBSession, Topic
         from fanboi2.views.boards import board_new_post
         board = self._makeBoard(title='Foobar', slug='foobar')
@@ -861,7 +1573,7 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         self._makeConfig(request, self._makeRegistry())
 
         response = board_new_post(self._make_csrf(request))
-        self.assertFalse(limit_.called)
+        self.assertFalse(hit_.called)
         self.assertFalse(add_.called)
         self.assertEqual(DBSession.query(Topic).count(), 0)
         self.assertEqual(response['form'].title.data, 'Thread thread')
@@ -869,10 +1581,9 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             'body': ['This field is required.']
         })
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.timeleft')
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limited')
+    @unittest.mock.patch('fanboi2.utils.RateLimiter.hit')
     @unittest.mock.patch('fanboi2.tasks.add_topic.delay')
-    def test_board_new_post_limited(self, add_, limited_, time_):
+    def test_board_new_post_limited(self, add_, hit_):
         from fanboi2.models import DBSession, Topic
         from fanboi2.views.boards import board_new_post
         board = self._makeBoard(title='Foobar', slug='foobar')
@@ -881,13 +1592,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         request.matchdict['board'] = board.slug
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('boards/error_rate.mako')
-        limited_.return_value = True
-        time_.return_value = 10
+        hit_.return_value = (False, 10)
 
         board_new_post(self._make_csrf(request))
         self.assertFalse(add_.called)
-        self.assertTrue(limited_.called)
-        self.assertTrue(time_.called)
+        self.assertTrue(hit_.called)
         self.assertEqual(DBSession.query(Topic).count(), 0)
 
     def test_board_new_post_not_found(self):
@@ -944,40 +1653,41 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         self._makePost(topic=topic, body='Dolor sit amet')
         post = self._makePost(topic=topic, body='Foobar baz')
         result_.return_value = DummyAsyncResult(
-            'dummy',
+            TASK_ID,
             'success',
             ['post', post.id])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.add_route('topic_scoped', '/{board}/{topic}/{query}')
 
         response = topic_show_get(request)
         location = '/%s/%s/l10' % (board.slug, topic.id)
         self.assertEqual(response.location, location)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
+    @unittest.mock.patch('fanboi2.views.boards.TASK_WAIT', 0)
     def test_topic_show_get_task_wait(self, result_):
         from fanboi2.views.boards import topic_show_get
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'pending')
+        result_.return_value = DummyAsyncResult(TASK_ID, 'pending')
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/show_wait.mako')
 
         topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
     def test_topic_show_get_spam_rejected(self, result_):
@@ -986,19 +1696,19 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'spam_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_spam.mako')
 
         response = topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
@@ -1008,19 +1718,19 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'dnsbl_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_dnsbl.mako')
 
         response = topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
@@ -1030,19 +1740,19 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'ban_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_ban.mako')
 
         response = topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
@@ -1052,7 +1762,7 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'status_rejected',
             'archived'])
@@ -1060,12 +1770,12 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_status.mako')
 
         response = topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     @unittest.mock.patch('fanboi2.tasks.celery.AsyncResult')
@@ -1075,19 +1785,19 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         topic = self._makeTopic(board=board, title='Foobar')
         self._makePost(topic=topic, body='Lorem ipsum')
         self._makePost(topic=topic, body='Dolor sit amet')
-        result_.return_value = DummyAsyncResult('dummy', 'success', [
+        result_.return_value = DummyAsyncResult(TASK_ID, 'success', [
             'failure',
             'proxy_rejected'])
 
         request = self._GET()
         request.matchdict['board'] = board.slug
         request.matchdict['topic'] = topic.id
-        request.params['task'] = 'dummy'
+        request.params['task'] = TASK_ID
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_proxy.mako')
 
         response = topic_show_get(request)
-        result_.assert_called_with('dummy')
+        result_.assert_called_with(TASK_ID)
         self.assertEqual(response.status, '422 Unprocessable Entity')
 
     def test_topic_show_get_topic_not_found(self):
@@ -1113,9 +1823,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             topic_show_get(request)
 
     # noinspection PyUnresolvedReferences
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_show_post(self, add_, limit_):
+    def test_topic_show_post(self, add_, hit_):
         from fanboi2.views.boards import topic_show_post
         board = self._makeBoard(title='Foobar', slug='foobar')
         topic = self._makeTopic(board=board, title='Foobar')
@@ -1131,7 +1843,9 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         response = topic_show_post(self._make_csrf(request))
         location = '/%s/%s?task=task-uuid' % (board.slug, topic.id)
         self.assertEqual(response.location, location)
-        limit_.assert_called_with(board.settings['post_delay'])
+        hit_.assert_called_with(
+            [[1, board.settings['post_delay']]],
+            'sliding_window')
         add_.assert_called_with(
             request=unittest.mock.ANY,
             topic_id=topic.id,
@@ -1172,9 +1886,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         with self.assertRaises(HTTPNotFound):
             topic_show_post(self._make_csrf(request))
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limit')
+    @unittest.mock.patch(
+        'fanboi2.utils.RateLimiter.hit',
+        return_value=(True, 0))
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_topic_show_post_failed(self, add_, limit_):
+    def test_topic_show_post_failed(self, add_, hit_):
         from fanboi2.models import DBSession, Post
         from fanboi2.views.boards import topic_show_post
         board = self._makeBoard(title='Foobar', slug='foobar')
@@ -1188,7 +1904,7 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         self._makeConfig(request, self._makeRegistry())
 
         response = topic_show_post(self._make_csrf(request))
-        self.assertFalse(limit_.called)
+        self.assertFalse(hit_.called)
         self.assertFalse(add_.called)
         self.assertEqual(DBSession.query(Post).count(), post_count)
         self.assertSAEqual(response['topic'], topic)
@@ -1196,10 +1912,9 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
             'body': ['This field is required.']
         })
 
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.timeleft')
-    @unittest.mock.patch('fanboi2.utils.RateLimiter.limited')
+    @unittest.mock.patch('fanboi2.utils.RateLimiter.hit')
     @unittest.mock.patch('fanboi2.tasks.add_post.delay')
-    def test_board_show_post_limited(self, add_, limited_, time_):
+    def test_board_show_post_limited(self, add_, hit_):
         from fanboi2.models import DBSession, Post
         from fanboi2.views.boards import topic_show_post
         board = self._makeBoard(title='Foobar', slug='foobar')
@@ -1212,13 +1927,11 @@ class TestBoardViews(ViewMixin, unittest.TestCase):
         request.matchdict['topic'] = topic.id
         config = self._makeConfig(request, self._makeRegistry())
         config.testing_add_renderer('topics/error_rate.mako')
-        limited_.return_value = True
-        time_.return_value = 10
+        hit_.return_value = (False, 10)
 
         topic_show_post(self._make_csrf(request))
         self.assertFalse(add_.called)
-        self.assertTrue(limited_.called)
-        self.assertTrue(time_.called)
+        self.assertTrue(hit_.called)
         self.assertEqual(DBSession.query(Post).count(), post_count)
 
     def test_error_not_found(self):
@@ -1,14 +1,24 @@
 from .akismet import Akismet
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
 from .dnsbl import Dnsbl
+from .http_client import HttpClient
 from .geoip import GeoIP
 from .proxy import ProxyDetector
 from .rate_limiter import RateLimiter
 from .checklist import Checklist
+from .page_cache import PageCache
+from .post_queue import PostQueue
 from .request import serialize_request
+from .routes import RouteTemplate, RouteTemplates
+from .embed_loader import EmbedLoader, load_recent_posts, load_recent_topics
+from .pagination import Pagination, encode_cursor, decode_cursor
 
 
+http_client = HttpClient()
 dnsbl = Dnsbl()
-akismet = Akismet()
-proxy_detector = ProxyDetector()
+akismet = Akismet(http_client=http_client)
+proxy_detector = ProxyDetector(http_client=http_client)
 geoip = GeoIP()
 checklist = Checklist()
+post_queue = PostQueue()
+page_cache = PageCache()
@@ -1,13 +1,17 @@
 import requests
+from .circuit_breaker import CircuitOpenError
+from .http_client import HttpClient
 from .request import serialize_request
-from ..version import __VERSION__
 
 
 class Akismet(object):
     """Basic integration between Pyramid and Akismet."""
 
-    def __init__(self):
+    def __init__(self, http_client=None):
+        if http_client is None:
+            http_client = HttpClient()
         self.key = None
+        self.http_client = http_client
 
     def configure_key(self, key):
         """Configure this :class:`Akismet` instance with the provided key.
@@ -29,16 +33,26 @@ class Akismet(object):
         :type data: dict
         :rtype: requests.models.Response
         """
-        return requests.post(
+        return self.http_client.post(
+            'akismet',
             'https://%s.rest.akismet.com/1.1/%s' % (self.key, name),
-            headers={'User-Agent': "Fanboi2/%s" % __VERSION__},
             data=data,
             timeout=2)
 
+    def fail_closed(self):
+        """Returns :type:`True` if Akismet is configured and should reject
+        instead of pass the check while it is unavailable.
+
+        :rtype: bool
+        """
+        return bool(self.key) and self.http_client.fail_closed('akismet')
+
     def spam(self, request, message):
         """Returns :type:`True` if `message` is spam. Always returns
-        :type:`False` if Akismet key is not set or the request to Akismet
-        was timed out.
+        :type:`False` if Akismet key is not set. If Akismet is unavailable,
+        i.e. the request failed, was timed out, responded with a server
+        error or was skipped because the circuit to Akismet is open, returns
+        :type:`True` only if Akismet is configured to fail closed.
 
         :param request: A :class:`pyramid.request.Request` object.
         :param message: A :type:`str` to identify.
@@ -50,7 +64,7 @@ class Akismet(object):
         if self.key:
             request = serialize_request(request)
             try:
-                return self._api_post('comment-check', data={
+                response = self._api_post('comment-check', data={
                     'blog': request['application_url'],
                     'user_ip': request['remote_addr'],
                     'user_agent': request['user_agent'],
@@ -58,7 +72,10 @@ class Akismet(object):
                     'permalink': request['url'],
                     'comment_type': 'comment',
                     'comment_content': message,
-                }).content == b'true'
-            except requests.Timeout:
-                return False
+                })
+            except (CircuitOpenError, requests.RequestException):
+                return self.fail_closed()
+            if response.status_code >= 500:
+                return self.fail_closed()
+            return response.content == b'true'
         return False
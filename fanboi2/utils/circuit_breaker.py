@@ -0,0 +1,132 @@
+from ..models import redis_conn
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request to a provider was skipped because its circuit
+    is open. :attr:`fail_closed` is :type:`True` if the provider is
+    configured to reject instead of pass the check while it is unavailable.
+    """
+
+    def __init__(self, provider, fail_closed=False):
+        super(CircuitOpenError, self).__init__(provider)
+        self.provider = provider
+        self.fail_closed = fail_closed
+
+
+class CircuitBreaker(object):
+    """Circuit breaker for external providers with its state shared across
+    all processes through Redis.
+
+    While the circuit is closed, every failed or slow request increments a
+    failure counter that expires after ``window`` seconds. Once the counter
+    reaches ``threshold``, the circuit is opened for ``reset`` seconds and
+    all requests to the provider are skipped. After that, the circuit is
+    half-open and a single request at a time is allowed through as a probe.
+    A successful probe closes the circuit while a failed probe opens it
+    again.
+
+    The circuit only decides whether requests are made. Whether a check
+    passes or fails while its provider is unavailable is decided by the
+    ``circuit_fail`` setting of the provider, which applies the same to an
+    open circuit and to individual failed requests.
+    """
+
+    def __init__(self):
+        self.probe_timeout = 30
+
+    def _key(self, provider, name):
+        return "circuit:%s:%s" % (provider, name)
+
+    def allow(self, provider):
+        """Returns ``closed`` if a request to ``provider`` may be made as
+        usual, ``probe`` if the request should be made as a half-open probe
+        or :type:`None` if the request should be skipped.
+
+        :param provider: A provider name :type:`str`.
+
+        :type provider: str
+        :rtype: str or None
+        """
+        open_, half_open = redis_conn.mget(
+            self._key(provider, 'open'),
+            self._key(provider, 'half_open'))
+        if open_:
+            return None
+        if half_open:
+            if redis_conn.set(
+                    self._key(provider, 'probe'),
+                    1,
+                    ex=self.probe_timeout,
+                    nx=True):
+                return 'probe'
+            return None
+        return 'closed'
+
+    def _open(self, pipe, provider, window, reset):
+        # The circuit stays half-open for ``window`` seconds after it was
+        # open. If no probe was made by then, the circuit is closed and will
+        # be opened again after ``threshold`` failures.
+        pipe.set(self._key(provider, 'open'), 1, ex=reset)
+        pipe.set(self._key(provider, 'half_open'), 1, ex=reset + window)
+        pipe.delete(self._key(provider, 'failures'))
+
+    def record(self, provider, state, failed, threshold, window, reset):
+        """Record the outcome of a request to ``provider`` that was allowed
+        by :meth:`allow` with ``state``. Successful requests made while the
+        circuit is closed do not touch Redis.
+
+        :param provider: A provider name :type:`str`.
+        :param state: The state returned from :meth:`allow`.
+        :param failed: Whether the request failed or was too slow.
+        :param threshold: Number of failures to open the circuit.
+        :param window: Number of seconds to count failures in.
+        :param reset: Number of seconds to keep the circuit open.
+
+        :type provider: str
+        :type state: str
+        :type failed: bool
+        :type threshold: int
+        :type window: int
+        :type reset: int
+        :rtype: None
+        """
+        if state == 'probe':
+            pipe = redis_conn.pipeline()
+            if failed:
+                self._open(pipe, provider, window, reset)
+            else:
+                pipe.delete(self._key(provider, 'half_open'))
+                pipe.delete(self._key(provider, 'failures'))
+            pipe.delete(self._key(provider, 'probe'))
+            pipe.execute()
+        elif failed:
+            # The counter is created with its expiry in the same transaction
+            # as it is incremented, so it always expires even if the process
+            # died right after the first failure.
+            key = self._key(provider, 'failures')
+            pipe = redis_conn.pipeline()
+            pipe.set(key, 0, ex=window, nx=True)
+            pipe.incr(key)
+            _, failures = pipe.execute()
+            if failures >= threshold:
+                pipe = redis_conn.pipeline()
+                self._open(pipe, provider, window, reset)
+                pipe.execute()
+
+    def state(self, provider):
+        """Returns the current state of the circuit of ``provider``, i.e.
+        ``open``, ``half_open`` or ``closed``.
+
+        :param provider: A provider name :type:`str`.
+
+        :type provider: str
+        :rtype: str
+        """
+        open_, half_open = redis_conn.mget(
+            self._key(provider, 'open'),
+            self._key(provider, 'half_open'))
+        if open_:
+            return 'open'
+        if half_open:
+            return 'half_open'
+        return 'closed'
@@ -1,31 +1,186 @@
-import socket
-from ipaddress import ip_interface, ip_network
+import os
+import threading
+import time
+import dns.exception
+import dns.resolver
+from concurrent.futures import ThreadPoolExecutor, as_completed, \
+    TimeoutError as FuturesTimeoutError
+from dogpile.cache.api import NO_VALUE
+from ipaddress import ip_address as ip_address_, ip_network
+from ..cache import cache_region as cache_region_
+
+
+LISTED_NETWORK = ip_network('127.0.0.0/8')
 
 
 class Dnsbl(object):
-    """Utility class for checking IP address against DNSBL providers."""
+    """Utility class for checking IP address against DNSBL providers. All
+    providers are queried in parallel on a thread pool shared by all checks
+    in the process and both listed and unlisted answers are cached with a
+    separate expiration time.
+    """
 
-    def __init__(self):
+    def __init__(self, cache_region=cache_region_):
         self.providers = []
+        self.cache_region = cache_region
+        self.nameservers = None
+        self.port = 53
+        self.timeout = 2
+        self.listed_expire = 3600
+        self.unlisted_expire = 600
+        self.max_workers = 10
+        self._resolver = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
 
     def configure_providers(self, providers):
         if isinstance(providers, str):
             providers = providers.split()
         self.providers = providers
 
+    def configure_resolver(self, nameservers=None, port=53, timeout=2):
+        """Configure the DNS resolver used for lookup. If ``nameservers`` is
+        empty, the system resolver configuration is used. Empty ``timeout``
+        falls back to the default of 2 seconds.
+
+        :param nameservers: A :type:`list` of nameserver IP addresses.
+        :param port: An :type:`int` port the nameservers listen on.
+        :param timeout: Number of seconds before a single lookup timed out.
+
+        :type nameservers: list or None
+        :type port: int
+        :type timeout: float or str
+        :rtype: None
+        """
+        if isinstance(nameservers, str):
+            nameservers = nameservers.split()
+        self.nameservers = nameservers or None
+        self.port = int(port)
+        self.timeout = float(timeout) if timeout else 2
+        self._resolver = None
+
+    @property
+    def resolver(self):
+        """Returns a :class:`dns.resolver.Resolver` configured according to
+        :meth:`configure_resolver`.
+
+        :rtype: dns.resolver.Resolver
+        """
+        if self._resolver is None:
+            resolver = dns.resolver.Resolver(configure=not self.nameservers)
+            if self.nameservers:
+                resolver.nameservers = list(self.nameservers)
+            resolver.port = self.port
+            resolver.timeout = self.timeout
+            resolver.lifetime = self.timeout
+            self._resolver = resolver
+        return self._resolver
+
+    @property
+    def executor(self):
+        """Returns a :class:`concurrent.futures.ThreadPoolExecutor` shared
+        by all lookups of this process. The executor is recreated after the
+        process forks since its threads are not carried over.
+
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        with self._lock:
+            pid = os.getpid()
+            if self._executor is None or self._pid != pid:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers)
+                self._pid = pid
+            return self._executor
+
+    def _reverse(self, ip_address):
+        """Returns the reversed form of ``ip_address`` to use in DNSBL query,
+        i.e. reversed octets for IPv4 and reversed nibbles for IPv6.
+
+        :param ip_address: An IP address :type:`str`.
+
+        :type ip_address: str
+        :rtype: str
+        """
+        ipaddr = ip_address_(ip_address)
+        pointer = ipaddr.reverse_pointer
+        if ipaddr.version == 4:
+            return pointer[:-len('.in-addr.arpa')]
+        return pointer[:-len('.ip6.arpa')]
+
+    def _resolve(self, provider, query):
+        """Query ``provider`` for the reversed address ``query``. Returns
+        :type:`None` if the lookup failed or timed out.
+
+        :param provider: A DNSBL provider domain :type:`str`.
+        :param query: A reversed IP address :type:`str`.
+
+        :type provider: str
+        :type query: str
+        :rtype: bool or None
+        """
+        try:
+            answer = self.resolver.query("%s.%s." % (query, provider), 'A')
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            return False
+        except (dns.exception.Timeout, dns.resolver.NoNameservers):
+            return None
+        for rdata in answer:
+            try:
+                if ip_address_(rdata.address) in LISTED_NETWORK:
+                    return True
+            except ValueError:
+                continue
+        return False
+
+    def _lookup(self, provider, query):
+        """Returns :type:`True` if ``query`` is listed in ``provider`` using
+        the cached answer if it is not yet expired.
+
+        :param provider: A DNSBL provider domain :type:`str`.
+        :param query: A reversed IP address :type:`str`.
+
+        :type provider: str
+        :type query: str
+        :rtype: bool
+        """
+        key = 'dnsbl:%s:%s' % (provider, query)
+        cached = self.cache_region.get(key, ignore_expiration=True)
+        if cached is not NO_VALUE:
+            listed, expires_at = cached
+            if expires_at > time.time():
+                return listed
+
+        listed = self._resolve(provider, query)
+        if listed is None:
+            return False
+
+        expire = self.listed_expire if listed else self.unlisted_expire
+        self.cache_region.set(key, (listed, time.time() + expire))
+        return listed
+
     def listed(self, ip_address):
         """Returns :type:`True` if the given IP address is listed in the
         DNSBL providers. Returns :type:`False` if not listed or no DNSBL
         providers present.
         """
-        if self.providers:
-            for provider in self.providers:
-                try:
-                    check = '.'.join(reversed(ip_address.split('.')))
-                    res = socket.gethostbyname("%s.%s." % (check, provider))
-                    ipaddr = ip_interface("%s/255.0.0.0" % (res,))
-                    if ipaddr.network == ip_network('127.0.0.0/8'):
-                        return True
-                except (socket.gaierror, ValueError):
-                    continue
+        if not self.providers:
+            return False
+
+        try:
+            query = self._reverse(ip_address)
+        except ValueError:
+            return False
+
+        futures = [self.executor.submit(self._lookup, provider, query)
+                   for provider in self.providers]
+        try:
+            for future in as_completed(futures, timeout=self.timeout):
+                if future.result():
+                    return True
+        except FuturesTimeoutError:
+            pass
+        finally:
+            for future in futures:
+                future.cancel()
         return False
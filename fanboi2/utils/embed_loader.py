@@ -0,0 +1,194 @@
+from collections import OrderedDict
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import desc, select, union_all
+from ..models import DBSession, Board, Topic, TopicMeta, Post
+
+
+def load_recent_posts(topic_ids, count):
+    """Returns a :type:`dict` mapping each topic ID in ``topic_ids`` to a
+    :type:`list` of its last ``count`` posts in ascending order. Posts of
+    all topics are retrieved in a single query bounded by the post count of
+    each topic, i.e. ``number > post_count - count``, so only the matching
+    rows of the ``(topic_id, number)`` index are read. Deleted posts are
+    not replaced by older posts.
+
+    :param topic_ids: An iterable of topic IDs.
+    :param count: Number of recent posts to retrieve for each topic.
+
+    :type topic_ids: iterable
+    :type count: int
+    :rtype: dict
+    """
+    recent_posts = OrderedDict((topic_id, []) for topic_id in topic_ids)
+    if not recent_posts:
+        return recent_posts
+
+    posts = DBSession.query(Post).\
+        join(TopicMeta, TopicMeta.topic_id == Post.topic_id).\
+        filter(Post.topic_id.in_(recent_posts.keys())).\
+        filter(Post.number > TopicMeta.post_count - count).\
+        order_by(Post.topic_id, Post.number)
+
+    for post in posts:
+        recent_posts[post.topic_id].append(post)
+    return recent_posts
+
+
+def load_recent_topics(board_ids, count):
+    """Returns a :type:`dict` mapping each board ID in ``board_ids`` to a
+    :type:`list` of its ``count`` most recently bumped topics in the same
+    order as :attr:`fanboi2.models.Board.topics`. Topics of all boards are
+    retrieved together with their meta in a single query from a union of
+    ``ORDER BY bumped_at DESC LIMIT count`` per board, so only ``count``
+    rows of the ``(board_id, bumped_at, topic_id)`` index of topic meta are
+    read for each board.
+
+    :param board_ids: An iterable of board IDs.
+    :param count: Number of topics to retrieve for each board.
+
+    :type board_ids: iterable
+    :type count: int
+    :rtype: dict
+    """
+    recent_topics = OrderedDict((board_id, []) for board_id in board_ids)
+    if not recent_topics:
+        return recent_topics
+
+    table = TopicMeta.__table__
+    selects = []
+    for board_id in recent_topics.keys():
+        board_topics = select([table.c.topic_id]).\
+            where(table.c.board_id == board_id).\
+            order_by(desc(table.c.bumped_at), desc(table.c.topic_id)).\
+            limit(count).\
+            alias()
+        selects.append(select([board_topics.c.topic_id]))
+    recent = union_all(*selects).alias('recent')
+
+    topics = DBSession.query(Topic).\
+        join(recent, recent.c.topic_id == Topic.id).\
+        join(Topic.meta).\
+        options(contains_eager(Topic.meta)).\
+        order_by(
+            Topic.board_id,
+            desc(TopicMeta.bumped_at),
+            desc(TopicMeta.topic_id))
+
+    for topic in topics:
+        recent_topics[topic.board_id].append(topic)
+    return recent_topics
+
+
+def _load_by_id(model):
+    """Returns a loader function that retrieves all ``model`` objects
+    matching the given IDs. Objects already in the session are returned
+    as-is and the rest are retrieved in a single query.
+
+    :param model: A model class with an ``id`` column.
+    :type model: type
+    :rtype: function
+    """
+    def _load(ids):
+        results = {}
+        missing = []
+        for id_ in ids:
+            obj = DBSession.identity_map.get(identity_key(model, id_))
+            if obj is not None:
+                results[id_] = obj
+            else:
+                missing.append(id_)
+        if missing:
+            query = DBSession.query(model).filter(model.id.in_(missing))
+            results.update((obj.id, obj) for obj in query)
+        return results
+    return _load
+
+
+class EmbedLoader(object):
+    """Request-scoped batch loader for resources embedded in API responses.
+    Objects that are about to be serialized are registered with
+    :meth:`prime` and the first time an embed is requested for any of
+    them, the embed is loaded for every primed object of the same class
+    in a single query. Loaded objects are primed in turn, so each level
+    of nested embeds costs one query regardless of the number of objects.
+
+    Embeds are:
+
+    ``topics``
+      Recent topics of a :class:`fanboi2.models.Board`.
+
+    ``posts``
+      Recent posts of a :class:`fanboi2.models.Topic`.
+
+    ``board``
+      The :class:`fanboi2.models.Board` of a topic.
+
+    ``topic``
+      The :class:`fanboi2.models.Topic` of a post.
+    """
+
+    TOPICS_COUNT = 10
+    POSTS_COUNT = 30
+
+    def __init__(self):
+        self._primed = {}
+        self._loaded = {}
+        self._embeds = {
+            'topics': (
+                Board,
+                lambda obj: obj.id,
+                lambda ids: load_recent_topics(ids, self.TOPICS_COUNT)),
+            'posts': (
+                Topic,
+                lambda obj: obj.id,
+                lambda ids: load_recent_posts(ids, self.POSTS_COUNT)),
+            'board': (
+                Topic,
+                lambda obj: obj.board_id,
+                _load_by_id(Board)),
+            'topic': (
+                Post,
+                lambda obj: obj.topic_id,
+                _load_by_id(Topic)),
+        }
+
+    def prime(self, objects):
+        """Register ``objects`` as being serialized so their embeds are
+        loaded together with the first embed requested.
+
+        :param objects: An iterable of model objects.
+        :type objects: iterable
+        :rtype: None
+        """
+        for obj in objects:
+            self._primed.setdefault(obj.__class__, []).append(obj)
+
+    def load(self, name, obj):
+        """Returns embed ``name`` of ``obj``, loading the same embed for
+        all primed objects of the same class that have not been loaded.
+
+        :param name: An embed name, e.g. ``topics``.
+        :param obj: A model object to return the embed of.
+
+        :type name: str
+        :type obj: object
+        :rtype: object
+        """
+        model, key, loader = self._embeds[name]
+        loaded = self._loaded.setdefault(name, {})
+        obj_key = key(obj)
+        if obj_key not in loaded:
+            keys = OrderedDict(((obj_key, True),))
+            for primed in self._primed.get(model, ()):
+                primed_key = key(primed)
+                if primed_key not in loaded:
+                    keys[primed_key] = True
+            results = loader(list(keys.keys()))
+            for k in keys:
+                value = loaded[k] = results.get(k)
+                if isinstance(value, list):
+                    self.prime(value)
+                elif value is not None:
+                    self.prime((value,))
+        return loaded[obj_key]
@@ -1,17 +1,65 @@
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict
 import geoip2.database
+from maxminddb import MODE_MMAP
 from maxminddb.errors import InvalidDatabaseError
 from geoip2.errors import AddressNotFoundError
 
 
 log = logging.getLogger(__name__)
 
+_MISSING = object()
+
 
 class GeoIP(object):
-    """Utility for looking up IP address against GeoIP database."""
+    """Utility for looking up IP address against GeoIP database.
+
+    The database is opened in memory-mapped mode so its pages are shared
+    between forked workers, and results of recent lookups are kept in an
+    LRU cache of ``cache_size`` entries. The database file is checked for
+    changes at most once every ``reload_interval`` seconds and a new reader
+    is swapped in without restarting the process when the file is replaced.
+    """
 
-    def __init__(self):
+    def __init__(self, cache_size=4096, reload_interval=60):
         self.geoip2 = None
+        self.path = None
+        self.cache_size = cache_size
+        self.reload_interval = reload_interval
+        self._cache = OrderedDict()
+        self._stat = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _file_stat(self):
+        """Returns a :type:`tuple` identifying the current revision of the
+        database file or :type:`None` if the file could not be read.
+        """
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return stat.st_ino, stat.st_mtime, stat.st_size
+
+    def _open(self):
+        """Open the database at :attr:`path` and swap it in along with a
+        new cache. Returns :type:`True` if the database was opened. The
+        previous reader is not closed explicitly as lookups in other threads
+        may still be using it, and is unmapped once no longer referenced.
+        """
+        stat = self._file_stat()
+        try:
+            reader = geoip2.database.Reader(self.path, mode=MODE_MMAP)
+        except (FileNotFoundError, InvalidDatabaseError):
+            return False
+        with self._lock:
+            self.geoip2 = reader
+            self._cache = OrderedDict()
+            self._stat = stat
+        return True
 
     def configure_geoip2(self, path):
         """Configure and initialize GeoIP2 database with the given ``path``
@@ -21,28 +69,63 @@ class GeoIP(object):
         :param path: Path to the GeoIP2 database file (mmdb).
         :type path: str
         """
-        if path is not None:
-            try:
-                self.geoip2 = geoip2.database.Reader(path)
-            except (FileNotFoundError, InvalidDatabaseError):
-                pass
-        if self.geoip2 is not None:
+        self.path = path
+        self._checked_at = time.monotonic()
+        if path is not None and self._open():
             return
         log.warn(
             'GeoIP2 database does not exists or invalid. ' +
             'Functionalities relying on GeoIP will not work.')
 
+    def reload(self):
+        """Reopen the database if the database file has been replaced since
+        it was last opened. Returns :type:`True` if the database was
+        reloaded.
+
+        :rtype: bool
+        """
+        if self.path is None:
+            return False
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return False
+        if self._open():
+            log.info('GeoIP2 database reloaded from %s.' % (self.path,))
+            return True
+        return False
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        self.reload()
+
     def country_code(self, ip_address):
         """Resolve the given ``ip_address`` to 2-letter country code.
 
         :param ip_address: IP address to lookup.
         :type ip_address: str
         """
-        response = None
-        if self.geoip2 is not None:
-            try:
-                response = self.geoip2.country(ip_address)
-            except AddressNotFoundError:
-                pass
-        if response is not None:
-            return response.country.iso_code
+        self._maybe_reload()
+        with self._lock:
+            reader = self.geoip2
+            cache = self._cache
+            result = cache.get(ip_address, _MISSING)
+            if result is not _MISSING:
+                cache.move_to_end(ip_address)
+                return result
+        if reader is None:
+            return None
+
+        result = None
+        try:
+            result = reader.country(ip_address).country.iso_code
+        except AddressNotFoundError:
+            pass
+
+        with self._lock:
+            cache[ip_address] = result
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return result
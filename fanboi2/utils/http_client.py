@@ -0,0 +1,277 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from ..version import __VERSION__
+
+
+class HttpClient(object):
+    """Shared client for outbound HTTP requests to external providers. Each
+    provider has its own :class:`requests.Session` so connections to the
+    provider are kept alive and reused across requests instead of opening a
+    new connection on every call. Sessions are recreated after the process
+    forks so pooled connections are never shared between processes.
+
+    Latency, error and timeout counters are kept for each provider and can
+    be retrieved with :meth:`stats`.
+
+    Requests to each provider are guarded by a :class:`CircuitBreaker`.
+    Failed requests and requests slower than ``circuit_latency`` seconds
+    are counted as failures, and :class:`CircuitOpenError` is raised
+    instead of making a request while the circuit is open. Setting
+    ``circuit_threshold`` to ``0`` disables the circuit breaker.
+    """
+
+    def __init__(self, breaker=None):
+        if breaker is None:
+            breaker = CircuitBreaker()
+        self.breaker = breaker
+        self.timeout = None
+        self.retries = 0
+        self.pool_size = 10
+        self.circuit = {
+            'threshold': 5,
+            'window': 60,
+            'reset': 30,
+            'latency': None,
+            'fail': 'open',
+        }
+        self.providers = {}
+        self._sessions = {}
+        self._stats = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure_from_config(self, config, key=None):
+        """Configure timeout, retries and pool size of outbound requests.
+        The configuration dict may contains provider-specific configuration
+        using the provider name as dotted-name, for example
+        ``akismet.timeout``, which will take precedence over the global
+        ``timeout``.
+
+        If the configuration key is prefixed with other dotted names, ``key``
+        may be given to extract from that prefix.
+
+        :param config: Configuration :type:`dict`.
+        :param key: Key prefix to extract configuration.
+        """
+        if key is None:
+            key = ''
+
+        def _get(name, cast, default):
+            value = config.get('%s%s' % (key, name))
+            if value is None or value == '':
+                return default
+            return cast(value)
+
+        self.timeout = _get('timeout', float, None)
+        self.retries = _get('retries', int, 0)
+        self.pool_size = _get('pool_size', int, 10)
+        self.circuit = {
+            'threshold': _get('circuit_threshold', int, 5),
+            'window': _get('circuit_window', int, 60),
+            'reset': _get('circuit_reset', int, 30),
+            'latency': _get('circuit_latency', float, None),
+            'fail': _get('circuit_fail', str, 'open'),
+        }
+        self.providers = {}
+        for k, v in config.items():
+            if not k.startswith(key) or v is None or v == '':
+                continue
+            parts = k[len(key):].split('.')
+            if len(parts) == 2:
+                provider, name = parts
+                self.providers.setdefault(provider, {})[name] = v
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+    def _provider_config(self, provider, name, cast, default):
+        """Returns the configuration ``name`` of ``provider`` casted with
+        ``cast``, or ``default`` if not configured for the provider.
+        """
+        value = self.providers.get(provider, {}).get(name)
+        if value is None:
+            return default
+        return cast(value)
+
+    def _circuit_config(self, provider):
+        """Returns a :type:`dict` of circuit breaker configuration of
+        ``provider`` merged with the global configuration.
+        """
+        return {
+            'threshold': self._provider_config(
+                provider, 'circuit_threshold', int, self.circuit['threshold']),
+            'window': self._provider_config(
+                provider, 'circuit_window', int, self.circuit['window']),
+            'reset': self._provider_config(
+                provider, 'circuit_reset', int, self.circuit['reset']),
+            'latency': self._provider_config(
+                provider, 'circuit_latency', float, self.circuit['latency']),
+            'fail': self._provider_config(
+                provider, 'circuit_fail', str, self.circuit['fail']),
+        }
+
+    def fail_closed(self, provider):
+        """Returns :type:`True` if ``provider`` is configured to reject
+        instead of pass a check while it is unavailable.
+
+        :param provider: A provider name :type:`str`.
+
+        :type provider: str
+        :rtype: bool
+        """
+        return self._provider_config(
+            provider, 'circuit_fail', str, self.circuit['fail']) == 'closed'
+
+    def session(self, provider):
+        """Returns a :class:`requests.Session` for ``provider`` with its own
+        connection pool and retry budget. Retries are only made when a
+        connection could not be established so non-idempotent requests will
+        never be sent twice.
+
+        :param provider: A provider name :type:`str`.
+
+        :type provider: str
+        :rtype: requests.Session
+        """
+        with self._lock:
+            pid = os.getpid()
+            if self._pid != pid:
+                self._sessions = {}
+                self._pid = pid
+            session = self._sessions.get(provider)
+            if session is None:
+                retries = self._provider_config(
+                    provider, 'retries', int, self.retries)
+                pool_size = self._provider_config(
+                    provider, 'pool_size', int, self.pool_size)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=pool_size,
+                    max_retries=Retry(
+                        total=retries,
+                        connect=retries,
+                        read=False))
+                session = requests.Session()
+                session.headers['User-Agent'] = "Fanboi2/%s" % __VERSION__
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[provider] = session
+            return session
+
+    def _record(self, provider, latency, error=False, timeout=False):
+        with self._lock:
+            stats = self._stats.setdefault(provider, {
+                'requests': 0,
+                'errors': 0,
+                'timeouts': 0,
+                'latency': 0.0,
+                'latency_max': 0.0,
+            })
+            stats['requests'] += 1
+            stats['latency'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+            if error:
+                stats['errors'] += 1
+            if timeout:
+                stats['timeouts'] += 1
+
+    def stats(self, provider=None):
+        """Returns a :type:`dict` of counters of all providers, or of
+        ``provider`` if given. Counters contain the number of ``requests``,
+        ``errors`` and ``timeouts`` as well as the total and maximum
+        ``latency`` in seconds.
+
+        :param provider: A provider name :type:`str`.
+
+        :type provider: str or None
+        :rtype: dict
+        """
+        with self._lock:
+            if provider is not None:
+                return dict(self._stats.get(provider, {}))
+            return dict((k, dict(v)) for k, v in self._stats.items())
+
+    def request(self, provider, method, url, timeout=None, **kwargs):
+        """Make a request to ``url`` using the session of ``provider`` and
+        record its latency. The configured timeout of the provider, or the
+        global timeout, is the maximum timeout and a shorter ``timeout`` is
+        used as-is so callers may bound a request by their own deadline.
+        Exceptions raised by :mod:`requests`
+        and server error responses are recorded as errors. Exceptions are
+        always re-raised. Raises :class:`CircuitOpenError` without making
+        a request if the circuit of the provider is open.
+
+        :param provider: A provider name :type:`str`.
+        :param method: A HTTP method :type:`str`.
+        :param url: A URL :type:`str` to request.
+        :param timeout: A timeout in seconds.
+        :param kwargs: Keyword arguments to pass to :mod:`requests`.
+
+        :type provider: str
+        :type method: str
+        :type url: str
+        :type timeout: float
+        :type kwargs: dict
+        :rtype: requests.models.Response
+        """
+        max_timeout = self._provider_config(
+            provider, 'timeout', float, self.timeout)
+        if max_timeout is not None and (timeout is None or
+                                        timeout > max_timeout):
+            timeout = max_timeout
+        circuit = self._circuit_config(provider)
+        state = None
+        if circuit['threshold'] > 0:
+            state = self.breaker.allow(provider)
+            if state is None:
+                raise CircuitOpenError(
+                    provider,
+                    fail_closed=circuit['fail'] == 'closed')
+
+        session = self.session(provider)
+        start = time.monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            self._record(
+                provider,
+                time.monotonic() - start,
+                error=True,
+                timeout=isinstance(e, requests.Timeout))
+            self._trip(provider, state, circuit, True)
+            raise
+
+        latency = time.monotonic() - start
+        error = response.status_code >= 500
+        self._record(provider, latency, error=error)
+        self._trip(provider, state, circuit, error or (
+            circuit['latency'] is not None and latency > circuit['latency']))
+        return response
+
+    def _trip(self, provider, state, circuit, failed):
+        """Record the outcome of a request to the circuit breaker if the
+        circuit breaker is enabled for ``provider``.
+        """
+        if state is not None:
+            self.breaker.record(
+                provider,
+                state,
+                failed,
+                threshold=circuit['threshold'],
+                window=circuit['window'],
+                reset=circuit['reset'])
+
+    def get(self, provider, url, **kwargs):
+        """Shortcut for :meth:`request` with ``GET`` method."""
+        return self.request(provider, 'GET', url, **kwargs)
+
+    def post(self, provider, url, **kwargs):
+        """Shortcut for :meth:`request` with ``POST`` method."""
+        return self.request(provider, 'POST', url, **kwargs)
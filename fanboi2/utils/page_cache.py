@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class PageCache(object):
+    """In-process LRU cache of rendered pages keyed by page ID and version.
+    Since a page version is incremented on every change, an entry never
+    needs to be invalidated; a changed page will simply be looked up with
+    a new key and the outdated entry will eventually be evicted.
+
+    :param max_size: Maximum number of rendered pages to keep.
+    :type max_size: int
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, page_id, version):
+        """Returns the rendered page for ``page_id`` at ``version`` or
+        :type:`None` if it is not cached.
+
+        :param page_id: A page ID.
+        :param version: A page version.
+
+        :type page_id: int
+        :type version: int
+        :rtype: object or None
+        """
+        key = (page_id, version)
+        with self._lock:
+            try:
+                rendered = self._pages[key]
+            except KeyError:
+                return None
+            self._pages.move_to_end(key)
+            return rendered
+
+    def set(self, page_id, version, rendered):
+        """Store the rendered page for ``page_id`` at ``version``.
+
+        :param page_id: A page ID.
+        :param version: A page version.
+        :param rendered: A rendered page to cache.
+
+        :type page_id: int
+        :type version: int
+        :rtype: None
+        """
+        key = (page_id, version)
+        with self._lock:
+            self._pages[key] = rendered
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        """Discard all cached pages.
+
+        :rtype: None
+        """
+        with self._lock:
+            self._pages.clear()
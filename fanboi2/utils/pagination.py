@@ -0,0 +1,76 @@
+import base64
+import datetime
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MIN_MICROS = (datetime.datetime.min.replace(tzinfo=datetime.timezone.utc) -
+              EPOCH) // datetime.timedelta(microseconds=1)
+MAX_MICROS = (datetime.datetime.max.replace(tzinfo=datetime.timezone.utc) -
+              EPOCH) // datetime.timedelta(microseconds=1)
+MAX_ID = 2 ** 31 - 1
+
+
+def encode_cursor(timestamp, id_):
+    """Encode ``timestamp`` and ``id_`` into an opaque cursor :type:`str`.
+    The timestamp is stored as microseconds since epoch so the cursor can
+    be compared exactly against the database column.
+
+    :param timestamp: A timezone-aware :class:`datetime.datetime`.
+    :param id_: An :type:`int` to break ties between equal timestamps.
+
+    :type timestamp: datetime.datetime
+    :type id_: int
+    :rtype: str
+    """
+    micros = (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+    value = ('%d:%d' % (micros, id_)).encode('utf8')
+    return base64.urlsafe_b64encode(value).decode('utf8').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor created by :func:`encode_cursor` into a tuple of
+    timestamp and ID. Raises :class:`ValueError` if the cursor is invalid,
+    including a timestamp that is out of range of :class:`datetime.datetime`
+    or an ID that is out of range of an integer column.
+
+    :param cursor: A cursor :type:`str`.
+
+    :type cursor: str
+    :rtype: tuple
+    """
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        value = base64.urlsafe_b64decode(cursor + padding).decode('utf8')
+        micros, id_ = (int(v) for v in value.split(':'))
+        if not MIN_MICROS <= micros <= MAX_MICROS or not 1 <= id_ <= MAX_ID:
+            raise ValueError
+        timestamp = EPOCH + datetime.timedelta(microseconds=micros)
+    except (TypeError, UnicodeDecodeError, ValueError, OverflowError):
+        raise ValueError('Invalid cursor %r' % (cursor,))
+    return timestamp, id_
+
+
+class Pagination(object):
+    """A single page of items retrieved by a keyset query. The page may be
+    iterated over directly. :attr:`next_cursor` is the cursor of the next
+    page or :type:`None` if this is the last page.
+
+    :param items: A :type:`list` of items in this page.
+    :param limit: Maximum number of items in a page.
+    :param next_cursor: A cursor :type:`str` of the next page.
+
+    :type items: list
+    :type limit: int
+    :type next_cursor: str or None
+    """
+
+    def __init__(self, items, limit, next_cursor=None):
+        self.items = items
+        self.limit = limit
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
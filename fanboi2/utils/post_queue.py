@@ -0,0 +1,258 @@
+import hashlib
+import json
+import time
+import uuid
+from redis.exceptions import NoScriptError
+from ..models import redis_conn
+
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return 0
+"""
+
+POP_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items > 0 then
+    redis.call('LTRIM', KEYS[1], #items, -1)
+    redis.call('RPUSH', KEYS[2], unpack(items))
+end
+return items
+"""
+
+SCRIPT_SHAS = dict(
+    (script, hashlib.sha1(script.encode('utf8')).hexdigest())
+    for script in (RELEASE_SCRIPT, EXTEND_SCRIPT, POP_SCRIPT))
+
+
+def _run_script(script, keys, args):
+    """Run a Lua ``script`` by its SHA1 digest, falling back to sending the
+    script if it was not cached by the server.
+
+    :param script: A Lua script :type:`str`.
+    :param keys: A :type:`list` of keys.
+    :param args: A :type:`list` of arguments.
+
+    :type script: str
+    :type keys: list
+    :type args: list
+    :rtype: object
+    """
+    try:
+        return redis_conn.evalsha(
+            SCRIPT_SHAS[script],
+            len(keys),
+            *(keys + args))
+    except NoScriptError:
+        return redis_conn.eval(script, len(keys), *(keys + args))
+
+
+class PostQueue(object):
+    """Utility for queueing posts per topic in Redis so they can be drained
+    and inserted in batch by a single worker instead of having each worker
+    contending for the topic lock.
+
+    Popped posts are moved to a processing list of the topic and stay there
+    until they are acknowledged with :meth:`ack` after being committed, so
+    posts of a worker that died while draining are recovered by the next
+    worker that drains the topic. A post may therefore be inserted twice if
+    the worker died after committing but before acknowledging, or if its
+    drain lock expired while inserting.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.wait = 0
+        self.lock_expire = 30
+        self.poll_interval = 0.01
+
+    def configure_batch(self, size, wait=None):
+        """Configure the batch size and the maximum number of milliseconds
+        to wait for a batch to fill up. Batching is disabled if ``size`` is
+        empty or zero.
+
+        :param size: Maximum number of posts to insert in one batch.
+        :param wait: Maximum number of milliseconds to wait for a batch.
+
+        :type size: int or str
+        :type wait: int or str
+        :rtype: None
+        """
+        self.size = int(size) if size else 0
+        self.wait = int(wait) / 1000.0 if wait else 0
+
+    @property
+    def enabled(self):
+        """Returns :type:`True` if batching was configured.
+
+        :rtype: bool
+        """
+        return self.size > 0
+
+    def _key(self, topic_id):
+        return "post_queue:%s" % (topic_id,)
+
+    def _lock_key(self, topic_id):
+        return "post_queue:%s:lock" % (topic_id,)
+
+    def _processing_key(self, topic_id):
+        return "post_queue:%s:processing" % (topic_id,)
+
+    def push(self, topic_id, entry):
+        """Append a post ``entry`` to the end of the queue for ``topic_id``.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+        :param entry: A JSON-serializable :type:`dict` of post data.
+
+        :type topic_id: int
+        :type entry: dict
+        :rtype: None
+        """
+        redis_conn.rpush(self._key(topic_id), self._dumps(entry))
+
+    def pending(self, topic_id):
+        """Returns the number of posts waiting in the queue for ``topic_id``.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+
+        :type topic_id: int
+        :rtype: int
+        """
+        return redis_conn.llen(self._key(topic_id))
+
+    def acquire(self, topic_id):
+        """Try to become the only worker draining the queue for ``topic_id``.
+        Returns a token identifying the lock holder if the lock was acquired
+        or :type:`None` otherwise. The lock is expired automatically in case
+        the worker died while holding it.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+
+        :type topic_id: int
+        :rtype: str or None
+        """
+        token = uuid.uuid4().hex
+        if redis_conn.set(
+                self._lock_key(topic_id),
+                token,
+                nx=True,
+                ex=self.lock_expire):
+            return token
+
+    def extend(self, topic_id, token):
+        """Reset the expiry of the drain lock for ``topic_id`` if it is
+        still held by ``token``. Returns :type:`False` if the lock was lost,
+        e.g. it was expired and acquired by another worker.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+        :param token: A token returned from :meth:`acquire`.
+
+        :type topic_id: int
+        :type token: str
+        :rtype: bool
+        """
+        return bool(_run_script(
+            EXTEND_SCRIPT,
+            [self._lock_key(topic_id)],
+            [token, self.lock_expire]))
+
+    def release(self, topic_id, token):
+        """Release the drain lock for ``topic_id`` if it is still held by
+        ``token``. The check and delete is done atomically so a worker
+        whose lock was expired never releases a lock of another worker.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+        :param token: A token returned from :meth:`acquire`.
+
+        :type topic_id: int
+        :type token: str
+        :rtype: bool
+        """
+        return bool(_run_script(
+            RELEASE_SCRIPT,
+            [self._lock_key(topic_id)],
+            [token]))
+
+    def _dumps(self, entry):
+        return json.dumps(entry, sort_keys=True)
+
+    def _loads(self, item):
+        return json.loads(item.decode('utf-8'))
+
+    def _pop(self, topic_id, count):
+        items = _run_script(
+            POP_SCRIPT,
+            [self._key(topic_id), self._processing_key(topic_id)],
+            [count])
+        return [self._loads(item) for item in items]
+
+    def pop(self, topic_id):
+        """Move up to :attr:`size` posts from the head of the queue for
+        ``topic_id`` to its processing list and return them. If the queue
+        has less than :attr:`size` posts, wait up to :attr:`wait` seconds
+        for more posts to arrive before returning.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+
+        :type topic_id: int
+        :rtype: list
+        """
+        deadline = time.time() + self.wait
+        entries = self._pop(topic_id, self.size)
+        while entries and len(entries) < self.size and time.time() < deadline:
+            time.sleep(self.poll_interval)
+            entries.extend(self._pop(topic_id, self.size - len(entries)))
+        return entries
+
+    def processing(self, topic_id):
+        """Returns posts in the processing list for ``topic_id`` that were
+        popped but never acknowledged. Since only the holder of the drain
+        lock pops posts, posts returned to a new lock holder were left by a
+        worker that died or lost its lock while draining.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+
+        :type topic_id: int
+        :rtype: list
+        """
+        items = redis_conn.lrange(self._processing_key(topic_id), 0, -1)
+        return [self._loads(item) for item in items]
+
+    def ack(self, topic_id, entries):
+        """Remove ``entries`` from the processing list for ``topic_id`` once
+        they were committed and their results were stored.
+
+        :param topic_id: An :type:`int` referencing topic ID.
+        :param entries: A :type:`list` of entries returned from :meth:`pop`
+                        or :meth:`processing`.
+
+        :type topic_id: int
+        :type entries: list
+        :rtype: None
+        """
+        key = self._processing_key(topic_id)
+        pipe = redis_conn.pipeline()
+        for entry in entries:
+            pipe.lrem(key, 1, self._dumps(entry))
+        pipe.execute()
+
+    def stale_topics(self):
+        """Returns IDs of topics that have posts in their processing list,
+        e.g. after a worker died while draining a topic that has not
+        received any post since.
+
+        :rtype: list
+        """
+        prefix, suffix = self._processing_key('*').split('*')
+        return [
+            int(key.decode('utf-8')[len(prefix):-len(suffix)])
+            for key in redis_conn.scan_iter(match=self._processing_key('*'))]
@@ -1,12 +1,30 @@
 import requests
-from ..version import __VERSION__
+from .circuit_breaker import CircuitOpenError
+from .http_client import HttpClient
 from ..cache import cache_region as cache_region_
 
 
+def _raise_for_server_error(response):
+    """Raise :class:`requests.HTTPError` if ``response`` is a server error
+    so it is handled the same as a failed request.
+
+    :param response: A :class:`requests.models.Response` object.
+    :type response: requests.models.Response
+    :rtype: None
+    """
+    if response.status_code >= 500:
+        raise requests.HTTPError(
+            '%s Server Error' % (response.status_code,),
+            response=response)
+
+
 class BlackBoxProxyDetector(object):
     """Provides integration with Black Block Proxy Block service."""
 
-    def __init__(self, config):
+    def __init__(self, config, http_client=None):
+        if http_client is None:
+            http_client = HttpClient()
+        self.http_client = http_client
         self.url = config.get('url')
         if not self.url:
             self.url = 'http://www.shroomery.org/ythan/proxycheck.php'
@@ -14,21 +32,21 @@ class BlackBoxProxyDetector(object):
     def check(self, ip_address):
         """Request for IP evaluation and return raw results. Return the
         response as-is if return code is 200 and evaluation result is not
-        an error code returned from Black Box Proxy Block.
+        an error code returned from Black Box Proxy Block. Raises
+        :class:`requests.RequestException` if the request failed or the
+        service responded with a server error.
 
         :param ip_address: An :type:`str` IP address.
 
         :type ip_address: str
         :rtype: str or None
         """
-        try:
-            result = requests.get(
-                self.url,
-                headers={'User-Agent': "Fanboi2/%s" % __VERSION__},
-                params={'ip': ip_address},
-                timeout=2)
-        except requests.Timeout:
-            return
+        result = self.http_client.get(
+            'blackbox',
+            self.url,
+            params={'ip': ip_address},
+            timeout=2)
+        _raise_for_server_error(result)
         if result.status_code == 200 and result.content != b'X':
             return result.content
 
@@ -49,7 +67,10 @@ class BlackBoxProxyDetector(object):
 class GetIPIntelProxyDetector(object):
     """Provides integration with GetIPIntel proxy detection service."""
 
-    def __init__(self, config):
+    def __init__(self, config, http_client=None):
+        if http_client is None:
+            http_client = HttpClient()
+        self.http_client = http_client
         self.url = config.get('url')
         self.flags = config.get('flags')
         self.email = config.get('email')
@@ -61,7 +82,8 @@ class GetIPIntelProxyDetector(object):
     def check(self, ip_address):
         """Request for IP evaluation and return raw results. Return the
         response as-is if return code is 200 and evaluation result is
-        positive.
+        positive. Raises :class:`requests.RequestException` if the request
+        failed or the service responded with a server error.
 
         :param ip_address: An :type:`str` IP address.
 
@@ -71,14 +93,12 @@ class GetIPIntelProxyDetector(object):
         params = {'contact': self.email, 'ip': ip_address}
         if self.flags:
             params['flags'] = self.flags
-        try:
-            result = requests.get(
-                self.url,
-                headers={'User-Agent': "Fanboi2/%s" % __VERSION__},
-                params=params,
-                timeout=5)
-        except requests.Timeout:
-            return
+        result = self.http_client.get(
+            'getipintel',
+            self.url,
+            params=params,
+            timeout=5)
+        _raise_for_server_error(result)
         if result.status_code == 200 and float(result.content) >= 0:
             return result.content
 
@@ -106,10 +126,13 @@ DETECTOR_PROVIDERS = {
 class ProxyDetector(object):
     """Base class for dispatching proxy detection into multiple providers."""
 
-    def __init__(self, cache_region=cache_region_):
+    def __init__(self, cache_region=cache_region_, http_client=None):
+        if http_client is None:
+            http_client = HttpClient()
         self.providers = []
         self.instances = {}
         self.cache_region = cache_region
+        self.http_client = http_client
 
     def configure_from_config(self, config, key=None):
         """Configure and initialize proxy detectors. The configuration dict
@@ -132,11 +155,24 @@ class ProxyDetector(object):
             for k, v in config.items():
                 if k.startswith(provider_key):
                     provider_config[k[len(provider_key):]] = v
-            self.instances[provider] = class_(provider_config)
+            self.instances[provider] = class_(
+                provider_config,
+                http_client=self.http_client)
+
+    def fail_closed(self):
+        """Returns :type:`True` if any of the configured providers should
+        reject instead of pass the check while it is unavailable.
+
+        :rtype: bool
+        """
+        return any(self.http_client.fail_closed(p) for p in self.providers)
 
     def detect(self, ip_address):
         """Detect if the given ``ip_address`` is a proxy using providers
-        configured via :meth:``configure_from_config``.
+        configured via :meth:``configure_from_config``. Providers that are
+        unavailable, i.e. the request failed, was timed out or was skipped
+        because their circuit is open, are skipped unless configured to fail
+        closed, in which case the ``ip_address`` is treated as a proxy.
 
         :param ip_address: An IP address to perform a proxy check against.
         :type ip_address: str
@@ -144,11 +180,16 @@ class ProxyDetector(object):
         """
         for provider in self.providers:
             detector = self.instances[provider]
-            result = self.cache_region.get_or_create(
-                'proxy:%s:%s' % (provider, ip_address),
-                lambda: detector.check(ip_address),
-                should_cache_fn=lambda v: v is not None,
-                expiration_time=21600)
+            try:
+                result = self.cache_region.get_or_create(
+                    'proxy:%s:%s' % (provider, ip_address),
+                    lambda: detector.check(ip_address),
+                    should_cache_fn=lambda v: v is not None,
+                    expiration_time=21600)
+            except (CircuitOpenError, requests.RequestException):
+                if self.http_client.fail_closed(provider):
+                    return True
+                continue
             if result is not None and detector.evaluate(result):
                 return True
         return False
@@ -1,10 +1,73 @@
 import hashlib
+import time
+import uuid
+from redis.exceptions import NoScriptError
 from .request import serialize_request
 from ..models import redis_conn
 
 
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local timeleft = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2 + 1])
+    local window = tonumber(ARGV[i * 2 + 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local count = redis.call('ZCARD', key)
+    if count >= limit then
+        local oldest = redis.call('ZRANGE', key, count - limit, count - limit,
+                                  'WITHSCORES')
+        timeleft = math.max(timeleft, tonumber(oldest[2]) + window - now)
+    end
+end
+if timeleft > 0 then
+    return {0, math.ceil(timeleft / 1000)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, tonumber(ARGV[i * 2 + 2]))
+end
+return {1, 0}
+"""
+
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local timeleft = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i * 2 + 1])
+    local window = tonumber(ARGV[i * 2 + 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or limit
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(limit, available + elapsed * limit / window)
+    if available < 1 then
+        timeleft = math.max(timeleft, (1 - available) * window / limit)
+    end
+    tokens[i] = available
+end
+if timeleft > 0 then
+    return {0, math.ceil(timeleft / 1000)}
+end
+for i, key in ipairs(KEYS) do
+    redis.call('HMSET', key, 'tokens', tostring(tokens[i] - 1), 'ts', now)
+    redis.call('PEXPIRE', key, tonumber(ARGV[i * 2 + 2]))
+end
+return {1, 0}
+"""
+
+SCRIPTS = {
+    'sliding_window': SLIDING_WINDOW_SCRIPT,
+    'token_bucket': TOKEN_BUCKET_SCRIPT,
+}
+
+SCRIPT_SHAS = dict(
+    (policy, hashlib.sha1(script.encode('utf8')).hexdigest())
+    for policy, script in SCRIPTS.items())
+
+
 class RateLimiter(object):
-    """Rate limit to throttle content posting to every specific seconds."""
+    """Rate limit to throttle content posting with :meth:`hit`."""
 
     def __init__(self, request, namespace=None):
         request = serialize_request(request)
@@ -13,25 +76,54 @@ class RateLimiter(object):
             hashlib.md5(request['remote_addr'].encode('utf8')).hexdigest(),
         )
 
-    def limit(self, seconds=10):
-        """Mark user as rate limited for `seconds`.
+    def hit(self, limits, policy='sliding_window'):
+        """Atomically check whether the user is within all of ``limits`` and
+        record the hit if so. All limits are checked and updated by a single
+        server-side script so only one round-trip is made and concurrent
+        hits cannot race each other. Returns a tuple of whether the hit is
+        allowed and the number of seconds left until the next hit will be
+        allowed.
 
-        :param seconds: A number of seconds :type:`int` to rate limited for.
+        ``limits`` is a list of ``(count, seconds)`` windows, for example
+        ``[(1, 10), (20, 3600)]`` allows one hit per 10 seconds and at most
+        20 hits per hour. With the ``sliding_window`` policy the exact time
+        of each hit within a window is tracked, while with ``token_bucket``
+        each window is a bucket of ``count`` tokens that refills over
+        ``seconds``.
 
-        :type seconds: int
-        :rtype: None
-        """
-        redis_conn.set(self.key, 1)
-        redis_conn.expire(self.key, seconds)
+        :param limits: A :type:`list` of ``(count, seconds)`` windows.
+        :param policy: Either ``sliding_window`` or ``token_bucket``.
 
-    def limited(self):
-        """Returns true if content should be limited from posting.
-        :rtype: bool
+        :type limits: list
+        :type policy: str
+        :rtype: tuple
         """
-        return redis_conn.exists(self.key)
+        if policy not in SCRIPTS:
+            raise ValueError('Unknown rate limit policy %r' % (policy,))
 
-    def timeleft(self):
-        """Returns seconds left until user is no longer throttled.
-        :rtype: int
-        """
-        return redis_conn.ttl(self.key)
+        keys = []
+        args = [int(time.time() * 1000), uuid.uuid4().hex]
+        for count, seconds in limits:
+            if int(count) < 1 or int(seconds) < 1:
+                raise ValueError('Invalid rate limit %r' % ((count, seconds),))
+            keys.append("%s:%s:%d:%d" % (
+                self.key,
+                policy,
+                int(count),
+                int(seconds)))
+            args.extend([int(count), int(seconds) * 1000])
+        if not keys:
+            return True, 0
+
+        try:
+            result = redis_conn.evalsha(
+                SCRIPT_SHAS[policy],
+                len(keys),
+                *(keys + args))
+        except NoScriptError:
+            result = redis_conn.eval(
+                SCRIPTS[policy],
+                len(keys),
+                *(keys + args))
+        allowed, timeleft = result
+        return bool(allowed), int(timeleft)
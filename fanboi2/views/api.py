@@ -1,13 +1,32 @@
 import datetime
+import hashlib
+import time
+import transaction
+import uuid
+from urllib.parse import urlencode
+from pyramid.httpexceptions import HTTPNotModified, HTTPNotFound
+from pyramid.renderers import render
+from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.sql import or_, and_, select
+from sqlalchemy.sql import or_, desc, select, tuple_
 from webob.multidict import MultiDict
 from fanboi2.errors import ParamsInvalidError, RateLimitedError, BaseError
 from fanboi2.forms import TopicForm, PostForm
-from fanboi2.models import DBSession, Board, Topic, TopicMeta, \
-    Page, RuleOverride
+from fanboi2.helpers.formatters import page_etag
+from fanboi2.models import DBSession, Board, Topic, TopicMeta, Post, \
+    Page, rule_index, notifier, topic_channel, task_channel
 from fanboi2.tasks import ResultProxy, add_topic, add_post, celery
-from fanboi2.utils import RateLimiter, serialize_request
+from fanboi2.utils import RateLimiter, Pagination, serialize_request, \
+    encode_cursor, decode_cursor, load_recent_posts
+
+
+MAX_WAIT = 30
+MAX_TASK_WAIT = 5
+STREAM_TIMEOUT = 300
+STREAM_KEEPALIVE = 15
+STREAM_RETRY = 3000
+TOPICS_LIMIT = 50
+MAX_TOPICS_LIMIT = 200
 
 
 def _get_params(request):
@@ -28,6 +47,30 @@ def _get_params(request):
     return params
 
 
+def _get_int_param(request, name):
+    """Returns the query string ``name`` in request as :type:`int` or
+    :type:`None` if not given. Raises :class:`ParamsInvalidError` if the
+    value is not a non-negative integer.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param name: A query string name :type:`str`.
+
+    :type request: pyramid.request.Request
+    :type name: str
+    :rtype: int or None
+    """
+    value = request.params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise ParamsInvalidError({name: ['Must be a non-negative number.']})
+    return value
+
+
 def _get_override(request, board=None):
     """Returns a :type:`dict` of an override rule for the given IP address
     presented in request. If no override present for a user, an empty
@@ -43,12 +86,144 @@ def _get_override(request, board=None):
     scopes = None
     if board is not None:
         scopes = ('board:%s' % (board.slug,),)
-    rule_override = DBSession.query(RuleOverride).filter(
-        RuleOverride.listed(request.remote_addr, scopes=scopes)).\
+    return rule_index.override(request.remote_addr, scopes=scopes)
+
+
+def _make_etag(*parts):
+    """Returns an entity tag :type:`str` computed from ``parts``.
+
+    :param parts: Values that identify the state of the resource.
+
+    :rtype: str
+    """
+    return hashlib.md5(repr(parts).encode('utf8')).hexdigest()
+
+
+def _board_topics_etag(request, limit, cursor=None):
+    """Returns an entity tag for the board in request and the first
+    ``limit`` topics that come after ``cursor``, or :type:`None` if the
+    board could not be found. Only the topics on the page are read, in
+    index order, so the cost does not grow with the number of topics in the
+    board. The topic meta version is included so edits to the posts shown
+    with each topic also change the tag.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param limit: Number of topics to include in the tag.
+    :param cursor: A ``(bumped_at, topic_id)`` :type:`tuple` or
+                   :type:`None`.
+
+    :type request: pyramid.request.Request
+    :type limit: int
+    :type cursor: tuple or None
+    :rtype: str or None
+    """
+    board = DBSession.query(Board.id, Board.version).\
+        filter(Board.slug == request.matchdict['board']).\
         first()
-    if rule_override is not None:
-        return rule_override.override
-    return {}
+    if board is None:
+        return None
+    query = DBSession.query(
+            Topic.id,
+            Topic.version,
+            TopicMeta.bumped_at,
+            TopicMeta.posted_at,
+            TopicMeta.post_count,
+            TopicMeta.version).\
+        join(TopicMeta, TopicMeta.topic_id == Topic.id)
+    query = _filter_board_topics(query, board.id, cursor)
+    return _make_etag('board', *(tuple(board) + tuple(
+        tuple(row) for row in query.limit(limit))))
+
+
+def _board_etag(request):
+    """Returns an entity tag for the page of topics requested with
+    ``cursor`` and ``limit`` in the board in request, or :type:`None` if
+    the board could not be found or the page is invalid. One topic past the
+    page is included since its presence determines the link to the next
+    page.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: str or None
+    """
+    try:
+        limit, cursor = _get_topics_page(request)
+    except ParamsInvalidError:
+        return None
+    return _board_topics_etag(request, limit + 1, cursor)
+
+
+def _topic_etag(request):
+    """Returns an entity tag for the topic in request computed from the topic
+    and board versions and the post count and version of its topic meta, so
+    new, edited and deleted posts all change the tag without reading the
+    posts. Returns :type:`None` if the topic could not be found.
+
+    Long-polling requests are never validated since the response may change
+    while waiting.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: str or None
+    """
+    if request.params.get('wait'):
+        return None  # Response may change while waiting.
+    query = DBSession.query(
+            Topic.id,
+            Topic.version,
+            Board.version,
+            TopicMeta.post_count,
+            TopicMeta.version).\
+        join(Board, Board.id == Topic.board_id).\
+        join(TopicMeta, TopicMeta.topic_id == Topic.id).\
+        filter(Topic.id == request.matchdict['topic'])
+    if 'board' in request.matchdict:
+        query = query.filter(Board.slug == request.matchdict['board'])
+    row = query.first()
+    if row is not None:
+        return _make_etag('topic', *row)
+
+
+def _page_etag(request):
+    """Returns an entity tag for the public page in request computed from
+    its ID and version, or :type:`None` if the page could not be found.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: str or None
+    """
+    row = DBSession.query(Page.id, Page.version).\
+        filter_by(namespace='public', slug=request.matchdict['page']).\
+        first()
+    if row is not None:
+        return page_etag(*row)
+
+
+def _conditional(validator):
+    """Returns a view decorator that computes an entity tag using
+    ``validator`` before calling the view and responds with
+    ``304 Not Modified`` if the entity tag matches ``If-None-Match``.
+    The view is called as usual if ``validator`` returns :type:`None`.
+
+    :param validator: A function that takes a request and returns an entity
+                      tag :type:`str` or :type:`None`.
+
+    :type validator: function
+    :rtype: function
+    """
+    def _decorator(view):
+        def _view(context, request):
+            etag = validator(request)
+            if etag is not None:
+                if etag in request.if_none_match:
+                    return HTTPNotModified(etag=etag)
+                request.response.etag = etag
+            return view(context, request)
+        return _view
+    return _decorator
 
 
 def root(request):
@@ -82,21 +257,157 @@ def board_get(request):
         one()
 
 
+def _filter_board_topics(query, board_id, cursor=None):
+    """Filter ``query`` to the available topics within the board
+    ``board_id`` that come after ``cursor`` if given. Topics are ordered by
+    the bump time stored in the topic meta so the query can be answered by
+    reading the ``(board_id, bumped_at, topic_id)`` index in order
+    regardless of the number of topics in the board.
+
+    :param query: A :class:`sqlalchemy.orm.Query` joined with topic meta.
+    :param board_id: An :type:`int` referencing board ID.
+    :param cursor: A ``(bumped_at, topic_id)`` :type:`tuple` or
+                   :type:`None`.
+
+    :type query: sqlalchemy.orm.Query
+    :type board_id: int
+    :type cursor: tuple or None
+    :rtype: sqlalchemy.orm.Query
+    """
+    query = query.\
+        filter(TopicMeta.board_id == board_id).\
+        filter(or_(Topic.status == "open",
+                   TopicMeta.posted_at >= datetime.datetime.now() -
+                   datetime.timedelta(days=7)))
+    if cursor is not None:
+        query = query.filter(
+            tuple_(TopicMeta.bumped_at, TopicMeta.topic_id) <
+            tuple_(*cursor))
+    return query.order_by(desc(TopicMeta.bumped_at), desc(TopicMeta.topic_id))
+
+
+def _board_topics_query(board, cursor=None):
+    """Returns a query of all available topics within ``board`` that come
+    after ``cursor`` if given, in the order of :func:`_filter_board_topics`.
+
+    :param board: A :class:`fanboi2.models.Board` object.
+    :param cursor: A ``(bumped_at, topic_id)`` :type:`tuple` or
+                   :type:`None`.
+
+    :type board: fanboi2.models.Board
+    :type cursor: tuple or None
+    :rtype: sqlalchemy.orm.Query
+    """
+    query = DBSession.query(Topic).\
+        join(Topic.meta).\
+        options(contains_eager(Topic.meta))
+    return _filter_board_topics(query, board.id, cursor)
+
+
+def _get_topics_page(request):
+    """Returns the ``limit`` and the decoded ``cursor`` query strings in
+    request. Raises :class:`ParamsInvalidError` if either is invalid.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: tuple
+    """
+    limit = _get_int_param(request, 'limit')
+    if limit is None:
+        limit = TOPICS_LIMIT
+    limit = min(max(limit, 1), MAX_TOPICS_LIMIT)
+
+    cursor = request.params.get('cursor')
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor)
+        except ValueError:
+            raise ParamsInvalidError({'cursor': ['Invalid cursor.']})
+    else:
+        cursor = None
+    return limit, cursor
+
+
+def _next_link(request, cursor):
+    """Returns a ``Link`` header value pointing to the requested path with
+    the ``cursor`` query string replaced with ``cursor``.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param cursor: A cursor :type:`str` of the next page.
+
+    :type request: pyramid.request.Request
+    :type cursor: str
+    :rtype: str
+    """
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    query = urlencode(list(params.items()))
+    return '<%s?%s>; rel="next"' % (request.path, query)
+
+
 def board_topics_get(request):
-    """Retrieve all available topics within a single board.
+    """Retrieve a page of available topics within a single board. At most
+    ``limit`` topics (default :data:`TOPICS_LIMIT`, capped at
+    :data:`MAX_TOPICS_LIMIT`) are returned. If a ``cursor`` query string is
+    given, only topics that come after the cursor are returned. If there
+    are more topics, the path of the next page is given in the ``Link``
+    header of the response.
 
     :param request: A :class:`pyramid.request.Request` object.
 
     :type request: pyramid.request.Request
-    :rtype: sqlalchemy.orm.Query
+    :rtype: fanboi2.utils.Pagination
     """
-    return board_get(request).topics.\
-        filter(or_(Topic.status == "open",
-                   and_(Topic.status != "open",
-                            select([TopicMeta.posted_at]).\
-                            where(TopicMeta.topic_id==Topic.id).\
-                            as_scalar() >= datetime.datetime.now() -
-                        datetime.timedelta(days=7))))
+    limit, cursor = _get_topics_page(request)
+    board = board_get(request)
+    topics = _board_topics_query(board, cursor).limit(limit + 1).all()
+    next_cursor = None
+    if len(topics) > limit:
+        topics = topics[:limit]
+        next_cursor = encode_cursor(topics[-1].meta.bumped_at, topics[-1].id)
+        request.response.headers['Link'] = _next_link(request, next_cursor)
+    return Pagination(topics, limit, next_cursor)
+
+
+def _get_recent_posts(topics, count):
+    """Returns a :type:`dict` mapping topic ID to a :type:`list` of the last
+    ``count`` posts of each topic in ``topics`` in ascending order. Posts of
+    all topics are retrieved in a single query bounded by the post count of
+    each topic.
+
+    :param topics: A :type:`list` of :class:`fanboi2.models.Topic`.
+    :param count: Number of recent posts to retrieve for each topic.
+
+    :type topics: list
+    :type count: int
+    :rtype: dict
+    """
+    return load_recent_posts((topic.id for topic in topics), count)
+
+
+def _rate_limit(request, board):
+    """Record a post made by the user in request to ``board`` or raise
+    :class:`RateLimitedError` if the user has exceeded any of the post
+    limits of the board. If the board does not configure ``post_limits``,
+    a single post per ``post_delay`` seconds is allowed.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param board: A :class:`fanboi2.models.Board` object.
+
+    :type request: pyramid.request.Request
+    :type board: fanboi2.models.Board
+    :rtype: None
+    """
+    limits = board.settings['post_limits']
+    if not limits:
+        limits = [[1, board.settings['post_delay']]]
+    ratelimit = RateLimiter(request, namespace=board.slug)
+    allowed, timeleft = ratelimit.hit(
+        limits,
+        board.settings['post_limit_policy'])
+    if not allowed:
+        raise RateLimitedError(timeleft)
 
 
 def board_topics_post(request, board=None, form=None):
@@ -115,12 +426,7 @@ def board_topics_post(request, board=None, form=None):
         form = TopicForm(params, request=request)
 
     if form.validate():
-        ratelimit = RateLimiter(request, namespace=board.slug)
-        if ratelimit.limited():
-            timeleft = ratelimit.timeleft()
-            raise RateLimitedError(timeleft)
-
-        ratelimit.limit(board.settings['post_delay'])
+        _rate_limit(request, board)
         return add_topic.delay(
             request=serialize_request(request),
             board_id=board.id,
@@ -130,8 +436,52 @@ def board_topics_post(request, board=None, form=None):
     raise ParamsInvalidError(form.errors)
 
 
+def _get_task(task_id):
+    """Returns a :class:`celery.result.AsyncResult` for ``task_id``. Raises
+    :class:`pyramid.httpexceptions.HTTPNotFound` if ``task_id`` is not a task
+    ID so the result backend is never queried nor waited on for it.
+
+    :param task_id: A :type:`str` task ID.
+
+    :type task_id: str
+    :rtype: celery.result.AsyncResult
+    """
+    try:
+        task_id = str(uuid.UUID(task_id))
+    except ValueError:
+        raise HTTPNotFound()
+    return celery.AsyncResult(task_id)
+
+
+def _wait_task(task, timeout):
+    """Block until the result of ``task`` is ready or ``timeout`` seconds
+    has passed. The result backend is queried first and only tasks that are
+    not ready are waited on, after which it is queried once after
+    subscribing and once each time the worker notified that the result was
+    stored. Waiting shares the slots of
+    :attr:`fanboi2.models.Notifier.wait_limit` with other waiting requests.
+    Returns :type:`True` if the result is ready.
+
+    :param task: A :class:`celery.result.AsyncResult` object.
+    :param timeout: Maximum number of seconds to wait.
+
+    :type task: celery.result.AsyncResult
+    :type timeout: int
+    :rtype: bool
+    """
+    if task.ready():
+        return True
+    return notifier.wait(
+        task_channel(task.id),
+        lambda m: task.ready(),
+        timeout)
+
+
 def task_get(request, task=None):
-    """Retrieve a task processing status for the given task id.
+    """Retrieve a task processing status for the given task id. If a
+    ``wait`` query string is given, the request is blocked for up to
+    ``wait`` seconds (capped at :data:`MAX_TASK_WAIT`) until the task
+    finished.
 
     :param request: A :class:`pyramid.request.Request` object.
 
@@ -139,7 +489,10 @@ def task_get(request, task=None):
     :rtype: fanboi2.tasks.ResultProxy
     """
     if task is None:
-        task = celery.AsyncResult(request.matchdict['task'])
+        task = _get_task(request.matchdict['task'])
+    wait = _get_int_param(request, 'wait')
+    if wait:
+        _wait_task(task, min(wait, MAX_TASK_WAIT))
     response = ResultProxy(task)
     if response.success():
         if isinstance(response.object, BaseError):
@@ -160,14 +513,99 @@ def topic_get(request):
         one()
 
 
+def _latest_post_number(topic_id):
+    """Returns the highest post number in topic ``topic_id`` below which all
+    posts are committed, or :type:`None` if the topic does not exist. Post
+    numbers are reserved in the topic meta by the transaction that inserts
+    the posts, so the committed post count never covers an uncommitted post.
+    The lookup is done on a separate connection that is returned to the pool
+    immediately so no connection is held while waiting for new posts.
+
+    :param topic_id: An :type:`int` referencing topic ID.
+
+    :type topic_id: int
+    :rtype: int or None
+    """
+    query = select([TopicMeta.post_count]).\
+        where(TopicMeta.topic_id == topic_id)
+    with DBSession.get_bind().connect() as conn:
+        row = conn.execute(query).first()
+    if row is not None:
+        return row[0]
+
+
+def _committed_posts(topic_id, after):
+    """Returns a query of posts in topic ``topic_id`` numbered above
+    ``after`` up to the committed post count of the topic. The bound is read
+    in the same statement as the posts so a post that is committed while
+    other posts numbered below it are not, is never returned before them
+    and clients polling with the last post number they received will never
+    skip a post.
+
+    :param topic_id: An :type:`int` referencing topic ID.
+    :param after: A post number :type:`int`.
+
+    :type topic_id: int
+    :type after: int
+    :rtype: sqlalchemy.orm.Query
+    """
+    return DBSession.query(Post).\
+        join(TopicMeta, TopicMeta.topic_id == Post.topic_id).\
+        filter(Post.topic_id == topic_id).\
+        filter(Post.number > after).\
+        filter(Post.number <= TopicMeta.post_count).\
+        order_by(Post.number)
+
+
+def _wait_posts(topic_id, after, timeout):
+    """Block until a post numbered above ``after`` is committed to topic
+    ``topic_id`` or ``timeout`` seconds has passed. Returns :type:`True` if
+    such post exists. Returns immediately if the number of waiting requests
+    reached :attr:`fanboi2.models.Notifier.wait_limit`.
+
+    :param topic_id: An :type:`int` referencing topic ID.
+    :param after: A post number :type:`int`.
+    :param timeout: Maximum number of seconds to wait.
+
+    :type topic_id: int
+    :type after: int
+    :type timeout: int
+    :rtype: bool
+    """
+    def _check(message):
+        if message is None:
+            number = _latest_post_number(topic_id)
+            if number is None:
+                return True  # Topic does not exist, stop waiting.
+        else:
+            number = int(message)
+        return number > after
+    return notifier.wait(topic_channel(topic_id), _check, timeout)
+
+
 def topic_posts_get(request, topic=None):
     """Retrieve all posts in a single topic or by or by search criteria.
+    If an ``after`` query string is given, only posts numbered above it are
+    returned. If ``wait`` is also given, the request is blocked for up to
+    ``wait`` seconds (capped at :data:`MAX_WAIT`) until such post exists.
 
     :param request: A :class:`pyramid.request.Request` object.
 
     :type request: pyramid.request.Request
     :rtype: sqlalchemy.orm.Query
     """
+    after = _get_int_param(request, 'after')
+    if after is not None:
+        wait = _get_int_param(request, 'wait')
+        if wait and topic is None:
+            _wait_posts(
+                request.matchdict['topic'],
+                after,
+                min(wait, MAX_WAIT))
+        if topic is None:
+            topic = topic_get(request)
+        return _committed_posts(topic.id, after).all()
+
     if topic is None:
         topic = topic_get(request)
     if 'query' in request.matchdict:
@@ -175,6 +613,134 @@ def topic_posts_get(request, topic=None):
     return topic.posts
 
 
+def _post_events(request, posts):
+    """Returns a :type:`list` of ``(number, event)`` tuples of Server-Sent
+    Events for ``posts``. Each event has the post number as its ID and the
+    serialized post as its data.
+
+    :param request: A :class:`pyramid.request.Request` object.
+    :param posts: An iterable of :class:`fanboi2.models.Post`.
+
+    :type request: pyramid.request.Request
+    :type posts: list
+    :rtype: list
+    """
+    events = []
+    for post in posts:
+        data = render('json', post, request=request)
+        events.append((post.number, (
+            "id: %s\nevent: post\ndata: %s\n\n" % (post.number, data)).
+            encode('utf-8')))
+    return events
+
+
+def _stream_events(channel, events, fetch, latest, after):
+    """Yields ``events`` followed by new events returned from ``fetch`` each
+    time a post numbered above the last sent post was published to
+    ``channel``. A comment is sent every :data:`STREAM_KEEPALIVE` seconds to
+    keep the connection open and the stream is closed after
+    :data:`STREAM_TIMEOUT` seconds, after which clients are expected to
+    reconnect with ``Last-Event-ID``.
+
+    Each open stream occupies a server thread, so a stream waits for new
+    posts only if a slot could be reserved from the notifier. Otherwise the
+    stream is closed right after ``events`` and clients will reconnect after
+    :data:`STREAM_RETRY` milliseconds, i.e. fall back to polling.
+
+    :param channel: A channel name :type:`str` to wait on.
+    :param events: A :type:`list` of ``(number, event)`` tuples.
+    :param fetch: A function that returns events for posts above a number.
+    :param latest: A function that returns the latest committed post number.
+    :param after: The last post number :type:`int` known to the client.
+
+    :type channel: str
+    :type events: list
+    :type fetch: function
+    :type latest: function
+    :type after: int
+    :rtype: generator
+    """
+    yield ("retry: %s\n\n" % (STREAM_RETRY,)).encode('utf-8')
+    for number, event in events:
+        after = number
+        yield event
+    if not notifier.reserve():
+        return
+    try:
+        deadline = time.time() + STREAM_TIMEOUT
+        with notifier.subscribe(channel) as subscription:
+            # Posts committed after ``events`` were retrieved but before
+            # subscribing are not notified, so check once after subscribing.
+            number = latest()
+            while True:
+                if number is not None and number > after:
+                    for number, event in fetch(after):
+                        after = number
+                        yield event
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                message = subscription.get(min(remaining, STREAM_KEEPALIVE))
+                if message is None:
+                    yield b": keepalive\n\n"
+                    number = None
+                else:
+                    number = int(message)
+    finally:
+        notifier.release()
+
+
+def topic_stream_get(request):
+    """Stream posts in a single topic as they are committed as Server-Sent
+    Events. If ``Last-Event-ID`` header or ``after`` query string is given,
+    posts numbered above it are sent first, otherwise only new posts are
+    sent. Posts are sent only up to the committed post count of the topic so
+    a post is never sent before posts numbered below it. The stream does not
+    hold a database connection while waiting.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: pyramid.response.Response
+    """
+    topic = topic_get(request)
+    topic_id = topic.id
+
+    after = request.headers.get('Last-Event-ID')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            after = None
+    if after is None:
+        after = _get_int_param(request, 'after')
+
+    if after is None:
+        after = _latest_post_number(topic_id)
+        events = []
+    else:
+        events = _post_events(request, _committed_posts(topic_id, after))
+
+    def _fetch(number):
+        with transaction.manager:
+            return _post_events(request, _committed_posts(topic_id, number))
+
+    def _latest():
+        return _latest_post_number(topic_id)
+
+    response = request.response
+    response.content_type = 'text/event-stream'
+    response.cache_control = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.app_iter = _stream_events(
+        topic_channel(topic_id),
+        events,
+        _fetch,
+        _latest,
+        after)
+    return response
+
+
 def topic_posts_post(request, board=None, topic=None, form=None):
     """Create a new post within topic.
 
@@ -193,12 +759,7 @@ def topic_posts_post(request, board=None, topic=None, form=None):
         form = PostForm(params, request=request)
 
     if form.validate():
-        ratelimit = RateLimiter(request, namespace=board.slug)
-        if ratelimit.limited():
-            timeleft = ratelimit.timeleft()
-            raise RateLimitedError(timeleft)
-
-        ratelimit.limit(board.settings['post_delay'])
+        _rate_limit(request, board)
         return add_post.delay(
             request=serialize_request(request),
             topic_id=topic.id,
@@ -300,35 +861,58 @@ def includeme(config):  # pragma: no cover
         route_name='api_root',
         renderer='api/show.mako')
 
-    def _map_api_route(name, path, callables=None):
+    def _map_api_route(name, path, callables=None, validators=None):
         config.add_route(name, path)
         if callables is not None:
             for method, callable in callables.items():
+                decorator = None
+                if validators is not None and method in validators:
+                    decorator = _conditional(validators[method])
                 config.add_view(
                     callable,
                     request_method=method,
                     route_name=name,
-                    renderer='json')
+                    renderer='json',
+                    decorator=decorator)
 
     _map_api_route('api_pages', '/1.0/pages/', {'GET': pages_get})
-    _map_api_route('api_page', '/1.0/pages/{page:.*}/', {'GET': page_get})
+    _map_api_route(
+        'api_page',
+        '/1.0/pages/{page:.*}/',
+        {'GET': page_get},
+        {'GET': _page_etag})
 
     _map_api_route('api_boards', '/1.0/boards/', {'GET': boards_get})
     _map_api_route('api_board', '/1.0/boards/{board}/', {'GET': board_get})
-    _map_api_route('api_board_topics', '/1.0/boards/{board}/topics/', {
-        'GET': board_topics_get,
-        'POST': board_topics_post})
+    _map_api_route(
+        'api_board_topics',
+        '/1.0/boards/{board}/topics/',
+        {'GET': board_topics_get, 'POST': board_topics_post},
+        {'GET': _board_etag})
 
     _map_api_route('api_task', '/1.0/tasks/{task}/', {'GET': task_get})
-    _map_api_route('api_topic', '/1.0/topics/{topic:\d+}/', {'GET': topic_get})
-    _map_api_route('api_topic_posts', '/1.0/topics/{topic:\d+}/posts/', {
-        'GET': topic_posts_get,
-        'POST': topic_posts_post})
+    _map_api_route(
+        'api_topic',
+        '/1.0/topics/{topic:\d+}/',
+        {'GET': topic_get},
+        {'GET': _topic_etag})
+
+    _map_api_route(
+        'api_topic_posts',
+        '/1.0/topics/{topic:\d+}/posts/',
+        {'GET': topic_posts_get, 'POST': topic_posts_post},
+        {'GET': _topic_etag})
+
+    _map_api_route(
+        'api_topic_stream',
+        '/1.0/topics/{topic:\d+}/stream/',
+        {'GET': topic_stream_get})
 
     _map_api_route(
         'api_topic_posts_scoped',
         '/1.0/topics/{topic:\d+}/posts/{query}/',
-        {'GET': topic_posts_get})
+        {'GET': topic_posts_get},
+        {'GET': _topic_etag})
 
     def _map_api_errors(exc, callable):
         config.add_view(
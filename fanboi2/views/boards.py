@@ -1,17 +1,84 @@
-from pyramid.httpexceptions import HTTPNotFound, HTTPFound
+from pyramid.httpexceptions import HTTPNotFound, HTTPFound, HTTPBadRequest
 from pyramid.renderers import render_to_response
 from sqlalchemy.orm.exc import NoResultFound
 from fanboi2.errors import RateLimitedError, ParamsInvalidError, \
     SpamRejectedError, DnsblRejectedError, StatusRejectedError, \
     BanRejectedError, ProxyRejectedError
 from fanboi2.forms import SecurePostForm, SecureTopicForm
-from fanboi2.tasks import celery
-from fanboi2.views.api import _get_override, \
+from fanboi2.models import rule_index
+from fanboi2.views.api import _get_override, _make_etag, _conditional, \
+    _board_etag, _board_topics_etag, _topic_etag, _get_task, _wait_task, \
+    _get_recent_posts, _board_topics_query, \
     boards_get, board_get, board_topics_get, board_topics_post, \
     topic_get, topic_posts_get, topic_posts_post, \
     task_get
 
 
+TASK_WAIT = 5
+BOARD_TOPICS = 10
+BOARD_POSTS = 5
+
+
+def _user_etag(validator):
+    """Returns a validator that combines the entity tag returned from
+    ``validator`` with the per-user state that is rendered into the page,
+    i.e. the CSRF token, the selected theme and the override rule for the
+    board. Task result pages are never validated.
+
+    :param validator: A function that takes a request and returns an entity
+                      tag :type:`str` or :type:`None`.
+
+    :type validator: function
+    :rtype: function
+    """
+    def _validator(request):
+        if request.params.get('task'):
+            return None
+        etag = validator(request)
+        if etag is not None:
+            override = rule_index.override(
+                request.remote_addr,
+                scopes=('board:%s' % (request.matchdict['board'],),))
+            return _make_etag(
+                etag,
+                request.session.get('csrf'),
+                request.cookies.get('_theme'),
+                sorted(override.items()))
+    return _validator
+
+
+def _board_show_etag(request):
+    """Returns an entity tag for the topics shown on the board page, i.e.
+    the first :data:`BOARD_TOPICS` topics of the board, or :type:`None` if
+    the board could not be found.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: str or None
+    """
+    return _board_topics_etag(request, BOARD_TOPICS)
+
+
+def _get_task_result(request):
+    """Returns a :class:`celery.result.AsyncResult` for the ``task`` query
+    string or :type:`None` if not given. Waits up to :data:`TASK_WAIT`
+    seconds for the task to finish before any database work is done, so
+    the wait page is only rendered if the task takes longer than that.
+    Raises :class:`pyramid.httpexceptions.HTTPNotFound` if the ``task``
+    query string is not a task ID.
+
+    :param request: A :class:`pyramid.request.Request` object.
+
+    :type request: pyramid.request.Request
+    :rtype: celery.result.AsyncResult or None
+    """
+    if request.params.get('task'):
+        task_result = _get_task(request.params['task'])
+        _wait_task(task_result, TASK_WAIT)
+        return task_result
+
+
 def root(request):
     """Display a list of all boards.
 
@@ -33,13 +100,15 @@ def board_show(request):
     :rtype: dict
     """
     board = board_get(request)
-    topics = board_topics_get(request).limit(10)
+    topics = _board_topics_query(board).limit(BOARD_TOPICS).all()
+    recent_posts = _get_recent_posts(topics, BOARD_POSTS)
     override = _get_override(request, board=board)
     return locals()
 
 
 def board_all(request):
-    """Display a single board with a list of all its topic.
+    """Display a single board with a page of its topics. An invalid
+    ``cursor`` or ``limit`` query string is treated as a bad request.
 
     :param request: A :class:`pyramid.request.Request` object.
 
@@ -47,7 +116,10 @@ def board_all(request):
     :rtype: dict
     """
     board = board_get(request)
-    topics = board_topics_get(request).all()
+    try:
+        topics = board_topics_get(request)
+    except ParamsInvalidError:
+        raise HTTPBadRequest()
     override = _get_override(request, board=board)
     return locals()
 
@@ -62,15 +134,15 @@ def board_new_get(request):
     :type request: pyramid.request.Request
     :rtype: dict | pyramid.response.Response
     """
+    task_result = _get_task_result(request)
     board = board_get(request)
     override = _get_override(request, board=board)
 
     if override.get('status', board.status) != 'open':
         raise HTTPNotFound(request.path)
 
-    if request.params.get('task'):
+    if task_result is not None:
         try:
-            task_result = celery.AsyncResult(request.params['task'])
             task = task_get(request, task_result)
         except SpamRejectedError as e:
             response = render_to_response('boards/error_spam.mako', locals())
@@ -145,13 +217,13 @@ def topic_show_get(request):
     :type request: pyramid.request.Request
     :rtype: dict | pyramid.response.Response
     """
+    task_result = _get_task_result(request)
     board = board_get(request)
     topic = topic_get(request)
     override = _get_override(request, board=board)
 
-    if request.params.get('task'):
+    if task_result is not None:
         try:
-            task_result = celery.AsyncResult(request.params['task'])
             task = task_get(request, task_result)
         except SpamRejectedError as e:
             response = render_to_response('topics/error_spam.mako', locals())
@@ -243,20 +315,28 @@ def error_not_found(exc, request):
 
 
 def includeme(config):  # pragma: no cover
-    def _map_view(name, path, renderer, callables=None):
+    def _map_view(name, path, renderer, callables=None, validators=None):
         config.add_route(name, path)
         if callables is not None:
             for method, callable in callables.items():
+                decorator = None
+                if validators is not None and method in validators:
+                    decorator = _conditional(_user_etag(validators[method]))
                 config.add_view(
                     callable,
                     request_method=method,
                     route_name=name,
-                    renderer=renderer)
+                    renderer=renderer,
+                    decorator=decorator)
 
     _map_view('root', '/', 'root.mako', {'GET': root})
-    _map_view('board', '/{board}/', 'boards/show.mako', {'GET': board_show})
-    _map_view('board_all', '/{board}/all/', 'boards/all.mako', {
-        'GET': board_all})
+    _map_view('board', '/{board}/', 'boards/show.mako',
+        {'GET': board_show},
+        {'GET': _board_show_etag})
+
+    _map_view('board_all', '/{board}/all/', 'boards/all.mako',
+        {'GET': board_all},
+        {'GET': _board_etag})
 
     _map_view('board_new', '/{board}/new/', 'boards/new.mako', {
         'GET': board_new_get,
@@ -264,12 +344,14 @@ def includeme(config):  # pragma: no cover
 
     _map_view('topic', '/{board:\w+}/{topic:\d+}/', 'topics/show.mako', {
         'GET': topic_show_get,
-        'POST': topic_show_post})
+        'POST': topic_show_post},
+        {'GET': _topic_etag})
 
     _map_view('topic_scoped',
         '/{board:\w+}/{topic:\d+}/{query}/',
         'topics/show.mako',
-        {'GET': topic_show_get})
+        {'GET': topic_show_get},
+        {'GET': _topic_etag})
 
     config.add_view(error_not_found, context=NoResultFound)
     config.add_notfound_view(error_not_found, append_slash=True)
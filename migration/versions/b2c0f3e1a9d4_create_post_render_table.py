@@ -0,0 +1,32 @@
+"""create post render table
+
+Revision ID: b2c0f3e1a9d4
+Revises: 6af2b8c6dc3a
+Create Date: 2026-10-16 10:12:41.503817
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b2c0f3e1a9d4'
+down_revision = '6af2b8c6dc3a'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table('post_render',
+        sa.Column('post_id',
+                  sa.Integer(),
+                  autoincrement=False,
+                  nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('body_preview', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('post_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('post_render')
@@ -0,0 +1,63 @@
+"""add board id to topic meta
+
+Revision ID: e4a1c92d7f30
+Revises: b2c0f3e1a9d4
+Create Date: 2026-10-16 14:02:19.336105
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e4a1c92d7f30'
+down_revision = 'b2c0f3e1a9d4'
+
+from alembic import op
+from sqlalchemy import sql
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('topic_meta', sa.Column('board_id', sa.Integer()))
+
+    topic_meta_table = sql.table(
+        'topic_meta',
+        sql.column('topic_id'),
+        sql.column('board_id'),
+        sql.column('bumped_at'))
+
+    topic_table = sql.table(
+        'topic',
+        sql.column('id'),
+        sql.column('board_id'),
+        sql.column('created_at'))
+
+    op.execute(
+        topic_meta_table.
+        update().
+        where(topic_meta_table.c.topic_id == topic_table.c.id).
+        values(
+            board_id=topic_table.c.board_id,
+            bumped_at=sa.func.coalesce(
+                topic_meta_table.c.bumped_at,
+                topic_table.c.created_at,
+                sa.func.now())))
+
+    op.alter_column('topic_meta', 'board_id', nullable=False)
+    op.alter_column('topic_meta', 'bumped_at', nullable=False)
+    op.create_foreign_key(
+        op.f('fk_topic_meta_board_id_board'),
+        'topic_meta', 'board',
+        ['board_id'], ['id'])
+    op.create_index(
+        'ix_topic_meta_board_id_bumped_at',
+        'topic_meta',
+        ['board_id', 'bumped_at', 'topic_id'])
+
+
+def downgrade():
+    op.drop_index('ix_topic_meta_board_id_bumped_at', 'topic_meta')
+    op.drop_constraint(
+        op.f('fk_topic_meta_board_id_board'),
+        'topic_meta',
+        type_='foreignkey')
+    op.alter_column('topic_meta', 'bumped_at', nullable=True)
+    op.drop_column('topic_meta', 'board_id')
@@ -0,0 +1,26 @@
+"""add version column to topic meta
+
+Revision ID: f3b7d1e9a2c5
+Revises: e4a1c92d7f30
+Create Date: 2026-10-17 01:12:40.518214
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d1e9a2c5'
+down_revision = 'e4a1c92d7f30'
+
+from alembic import op
+from sqlalchemy import sql
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('topic_meta', sa.Column('version', sa.Integer))
+    table = sql.table('topic_meta', sql.column('version'))
+    op.execute(table.update().values(version=0))
+    op.alter_column('topic_meta', 'version', nullable=False)
+
+
+def downgrade():
+    op.drop_column('topic_meta', 'version')
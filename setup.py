@@ -29,6 +29,7 @@ requires = [
     'pytz',
     'requests',
     'geoip2',
+    'dnspython',
 
     # Frontend
     'MarkupSafe',
@@ -68,6 +69,8 @@ setup(name='fanboi2',
               "fb2_board_create = fanboi2.scripts.board_create:main",
               "fb2_board_update = fanboi2.scripts.board_update:main",
               "fb2_topic_sync = fanboi2.scripts.topic_sync:main",
+              "fb2_post_render = fanboi2.scripts.post_render:main",
               "fb2_celery = fanboi2.scripts.celery:main",
+              "fb2_benchmark = fanboi2.scripts.benchmark:main",
           ]
       })